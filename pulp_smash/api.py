@@ -7,18 +7,37 @@ handling of href paths and HTTP 202 status codes. This module provides a
 customizable client that makes it easier to work with the API in a safe and
 concise manner.
 """
+import collections
+import contextlib
+import functools
+import hashlib
 import warnings
-from time import sleep
-from urllib.parse import urljoin, urlparse
+from time import monotonic, sleep
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
 
 import requests
 from packaging.version import Version
 
-from pulp_smash import exceptions
+from pulp_smash import (
+    balancing,
+    caching,
+    cassette,
+    exceptions,
+    instrumentation,
+    retrying,
+    sessions,
+)
+# For backward compatibility, as tasks used to be polled by this module.
+from pulp_smash.polling import (  # pylint:disable=unused-import
+    poll_spawned_tasks,
+    poll_task,
+    poll_tasks,
+)
 
 _SENTINEL = object()
-_TASK_END_STATES = ('canceled', 'error', 'finished', 'skipped', 'timed out')
-_P3_TASK_END_STATES = ('canceled', 'completed', 'failed', 'skipped')
+
+# The number of bytes that `stream_handler` reads from a response at a time.
+_STREAM_CHUNK_SIZE = 1024 * 1024
 
 
 def _check_http_202_content_type(response):
@@ -30,8 +49,18 @@ def _check_http_202_content_type(response):
 
 def _warn_http_202_content_type(response):
     """Issue a warning about the response status code."""
-    if 'Content-Type' in response.headers:
-        content_type = '"{}"'.format(response.headers['Content-Type'])
+    _warn_http_202(
+        response.headers,
+        response.request.method,
+        response.request.url,
+        response.request.headers,
+    )
+
+
+def _warn_http_202(headers, method, url, request_headers):
+    """Issue a warning about the content-type of an HTTP 202 response."""
+    if 'Content-Type' in headers:
+        content_type = '"{}"'.format(headers['Content-Type'])
     else:
         content_type = 'not present'
     message = (
@@ -40,12 +69,7 @@ def _warn_http_202_content_type(response):
         'Content-Type is {}. Here is the HTTP method, URL and headers from '
         'the request that generated this anomalous response: {} {} {}'
     )
-    message = message.format(
-        content_type,
-        response.request.method,
-        response.request.url,
-        response.request.headers,
-    )
+    message = message.format(content_type, method, url, request_headers)
     warnings.warn(message, RuntimeWarning)
 
 
@@ -138,7 +162,82 @@ def json_handler(server_config, response):
     return response.json()
 
 
-class Client(object):
+StreamedResponse = collections.namedtuple(
+    'StreamedResponse',
+    ('url', 'status_code', 'headers', 'history', 'size', 'digests', 'path'),
+)
+"""A compact summary of a response body, as returned by ``stream_handler``.
+
+``digests`` maps each algorithm name, such as "sha256", to the hexadecimal
+digest of the body. ``size`` is the body's length in bytes, and ``path`` is
+where the body was written, or ``None``. The other fields are copied from the
+``requests.Response``.
+"""
+
+
+def stream_handler(
+        server_config,  # pylint:disable=unused-argument
+        response,
+        algorithms=('sha256',),
+        path=None,
+        chunk_size=_STREAM_CHUNK_SIZE):
+    """Check the status code, and digest the body without holding it in memory.
+
+    Do what :func:`pulp_smash.api.code_handler` does. In addition, read the
+    response body in chunks of at most ``chunk_size`` bytes, feed each chunk to
+    a hash object per algorithm, optionally write each chunk to ``path``, and
+    return a :data:`pulp_smash.api.StreamedResponse`. This lets large files
+    such as ISOs be verified without their contents being loaded into memory.
+
+    :class:`pulp_smash.api.Client` makes requests with ``stream=True`` when
+    this is its response handler. Use ``functools.partial`` to pass the
+    optional arguments:
+
+    >>> from functools import partial
+    >>> from pulp_smash import api, config
+    >>> client = api.Client(config.get_config(), partial(
+    ...     api.stream_handler,
+    ...     algorithms=('md5', 'sha256'),
+    ...     path='/tmp/large.iso',
+    ... ))
+    >>> client.get('/pulp/isos/repo/large.iso').digests['sha256']
+
+    :param algorithms: Names of algorithms accepted by ``hashlib.new``.
+    :param path: A path to which the body should be written, or ``None``.
+    :param chunk_size: The maximum number of bytes to read at a time.
+    """
+    response.raise_for_status()
+    hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    size = 0
+    with contextlib.closing(response), contextlib.ExitStack() as stack:
+        handle = stack.enter_context(open(path, 'wb')) if path else None
+        for chunk in response.iter_content(chunk_size):
+            size += len(chunk)
+            for hash_ in hashes.values():
+                hash_.update(chunk)
+            if handle:
+                handle.write(chunk)
+    return StreamedResponse(
+        url=response.url,
+        status_code=response.status_code,
+        headers=response.headers,
+        history=response.history,
+        size=size,
+        digests={name: hash_.hexdigest() for name, hash_ in hashes.items()},
+        path=path,
+    )
+
+
+def _is_stream_handler(response_handler):
+    """Tell whether ``response_handler`` is (a partial of) ``stream_handler``."""
+    while isinstance(response_handler, functools.partial):
+        response_handler = response_handler.func
+    return response_handler is stream_handler
+
+
+# Each optional argument to __init__ is kept in a public attribute, so that
+# callers may swap it out later, such as by setting ``response_cache`` to None.
+class Client(object):  # pylint:disable=too-many-instance-attributes
     """A convenience object for working with an API.
 
     This class is a wrapper around the ``requests.api`` module provided by
@@ -148,6 +247,28 @@ class Client(object):
     `Requests`_ functions lies in its configurable request and response
     handling mechanisms.
 
+    Requests are sent through ``session``, a pooled ``requests.Session`` shared
+    by every client that targets the same host. See
+    :func:`pulp_smash.sessions.get_session`.
+
+    Requests that fail because of a connection error or an HTTP 502, 503 or
+    504 response are retried as decided by ``retry_policy``, a
+    :class:`pulp_smash.retrying.RetryPolicy`. By default, it is built from the
+    ``retry`` section of the host's ``api`` role, and only idempotent
+    requests are retried.
+
+    Responses to GET requests may be cached by ``response_cache``, a
+    :class:`pulp_smash.caching.ResponseCache`. By default, there is no cache,
+    unless the host's ``api`` role has a ``cache`` section.
+
+    Requests may be spread over every host fulfilling the ``api`` role by
+    ``balancer``, a :class:`pulp_smash.balancing.Balancer`. By default, there
+    is no balancer, unless no ``pulp_system`` is given and the first host's
+    ``api`` role has a ``balance`` section. Each request, and each retry,
+    whose URL is on the first host is sent to the host chosen by the balancer
+    instead. Every other option, such as ``request_kwargs``, ``retry_policy``
+    and ``response_cache``, is taken from the first host.
+
     This class is flexible enough that it should be usable with any API, but
     certain defaults have been set to work well with `Pulp`_.
 
@@ -187,6 +308,7 @@ class Client(object):
     * :func:`pulp_smash.api.echo_handler`
     * :func:`pulp_smash.api.json_handler`
     * :func:`pulp_smash.api.safe_handler`
+    * :func:`pulp_smash.api.stream_handler`
 
     As mentioned, this class has configurable request and response handling
     mechanisms. We've covered response handling mechanisms — let's move on to
@@ -261,16 +383,24 @@ class Client(object):
     .. _Requests: http://docs.python-requests.org/en/latest/
     """
 
-    def __init__(
+    # Each argument after server_config is optional, and overrides a default
+    # derived from server_config.
+    def __init__(  # pylint:disable=too-many-arguments
             self,
             server_config,
             response_handler=None,
             request_kwargs=None,
             pulp_system=None,
+            retry_policy=None,
+            response_cache=None,
+            balancer=None,
     ):
         """Initialize this object with needed instance attributes."""
         if not pulp_system:
+            if balancer is None:
+                balancer = balancing.get_balancer(server_config)
             pulp_system = server_config.get_systems('api')[0]
+        self.balancer = balancer
         self.pulp_system = pulp_system
         self._cfg = server_config
         self.request_kwargs = self._cfg.get_requests_kwargs(pulp_system)
@@ -278,6 +408,14 @@ class Client(object):
         self.request_kwargs.update(
             {} if request_kwargs is None else request_kwargs
         )
+        self.session = sessions.get_system_session(self._cfg, pulp_system)
+        if retry_policy is None:
+            retry_policy = retrying.RetryPolicy(
+                **pulp_system.roles['api'].get('retry', {}))
+        self.retry_policy = retry_policy
+        if response_cache is None:
+            response_cache = caching.get_response_cache(pulp_system)
+        self.response_cache = response_cache
         if response_handler is None:
             self.response_handler = safe_handler
         else:
@@ -325,103 +463,159 @@ class Client(object):
         """
         # The `self.request_kwargs` dict should *always* have a "url" argument.
         # This is enforced by `self.__init__`. This allows us to call the
-        # `requests.request` function and satisfy its signature:
+        # `requests.Session.request` method and satisfy its signature:
         #
         #     request(method, url, **kwargs)
         #
-        request_kwargs = self.request_kwargs.copy()
-        request_kwargs['url'] = urljoin(request_kwargs['url'], url)
-        request_kwargs.update(kwargs)
-        cfg_host = urlparse(self._cfg.get_base_url(self.pulp_system)).hostname
-        request_host = urlparse(request_kwargs['url']).hostname
-        if request_host != cfg_host:
-            warnings.warn(
-                'This client was originally created for communicating with '
-                '{0}, but a request is being made to {1}. The request will be '
-                'made, but beware that information intended for {0} (such as '
-                "authentication tokens) may now be sent to {1}. Here's the "
-                'full list of options being sent with this request: {2}'
-                .format(cfg_host, request_host, request_kwargs),
-                RuntimeWarning
-            )
-        return self.response_handler(
-            self._cfg,
-            requests.request(method, **request_kwargs),
-        )
-
-
-def poll_spawned_tasks(server_config, call_report, pulp_system=None):
-    """Recursively wait for spawned tasks to complete. Yield response bodies.
-
-    Recursively wait for each of the spawned tasks listed in the given `call
-    report`_ to complete. For each task that completes, yield a response body
-    representing that task's final state.
-
-    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
-    :param call_report: A dict-like object with a `call report`_ structure.
-    :param pulp_system: The system from where to pool the task. If ``None`` is
-        provided then the first system found with api role will be used.
-    :returns: A generator yielding task bodies.
-    :raises: Same as :meth:`poll_task`.
+        request_kwargs = _merge_request_kwargs(self, url, kwargs)
+        if _is_stream_handler(self.response_handler):
+            request_kwargs.setdefault('stream', True)
+        send = functools.partial(self._send, method)
+        if self.response_cache is None:
+            response = send(request_kwargs)
+        else:
+            response = self.response_cache.request(
+                send, method, request_kwargs)
+        return self.response_handler(self._cfg, response)
+
+    def _send(self, method, request_kwargs):
+        """Send an HTTP request, retrying it as ``retry_policy`` allows."""
+        stream = request_kwargs.get('stream', False)
+        deadline = monotonic() + self.retry_policy.budget
+        delays = self.retry_policy.get_delays()
+        attempt = 0
+        while True:
+            session, pulp_system, attempt_kwargs = self._route(request_kwargs)
+            start = monotonic()
+            try:
+                response = self._request(
+                    session, pulp_system, method, attempt_kwargs)
+            except requests.exceptions.ConnectionError:
+                _record_connection_error(
+                    method,
+                    attempt_kwargs['url'],
+                    monotonic() - start,
+                    attempt,
+                )
+                delay = self.retry_policy.get_delay(
+                    method, attempt, delays, deadline - monotonic())
+                if delay is None:
+                    raise
+            else:
+                _record_response(
+                    method, response, monotonic() - start, stream, attempt)
+                delay = self.retry_policy.get_delay(
+                    method, attempt, delays, deadline - monotonic(), response)
+                if delay is None:
+                    break
+                response.close()
+            sleep(delay)
+            attempt += 1
+        return response
 
-    .. _call report:
-        http://docs.pulpproject.org/en/latest/dev-guide/conventions/sync-v-async.html#call-report
+    def _request(self, session, pulp_system, method, request_kwargs):
+        """Send a request once, and tell ``balancer`` how it went."""
+        if pulp_system is None:
+            return session.request(method, **request_kwargs)
+        start = monotonic()
+        response = error = None
+        try:
+            response = session.request(method, **request_kwargs)
+            return response
+        except requests.exceptions.RequestException as err:
+            error = err
+            raise
+        finally:
+            balancing.release_request(
+                self.balancer, pulp_system, start, response, error)
+
+    def _route(self, request_kwargs):
+        """Pick the host to send a request to.
+
+        :returns: A ``(session, pulp_system, request_kwargs)`` tuple. If the
+            request isn't balanced, ``pulp_system`` is ``None``. Otherwise,
+            it must be passed to :func:`pulp_smash.balancing.release_request`
+            once the request has been answered.
+        """
+        if self.balancer is None or cassette.get_cassette() is not None:
+            return self.session, None, request_kwargs
+        base_url = urlsplit(self._cfg.get_base_url(self.pulp_system))
+        url = urlsplit(request_kwargs['url'])
+        if url[:2] != base_url[:2]:
+            return self.session, None, request_kwargs
+        pulp_system = self.balancer.acquire()
+        host_url = urlsplit(self._cfg.get_base_url(pulp_system))
+        request_kwargs = dict(
+            request_kwargs, url=urlunsplit(host_url[:2] + url[2:]))
+        session = sessions.get_system_session(self._cfg, pulp_system)
+        return session, pulp_system, request_kwargs
+
+
+def _record_connection_error(method, url, seconds, attempt):
+    """Describe a failed HTTP request to ``instrumentation.record``."""
+    instrumentation.record(instrumentation.Call(
+        kind='http',
+        method=method.upper(),
+        target=instrumentation.url_template(url),
+        status=None,
+        bytes_out=0,
+        bytes_in=0,
+        seconds=seconds,
+        attempt=attempt,
+    ))
+
+
+def _record_response(method, response, seconds, stream, attempt):
+    """Describe an HTTP request to :func:`pulp_smash.instrumentation.record`.
+
+    The body of a streamed response hasn't been read yet, so its size is taken
+    from the Content-Length header.
     """
-    if not pulp_system:
-        pulp_system = server_config.get_systems('api')[0]
-    if server_config.pulp_version < Version('3'):
-        hrefs = (task['_href'] for task in call_report['spawned_tasks'])
+    body = response.request.body
+    bytes_out = len(body) if isinstance(body, (bytes, str)) else 0
+    if stream:
+        bytes_in = int(response.headers.get('Content-Length', 0))
     else:
-        hrefs = [call_report['_href']]
-    for href in hrefs:
-        for final_task_state in poll_task(server_config, href, pulp_system):
-            yield final_task_state
-
-
-def poll_task(server_config, href, pulp_system=None):
-    """Wait for a task and its children to complete. Yield response bodies.
-
-    Poll the task at ``href``, waiting for the task to complete. When a
-    response is received indicating that the task is complete, yield that
-    response body and recursively poll each child task.
-
-    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
-    :param href: The path to a task you'd like to monitor recursively.
-    :param pulp_system: The system from where to pool the task. If ``None`` is
-        provided then the first system found with api role will be used.
-    :returns: An generator yielding response bodies.
-    :raises pulp_smash.exceptions.TaskTimedOutError: If a task takes too
-        long to complete.
+        bytes_in = len(response.content or b'')
+    instrumentation.record(instrumentation.Call(
+        kind='http',
+        method=method.upper(),
+        target=instrumentation.url_template(response.url),
+        status=response.status_code,
+        bytes_out=bytes_out,
+        bytes_in=bytes_in,
+        seconds=seconds,
+        attempt=attempt,
+    ))
+
+
+def _merge_request_kwargs(client, url, kwargs):
+    """Merge per-request arguments into a client's ``request_kwargs``.
+
+    Join ``url`` onto the client's base URL, and let ``kwargs`` override (but
+    not overwrite) ``client.request_kwargs``. Warn if the request is bound for
+    a host other than the one the client was created for.
+
+    :param client: A :class:`pulp_smash.api.Client` or
+        :class:`pulp_smash.async_api.AsyncClient`.
+    :param url: The URL passed to ``client.request``.
+    :param kwargs: The other arguments passed to ``client.request``.
+    :returns: A new dict of arguments for the request.
     """
-    if not pulp_system:
-        pulp_system = server_config.get_systems('api')[0]
-    # 900 * 2s == 1800s == 30m
-    # NOTE: The timeout counter is synchronous. We query Pulp, then count down,
-    # then query pulp, then count down, etc. This is… dumb.
-    poll_limit = 900
-    poll_counter = 0
-    while True:
-        response = requests.get(
-            urljoin(server_config.get_base_url(pulp_system), href),
-            **server_config.get_requests_kwargs(pulp_system)
+    request_kwargs = client.request_kwargs.copy()
+    request_kwargs['url'] = urljoin(request_kwargs['url'], url)
+    request_kwargs.update(kwargs)
+    # pylint:disable=protected-access
+    cfg_host = urlparse(client._cfg.get_base_url(client.pulp_system)).hostname
+    request_host = urlparse(request_kwargs['url']).hostname
+    if request_host != cfg_host:
+        warnings.warn(
+            'This client was originally created for communicating with '
+            '{0}, but a request is being made to {1}. The request will be '
+            'made, but beware that information intended for {0} (such as '
+            "authentication tokens) may now be sent to {1}. Here's the "
+            'full list of options being sent with this request: {2}'
+            .format(cfg_host, request_host, request_kwargs),
+            RuntimeWarning
         )
-        response.raise_for_status()
-        attrs = response.json()
-        if server_config.pulp_version < Version('3'):
-            task_end_states = _TASK_END_STATES
-        else:
-            task_end_states = _P3_TASK_END_STATES
-        if attrs['state'] in task_end_states:
-            # This task has completed. Yield its final state, then iterate
-            # through each of its children and yield their final states.
-            yield attrs
-            for href_ in (task['_href'] for task in attrs['spawned_tasks']):
-                for final_task_state in poll_task(server_config, href_):
-                    yield final_task_state
-            break
-        poll_counter += 1
-        if poll_counter > poll_limit:
-            raise exceptions.TaskTimedOutError(
-                'Task {} is ongoing after {} polls.'.format(href, poll_limit)
-            )
-        sleep(2)
+    return request_kwargs
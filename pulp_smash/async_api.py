@@ -0,0 +1,471 @@
+# coding=utf-8
+"""An asyncio-native client for working with Pulp's API.
+
+This module mirrors :mod:`pulp_smash.api`, with coroutines in place of
+functions and methods. Its centerpiece is :class:`AsyncClient`, which lets
+many requests be in flight at once without a thread per request.
+"""
+import asyncio
+import ssl
+import weakref
+from time import monotonic
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from packaging.version import Version
+
+from pulp_smash import exceptions
+from pulp_smash.api import (
+    _SENTINEL,
+    _check_call_report,
+    _check_tasks,
+    _merge_request_kwargs,
+    _warn_http_202,
+)
+from pulp_smash.polling import (
+    _P3_TASK_END_STATES,
+    _TASK_END_STATES,
+    _TASK_TIMEOUT,
+    _poll_delays,
+)
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None  # pylint:disable=invalid-name
+
+# A mapping between event loops and dicts like
+# ``pulp_smash.sessions._SESSIONS``, whose values are ``aiohttp.ClientSession``
+# objects. Used by `get_async_session`. An aiohttp session is bound to the
+# event loop it was created in.
+_ASYNC_SESSIONS = weakref.WeakKeyDictionary()
+
+
+def get_async_session(url, pool_size=None):
+    """Return a pooled ``aiohttp.ClientSession`` for the host named in ``url``.
+
+    This is the asyncio counterpart of :func:`pulp_smash.sessions.get_session`.
+    Sessions are cached per event loop, scheme and network location, and must
+    be requested from within a running event loop. Close them with
+    :func:`pulp_smash.async_api.close_async_sessions` before the loop is
+    closed.
+
+    :param url: A URL. Only the scheme and network location are used.
+    :param pool_size: The maximum number of simultaneous connections to keep
+        open. Defaults to ``100``, the aiohttp default, so that many
+        operations may be in flight at once. Only honored when the session is
+        created.
+    :returns: An ``aiohttp.ClientSession`` object.
+    :raises: ``RuntimeError`` if aiohttp is not installed.
+    """
+    if aiohttp is None:
+        raise RuntimeError(
+            'The aiohttp library is required for asyncio support. Install '
+            'Pulp Smash with the "async" extra, e.g. `pip install '
+            'pulp-smash[async]`.'
+        )
+    parts = urlsplit(url)
+    key = (parts.scheme.lower(), parts.netloc.lower())
+    sessions = _ASYNC_SESSIONS.setdefault(asyncio.get_event_loop(), {})
+    session = sessions.get(key)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size or 100),
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        sessions[key] = session
+    return session
+
+
+async def close_async_sessions():
+    """Close the sessions opened by the running event loop.
+
+    See :func:`pulp_smash.async_api.get_async_session`.
+    """
+    sessions = _ASYNC_SESSIONS.pop(asyncio.get_event_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+def _get_system_async_session(server_config, pulp_system):
+    """Return the pooled asyncio session for the given host's API."""
+    return get_async_session(
+        server_config.get_base_url(pulp_system),
+        pulp_system.roles['api'].get('pool_size'),
+    )
+
+
+def _to_aiohttp_kwargs(request_kwargs):
+    """Translate arguments for Requests into arguments for aiohttp.
+
+    ``auth`` may be a two-tuple or any Requests authentication object, such as
+    :class:`pulp_smash.tests.pulp3.utils.JWTAuth`. ``verify``, ``cert``,
+    ``proxies``, ``files`` and a numeric ``timeout`` are translated, and
+    boolean query parameters are encoded the way Requests encodes them.
+    ``stream`` may only be false, as the body of each response is read before
+    the response is handled. All other arguments are passed through.
+
+    :raises: ``ValueError`` if an argument can't be translated.
+    """
+    kwargs = request_kwargs.copy()
+    auth = kwargs.pop('auth', None)
+    if isinstance(auth, (list, tuple)):
+        auth = requests.auth.HTTPBasicAuth(*auth)
+    if auth is not None:
+        # Let the Requests auth object decorate a throwaway request, and copy
+        # the headers it sets.
+        prepared = requests.Request(
+            'GET', kwargs['url'], headers=kwargs.get('headers')
+        ).prepare()
+        kwargs['headers'] = dict(auth(prepared).headers)
+    if kwargs.pop('stream', False):
+        raise ValueError(
+            'AsyncClient reads the body of each response before handling it, '
+            'so it can\'t stream responses. Use pulp_smash.api.Client with '
+            'stream=True instead.'
+        )
+    context = _get_ssl_context(
+        kwargs.pop('verify', True), kwargs.pop('cert', None))
+    if context is not None:
+        kwargs['ssl'] = context
+    proxy = requests.utils.select_proxy(
+        kwargs['url'], kwargs.pop('proxies', None) or {})
+    if proxy is not None:
+        kwargs['proxy'] = proxy
+    files = kwargs.pop('files', None)
+    if files:
+        kwargs['data'] = _get_form_data(kwargs.pop('data', None), files)
+    timeout = kwargs.pop('timeout', None)
+    if timeout is not None:
+        kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+    params = kwargs.get('params')
+    if isinstance(params, dict):
+        kwargs['params'] = {
+            key: str(val) if isinstance(val, bool) else val
+            for key, val in params.items()
+        }
+    return kwargs
+
+
+def _get_ssl_context(verify, cert):
+    """Translate Requests' ``verify`` and ``cert`` into aiohttp's ``ssl``.
+
+    :returns: ``False``, an ``ssl.SSLContext``, or ``None`` if aiohttp's
+        default checks will do.
+    """
+    if cert is None:
+        if verify is False:
+            return False
+        if isinstance(verify, str):
+            return ssl.create_default_context(cafile=verify)
+        return None
+    context = ssl.create_default_context(
+        cafile=verify if isinstance(verify, str) else None)
+    if verify is False:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    if isinstance(cert, str):
+        context.load_cert_chain(cert)
+    else:
+        context.load_cert_chain(*cert)
+    return context
+
+
+def _get_form_data(data, files):
+    """Translate Requests' ``data`` and ``files`` into an aiohttp form.
+
+    As with Requests, ``data`` may be a dict or a list of tuples of form
+    fields, and each file may be a file object or a ``(filename, file)`` or
+    ``(filename, file, content_type)`` tuple.
+
+    :returns: An ``aiohttp.FormData`` object, sent as a multipart form.
+    """
+    if isinstance(data, (str, bytes)):
+        raise ValueError('Form fields must not be a string if files are sent.')
+    form = aiohttp.FormData()
+    for name, values in requests.utils.to_key_val_list(data or {}):
+        if isinstance(values, (str, bytes)) or not hasattr(values, '__iter__'):
+            values = [values]
+        for value in values:
+            if value is not None:
+                form.add_field(
+                    name, value if isinstance(value, bytes) else str(value))
+    for name, value in requests.utils.to_key_val_list(files):
+        if isinstance(value, (list, tuple)):
+            if len(value) > 3:
+                raise ValueError(
+                    'The file {} has custom headers, which AsyncClient can\'t '
+                    'send.'.format(name)
+                )
+            filename, fileobj, content_type = (tuple(value) + (None,))[:3]
+        else:
+            filename = requests.utils.guess_filename(value) or name
+            fileobj, content_type = value, None
+        form.add_field(
+            name, fileobj, filename=filename, content_type=content_type)
+    return form
+
+
+async def _async_handle_202(server_config, response):
+    """Check for an HTTP 202 response and handle it appropriately.
+
+    This is the asyncio counterpart of ``pulp_smash.api._handle_202``.
+    """
+    if response.status == 202:  # "Accepted"
+        if not (response.headers.get('Content-Type', '')
+                .startswith('application/json')):
+            _warn_http_202(
+                response.headers,
+                response.method,
+                response.url,
+                response.request_info.headers,
+            )
+        call_report = await response.json(content_type=None)
+        tasks = await async_poll_spawned_tasks(server_config, call_report)
+        if server_config.pulp_version < Version('3'):
+            _check_call_report(call_report)
+            _check_tasks(tasks, ('error', 'exception', 'traceback'))
+        else:
+            _check_tasks(tasks, ('error',))
+
+
+async def async_echo_handler(server_config, response):  # pylint:disable=unused-argument
+    """Immediately return ``response``.
+
+    This is the asyncio counterpart of :func:`pulp_smash.api.echo_handler`.
+    """
+    return response
+
+
+async def async_code_handler(server_config, response):  # pylint:disable=unused-argument
+    """Check the response status code, and return the response.
+
+    This is the asyncio counterpart of :func:`pulp_smash.api.code_handler`.
+
+    :raises: ``aiohttp.ClientResponseError`` if the response status code is
+        in the 4XX or 5XX range.
+    """
+    response.raise_for_status()
+    return response
+
+
+async def async_safe_handler(server_config, response):
+    """Check status code, wait for tasks to complete, and check tasks.
+
+    This is the asyncio counterpart of :func:`pulp_smash.api.safe_handler`.
+
+    :raises: ``aiohttp.ClientResponseError`` if the response status code is
+        in the 4XX or 5XX range.
+    :raises pulp_smash.exceptions.CallReportError: If the call report contains
+        an error.
+    :raises pulp_smash.exceptions.TaskReportError: If the task report contains
+        an error.
+    """
+    response.raise_for_status()
+    await _async_handle_202(server_config, response)
+    return response
+
+
+async def async_json_handler(server_config, response):
+    """Like ``async_safe_handler``, but also return a JSON-decoded body.
+
+    This is the asyncio counterpart of :func:`pulp_smash.api.json_handler`.
+    """
+    response.raise_for_status()
+    if response.status == 204:
+        return response
+    await _async_handle_202(server_config, response)
+    return await response.json(content_type=None)
+
+
+class AsyncClient(object):
+    """An asyncio-native counterpart of :class:`pulp_smash.api.Client`.
+
+    This class has the same constructor arguments, instance attributes and
+    methods as :class:`pulp_smash.api.Client`, and ``request_kwargs`` are
+    merged in the same way. The difference is that each method is a
+    coroutine, and that requests are made with `aiohttp`_, so that many
+    requests may be in flight at once without a thread per request. For
+    example:
+
+    >>> import asyncio
+    >>> from pulp_smash import async_api, config
+    >>> async def sync_all(cfg, repos):
+    ...     client = async_api.AsyncClient(cfg)
+    ...     await asyncio.gather(*(
+    ...         client.post(repo['_href'] + 'actions/sync/')
+    ...         for repo in repos
+    ...     ))
+    ...     await async_api.close_async_sessions()
+
+    Response handlers are coroutines too, and they receive an
+    ``aiohttp.ClientResponse`` whose body has already been read. Pulp Smash
+    ships with several response handlers. See:
+
+    * :func:`pulp_smash.async_api.async_code_handler`
+    * :func:`pulp_smash.async_api.async_echo_handler`
+    * :func:`pulp_smash.async_api.async_json_handler`
+    * :func:`pulp_smash.async_api.async_safe_handler` (the default)
+
+    Arguments in ``request_kwargs`` and passed to each method use the same
+    names as for Requests, and they are translated for aiohttp. ``auth`` may
+    be a two-tuple or a Requests authentication object, and ``verify`` may be
+    a boolean or a path to a certificate.
+
+    aiohttp is an optional dependency. Install it with ``pip install
+    pulp-smash[async]``.
+
+    .. _aiohttp: https://docs.aiohttp.org/
+    """
+
+    def __init__(
+            self,
+            server_config,
+            response_handler=None,
+            request_kwargs=None,
+            pulp_system=None,
+    ):
+        """Initialize this object with needed instance attributes."""
+        if not pulp_system:
+            pulp_system = server_config.get_systems('api')[0]
+        self.pulp_system = pulp_system
+        self._cfg = server_config
+        self.request_kwargs = self._cfg.get_requests_kwargs(pulp_system)
+        self.request_kwargs['url'] = self._cfg.get_base_url(pulp_system)
+        self.request_kwargs.update(
+            {} if request_kwargs is None else request_kwargs
+        )
+        if response_handler is None:
+            self.response_handler = async_safe_handler
+        else:
+            self.response_handler = response_handler
+
+    async def delete(self, url, **kwargs):
+        """Send an HTTP DELETE request."""
+        return await self.request('DELETE', url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        """Send an HTTP GET request."""
+        return await self.request('GET', url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        """Send an HTTP HEAD request."""
+        return await self.request('HEAD', url, **kwargs)
+
+    async def options(self, url, **kwargs):
+        """Send an HTTP OPTIONS request."""
+        return await self.request('OPTIONS', url, **kwargs)
+
+    async def patch(self, url, json=_SENTINEL, **kwargs):
+        """Send an HTTP PATCH request."""
+        if json is _SENTINEL:
+            return await self.request('PATCH', url, **kwargs)
+        return await self.request('PATCH', url, json=json, **kwargs)
+
+    async def post(self, url, json=_SENTINEL, **kwargs):
+        """Send an HTTP POST request."""
+        if json is _SENTINEL:
+            return await self.request('POST', url, **kwargs)
+        return await self.request('POST', url, json=json, **kwargs)
+
+    async def put(self, url, json=_SENTINEL, **kwargs):
+        """Send an HTTP PUT request."""
+        if json is _SENTINEL:
+            return await self.request('PUT', url, **kwargs)
+        return await self.request('PUT', url, json=json, **kwargs)
+
+    async def request(self, method, url, **kwargs):
+        """Send an HTTP request.
+
+        Arguments passed directly in to this method override (but do not
+        overwrite!) arguments specified in ``self.request_kwargs``.
+        """
+        request_kwargs = _merge_request_kwargs(self, url, kwargs)
+        session = _get_system_async_session(self._cfg, self.pulp_system)
+        async with session.request(
+                method, **_to_aiohttp_kwargs(request_kwargs)) as response:
+            # Read the body before the connection is released, so that the
+            # response handler may read it too.
+            await response.read()
+        return await self.response_handler(self._cfg, response)
+
+
+async def async_poll_spawned_tasks(
+        server_config,
+        call_report,
+        pulp_system=None,
+        timeout=None):
+    """Wait for spawned tasks to complete. Return their final states.
+
+    This is the asyncio counterpart of
+    :func:`pulp_smash.api.poll_spawned_tasks`. Each spawned task is polled
+    concurrently.
+
+    :returns: A list of task bodies, in the same order as
+        :func:`pulp_smash.api.poll_spawned_tasks` would yield them.
+    :raises: Same as :func:`pulp_smash.async_api.async_poll_task`.
+    """
+    if server_config.pulp_version < Version('3'):
+        hrefs = [task['_href'] for task in call_report['spawned_tasks']]
+    else:
+        hrefs = [call_report['_href']]
+    return await _async_poll_all(server_config, hrefs, pulp_system, timeout)
+
+
+async def async_poll_task(server_config, href, pulp_system=None, timeout=None):
+    """Wait for a task and its children to complete. Return their states.
+
+    This is the asyncio counterpart of :func:`pulp_smash.polling.poll_task`.
+    The task is polled with the same backoff and deadline, and its children
+    are polled concurrently. A coroutine is returned, rather than a generator,
+    so that many waits may be passed to ``asyncio.gather()``.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param href: The path to a task you'd like to monitor recursively.
+    :param pulp_system: The system from where to pool the task. If ``None`` is
+        provided then the first system found with api role will be used.
+    :param timeout: How long to wait for each task to complete, in seconds.
+        Defaults to 1800 seconds (30 minutes).
+    :returns: A list of task bodies: the task's, then each of its children's,
+        depth first.
+    :raises pulp_smash.exceptions.TaskTimedOutError: If a task takes too
+        long to complete.
+    """
+    if not pulp_system:
+        pulp_system = server_config.get_systems('api')[0]
+    if timeout is None:
+        timeout = _TASK_TIMEOUT
+    if server_config.pulp_version < Version('3'):
+        task_end_states = _TASK_END_STATES
+    else:
+        task_end_states = _P3_TASK_END_STATES
+    kwargs = _to_aiohttp_kwargs(dict(
+        server_config.get_requests_kwargs(pulp_system),
+        url=urljoin(server_config.get_base_url(pulp_system), href),
+    ))
+    session = _get_system_async_session(server_config, pulp_system)
+    deadline = monotonic() + timeout
+    delays = _poll_delays()
+    while True:
+        async with session.get(**kwargs) as response:
+            response.raise_for_status()
+            attrs = await response.json(content_type=None)
+        if attrs['state'] in task_end_states:
+            children = [task['_href'] for task in attrs['spawned_tasks']]
+            return [attrs] + await _async_poll_all(
+                server_config, children, pulp_system, timeout)
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            raise exceptions.TaskTimedOutError(
+                'Task {} is ongoing after {} seconds.'.format(href, timeout)
+            )
+        await asyncio.sleep(min(next(delays), remaining))
+
+
+async def _async_poll_all(server_config, hrefs, pulp_system, timeout):
+    """Concurrently poll each of ``hrefs``. Return a flat list of states."""
+    results = await asyncio.gather(*(
+        async_poll_task(server_config, href, pulp_system, timeout)
+        for href in hrefs
+    ))
+    return [task for tasks in results for task in tasks]
@@ -0,0 +1,269 @@
+# coding=utf-8
+"""Spread the requests made by API clients over several hosts.
+
+See :class:`pulp_smash.balancing.Balancer`, which
+:class:`pulp_smash.api.Client` and :func:`pulp_smash.polling.poll_tasks`
+consult when a Pulp application has one.
+"""
+import bisect
+import hashlib
+import itertools
+import random
+import threading
+from time import monotonic
+
+import requests
+
+from pulp_smash import cassette
+
+# A mapping between configs and ``Balancer`` objects. Used by `get_balancer`.
+# It is intentionally a global, so that every client and poller working with a
+# given Pulp application shares one view of its hosts' load and health.
+_BALANCERS = {}
+_BALANCERS_LOCK = threading.Lock()
+
+# Response status codes telling that a host is unhealthy. See `Balancer`.
+_UNHEALTHY_STATUSES = frozenset((502, 503, 504))
+
+
+class _Host(object):  # pylint:disable=too-few-public-methods
+    """The load and health of one of the hosts a ``Balancer`` spreads over."""
+
+    def __init__(self, pulp_system):
+        """Initialize this object with needed instance attributes."""
+        # Used to rank hosts for keys. A PulpSystem whose roles are plain
+        # dicts can't be hashed.
+        self.name = '{}:{}'.format(
+            pulp_system.hostname, pulp_system.roles['api'].get('port'))
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejected_until = 0
+
+
+class Balancer(object):
+    """Spread requests over the hosts fulfilling the ``api`` role.
+
+    By default, :class:`pulp_smash.api.Client` and
+    :func:`pulp_smash.polling.poll_tasks` talk to the first host fulfilling the
+    ``api`` role. Balancing is opt-in: if the first such host's ``api`` role
+    has a ``balance`` section, whose keys are the names of this class's
+    arguments (apart from ``systems``), then clients and pollers created
+    without a ``pulp_system`` share one balancer over every such host. See
+    :func:`pulp_smash.balancing.get_balancer`. For example::
+
+        "api": {"scheme": "https", "balance": {"strategy": "round-robin"}}
+
+    The strategies are:
+
+    ``round-robin``
+        Hosts take turns.
+    ``least-outstanding``
+        The host with the fewest requests in flight is chosen. Ties are
+        broken by taking turns.
+    ``latency-weighted``
+        Hosts are chosen at random, weighted by the inverse of their recent
+        response times. Hosts that haven't answered yet weigh as much as the
+        fastest host.
+
+    A host is ejected when ``eject_after`` requests in a row fail with a
+    connection error or an HTTP 502, 503 or 504 response. It is given
+    another chance after ``eject_for`` seconds, and ejected again at once if
+    that request fails too. If every host is ejected, the one due back first
+    is chosen anyway.
+
+    Requests that share a key, such as the polls of a task, are routed to the
+    same host, for as long as it is healthy. The host is picked by
+    rendezvous hashing, so that ejecting a host only moves the keys it had.
+
+    :param systems: The :class:`pulp_smash.config.PulpSystem` objects to
+        balance over.
+    :param strategy: One of ``STRATEGIES``.
+    :param eject_after: The number of failures in a row that eject a host.
+    :param eject_for: How long an ejected host is left out, in seconds.
+    """
+
+    STRATEGIES = ('latency-weighted', 'least-outstanding', 'round-robin')
+
+    # How much the latest response time weighs in a host's average.
+    LATENCY_WEIGHT = 0.3
+
+    def __init__(
+            self,
+            systems,
+            strategy='round-robin',
+            eject_after=3,
+            eject_for=30):
+        """Initialize this object with needed instance attributes."""
+        if strategy not in self.STRATEGIES:
+            raise ValueError(
+                'The given strategy, {}, is not recognized. Valid strategies '
+                'are: {}'.format(strategy, self.STRATEGIES)
+            )
+        self.systems = tuple(systems)
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_for = eject_for
+        # Hosts are tracked by index, as a PulpSystem whose roles are plain
+        # dicts can't be hashed.
+        self._hosts = tuple(_Host(system) for system in self.systems)
+        self._turn = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, key=None):
+        """Choose a host, and count a request to it as in flight.
+
+        :param key: If given, route every request with this key to the same
+            host, rather than following the strategy.
+        :returns: A :class:`pulp_smash.config.PulpSystem`. Pass it to
+            :meth:`release` once the request has been answered.
+        """
+        with self._lock:
+            candidates = self._get_candidates()
+            if key is not None:
+                index = max(candidates, key=lambda i: self._rank(key, i))
+            elif self.strategy == 'round-robin':
+                index = self._take_turn(candidates)
+            elif self.strategy == 'least-outstanding':
+                fewest = min(self._hosts[i].outstanding for i in candidates)
+                index = self._take_turn([
+                    i for i in candidates
+                    if self._hosts[i].outstanding == fewest
+                ])
+            else:
+                index = self._weigh(candidates)
+            self._hosts[index].outstanding += 1
+            return self.systems[index]
+
+    def release(self, pulp_system, seconds, healthy=True):
+        """Count a request to a host as answered.
+
+        :param pulp_system: A host returned by :meth:`acquire`.
+        :param seconds: How long the host took to answer.
+        :param healthy: Whether the host answered well enough. Pass ``False``
+            after a connection error or an HTTP 502, 503 or 504 response.
+        """
+        host = self._hosts[self.systems.index(pulp_system)]
+        with self._lock:
+            host.outstanding -= 1
+            if healthy:
+                host.failures = 0
+                host.ejected_until = 0
+                if host.latency is None:
+                    host.latency = seconds
+                else:
+                    host.latency += self.LATENCY_WEIGHT * (
+                        seconds - host.latency)
+                return
+            host.failures += 1
+            if host.failures >= self.eject_after:
+                host.ejected_until = monotonic() + self.eject_for
+
+    def get_healthy(self):
+        """Return the hosts that haven't been ejected."""
+        with self._lock:
+            now = monotonic()
+            return tuple(
+                system for system, host in zip(self.systems, self._hosts)
+                if host.ejected_until <= now
+            )
+
+    def _get_candidates(self):
+        """Return the indices of the hosts that may be chosen."""
+        now = monotonic()
+        candidates = [
+            index for index, host in enumerate(self._hosts)
+            if host.ejected_until <= now
+        ]
+        if not candidates:
+            candidates = [min(
+                range(len(self._hosts)),
+                key=lambda index: self._hosts[index].ejected_until,
+            )]
+        return candidates
+
+    def _take_turn(self, candidates):
+        """Return the next of ``candidates`` in turn."""
+        self._turn += 1
+        return candidates[self._turn % len(candidates)]
+
+    def _weigh(self, candidates):
+        """Choose one of ``candidates`` at random, favouring fast hosts."""
+        latencies = [self._hosts[index].latency for index in candidates]
+        fastest = max(
+            (1 / max(latency, 1e-6)
+             for latency in latencies if latency is not None),
+            default=1,
+        )
+        weights = [
+            fastest if latency is None else 1 / max(latency, 1e-6)
+            for latency in latencies
+        ]
+        # random.choices() would do, but it is new in Python 3.6.
+        cumulative = list(itertools.accumulate(weights))
+        index = bisect.bisect(cumulative, random.uniform(0, cumulative[-1]))
+        return candidates[min(index, len(candidates) - 1)]
+
+    def _rank(self, key, index):
+        """Return how strongly ``key`` prefers the host at ``index``."""
+        return hashlib.sha1(
+            '{}\n{}'.format(key, self._hosts[index].name).encode('utf-8')
+        ).digest()
+
+
+def get_balancer(server_config):
+    """Return the shared balancer for a Pulp application, or ``None``.
+
+    A balancer is returned if the application has several hosts fulfilling
+    the ``api`` role, and the first of them has a ``balance`` section in its
+    ``api`` role. See :class:`pulp_smash.balancing.Balancer`.
+
+    Balancing is skipped while a cassette is in use, so that requests are
+    recorded and replayed against the same host. See
+    :mod:`pulp_smash.cassette`.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :returns: A :class:`pulp_smash.balancing.Balancer`, or ``None``.
+    """
+    systems = server_config.get_systems('api')
+    if len(systems) < 2 or cassette.get_cassette() is not None:
+        return None
+    settings = systems[0].roles['api'].get('balance')
+    if settings is None:
+        return None
+    with _BALANCERS_LOCK:
+        if server_config not in _BALANCERS:
+            _BALANCERS[server_config] = Balancer(systems, **settings)
+        return _BALANCERS[server_config]
+
+
+def release_request(
+        balancer,
+        pulp_system,
+        start,
+        response=None,
+        error=None):
+    """Tell ``balancer`` how a request to ``pulp_system`` went.
+
+    The request counts as unhealthy if it failed with a connection error or
+    a timeout, or was answered with an HTTP 502, 503 or 504 response.
+
+    :param balancer: A :class:`pulp_smash.balancing.Balancer`.
+    :param pulp_system: The host returned by
+        :meth:`pulp_smash.balancing.Balancer.acquire`.
+    :param start: When the request was sent, as returned by ``monotonic()``.
+    :param response: The ``requests.Response`` received, if any.
+    :param error: The exception raised instead, if any.
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+    if isinstance(error, (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout)):
+        healthy = False
+    else:
+        healthy = (
+            response is None or
+            response.status_code not in _UNHEALTHY_STATUSES
+        )
+    balancer.release(pulp_system, monotonic() - start, healthy)
@@ -0,0 +1,93 @@
+# coding=utf-8
+r"""Run several commands in one shell, and tell their results apart.
+
+See :meth:`pulp_smash.cli.Client.run_batch`. For example, this costs one round
+trip to the host instead of three:
+
+>>> from pulp_smash import cli, config
+>>> client = cli.Client(config.get_config())
+>>> results = client.run_batch((
+...     ('mkdir', '/tmp/foo'),
+...     ('touch', '/tmp/foo/bar'),
+...     ('ls', '/tmp/foo'),
+... ))
+>>> results[2].stdout
+'bar\n'
+
+The commands are joined into a single ``sh`` script by :func:`get_script`.
+After each command, a line with a marker and the command's return code is
+printed to standard output and standard error. :func:`split_results` splits
+the output of the shell along these lines.
+"""
+import re
+import shlex
+import uuid
+
+
+def get_marker():
+    """Return a string to tell the output of a batch's commands apart.
+
+    The marker is a UUID, so that it can't be mistaken for a command's output,
+    and so that cassettes can replay the batch. See :mod:`pulp_smash.cassette`.
+    """
+    return str(uuid.uuid4())
+
+
+def get_script(commands, marker, stop_on_error=True):
+    """Return a ``sh`` script running ``commands`` one after another.
+
+    :param commands: A sequence of sequences of arguments.
+    :param marker: A string returned by :func:`get_marker`.
+    :param stop_on_error: Whether to exit after a command with a non-zero
+        return code, skipping the commands that follow.
+    :returns: A string.
+    """
+    lines = []
+    for index, args in enumerate(commands):
+        lines.append(' '.join(shlex.quote(str(arg)) for arg in args))
+        lines.append(
+            'code=$?; '
+            "printf '{0} {1} %d\\n' $code; "
+            "printf '{0} {1} %d\\n' $code >&2"
+            .format(marker, index)
+        )
+        if stop_on_error:
+            lines.append('[ $code -eq 0 ] || exit $code')
+    return '\n'.join(lines)
+
+
+def split_results(commands, marker, code, stdout, stderr):
+    """Split the output of a script returned by :func:`get_script`.
+
+    :param commands: The commands passed to :func:`get_script`.
+    :param marker: The marker passed to :func:`get_script`.
+    :param code: The return code of the shell.
+    :param stdout: The standard output of the shell.
+    :param stderr: The standard error of the shell.
+    :returns: A list of ``(args, returncode, stdout, stderr)`` tuples, one per
+        command run. If the shell ended without reporting on a command that
+        should have run, such as when the shell can't be started, the last
+        tuple blames that command, with the shell's return code.
+    """
+    codes, stdouts = _split_output(marker, stdout or '')
+    stderrs = _split_output(marker, stderr or '')[1]
+    results = [
+        (args, codes[index], stdouts[index], stderrs[index])
+        for index, args in enumerate(commands[:len(codes)])
+    ]
+    if len(codes) < len(commands) and (not codes or codes[-1] == 0):
+        results.append((commands[len(codes)], code, stdouts[-1], stderrs[-1]))
+    return results
+
+
+def _split_output(marker, output):
+    """Split one output of a script returned by :func:`get_script`.
+
+    :returns: A ``(codes, outputs)`` tuple. ``codes`` lists the return code
+        reported after each command. ``outputs`` lists what each command
+        printed, followed by what was printed after the last marker.
+    """
+    pattern = re.compile(r'{} [0-9]+ (-?[0-9]+)\n'.format(re.escape(marker)))
+    codes = [int(code) for code in pattern.findall(output)]
+    outputs = pattern.split(output)[::2]
+    return codes, outputs
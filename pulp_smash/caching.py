@@ -0,0 +1,208 @@
+# coding=utf-8
+"""Cache responses to the GET requests made by API clients.
+
+See :class:`pulp_smash.caching.ResponseCache`, which
+:class:`pulp_smash.api.Client` consults when given one.
+"""
+import collections
+import fnmatch
+import threading
+from time import monotonic
+from urllib.parse import urlsplit
+
+import requests
+from requests.models import PreparedRequest
+
+# A mapping between (hostname, port) pairs and ``ResponseCache`` objects. Used
+# by `get_response_cache`. It is intentionally a global, so that every client
+# talking to a given host shares one cache.
+_RESPONSE_CACHES = {}
+_RESPONSE_CACHES_LOCK = threading.Lock()
+
+_CacheEntry = collections.namedtuple(
+    '_CacheEntry', ('response', 'expires', 'validators'))
+
+
+class ResponseCache(object):
+    """An LRU cache of responses to GET requests made by API clients.
+
+    Assign an instance to :attr:`pulp_smash.api.Client.response_cache` to make
+    a client consult it. Caching is opt-in: clients have no cache unless one
+    is passed to them, or the host's ``api`` role has a ``cache`` section,
+    whose keys are the names of this class's arguments. In the latter case,
+    every client talking to the host shares one cache.
+
+    A response to a GET request is stored if its status code is 200. For as
+    long as its time to live (TTL) allows, it is served without contacting
+    the server. After that, or if it has no TTL, the server is asked whether
+    the response is still current with a conditional request, using the
+    response's ``ETag`` and ``Last-Modified`` headers. If the server answers
+    HTTP 304, the stored response is served. Responses that have neither a
+    TTL nor a validator aren't stored, as they can't be served safely.
+
+    TTLs are set per path, with shell-style patterns matched against the
+    request URL's path. For example, this serves Pulp 2's list of content
+    unit types and each published ``repomd.xml`` from memory for an hour and
+    a minute, respectively:
+
+    >>> from pulp_smash import api, caching, config, constants
+    >>> client = api.Client(config.get_config(), api.json_handler)
+    >>> client.response_cache = caching.ResponseCache(ttls={
+    ...     constants.PLUGIN_TYPES_PATH: 3600,
+    ...     '*/repodata/repomd.xml': 60,
+    ... })
+
+    A POST, PUT, PATCH or DELETE request evicts the responses cached for the
+    targeted resource, for the collections containing it and for the
+    resources it contains. For example, a POST to
+    ``/pulp/api/v2/repositories/foo/actions/sync/`` evicts
+    ``/pulp/api/v2/repositories/foo/?details=true``. Beware that changes made
+    later by an asynchronous task aren't noticed, so only give TTLs to
+    resources that don't change while a test runs.
+
+    :param max_entries: The maximum number of responses to store. The least
+        recently used response is evicted first.
+    :param ttl: The TTL of responses whose path matches none of ``ttls``, in
+        seconds.
+    :param ttls: A mapping between path patterns and TTLs, in seconds. The
+        first matching pattern wins.
+    """
+
+    MUTATING_METHODS = frozenset(('DELETE', 'PATCH', 'POST', 'PUT'))
+
+    def __init__(self, max_entries=256, ttl=0, ttls=None):
+        """Initialize this object with needed instance attributes."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.ttls = collections.OrderedDict(ttls or {})
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of responses stored."""
+        return len(self._entries)
+
+    def get_ttl(self, url):
+        """Return the TTL of responses to requests for ``url``, in seconds."""
+        path = urlsplit(url).path
+        for pattern, ttl in self.ttls.items():
+            if fnmatch.fnmatchcase(path, pattern):
+                return ttl
+        return self.ttl
+
+    def clear(self):
+        """Evict every response."""
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, url):
+        """Evict responses for ``url``, its ancestors and its descendants."""
+        path = urlsplit(url).path.rstrip('/') + '/'
+        with self._lock:
+            for key in tuple(self._entries):
+                other = urlsplit(key[0]).path.rstrip('/') + '/'
+                if path.startswith(other) or other.startswith(path):
+                    del self._entries[key]
+
+    def request(self, send, method, request_kwargs):
+        """Make a request with ``send``, consulting and updating this cache.
+
+        :param send: A function that accepts ``request_kwargs``, sends a
+            request, and returns a ``requests.Response``.
+        :param method: The request's HTTP method.
+        :param request_kwargs: Arguments for ``requests.Session.request``,
+            including ``url``.
+        :returns: A ``requests.Response``, which may have been cached.
+        """
+        method = method.upper()
+        if method in self.MUTATING_METHODS:
+            # Evict before sending, in case the request fails halfway, and
+            # after, in case a concurrent GET cached a stale response.
+            self.invalidate(request_kwargs['url'])
+            try:
+                return send(request_kwargs)
+            finally:
+                self.invalidate(request_kwargs['url'])
+        if method != 'GET' or request_kwargs.get('stream'):
+            return send(request_kwargs)
+        key = _get_cache_key(request_kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and monotonic() < entry.expires:
+            self.hits += 1
+            return entry.response
+        if entry is not None:
+            headers = dict(request_kwargs.get('headers') or {})
+            headers.update(entry.validators)
+            request_kwargs = dict(request_kwargs, headers=headers)
+        response = send(request_kwargs)
+        if entry is not None and response.status_code == 304:
+            self.hits += 1
+            self._store(key, entry.response)
+            return entry.response
+        self.misses += 1
+        if response.status_code == 200:
+            self._store(key, response)
+        return response
+
+    def _store(self, key, response):
+        """Store ``response`` under ``key``, if it can be served again."""
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        validators = {}
+        if 'ETag' in response.headers:
+            validators['If-None-Match'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
+        ttl = self.get_ttl(key[0])
+        if not ttl and not validators:
+            return
+        entry = _CacheEntry(response, monotonic() + ttl, validators)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _get_cache_key(request_kwargs):
+    """Return a key identifying the response to a GET request.
+
+    The key is made of the full URL, including query parameters, and of
+    whatever else may change the response: headers and credentials.
+    """
+    prepared = PreparedRequest()
+    prepared.prepare_url(request_kwargs['url'], request_kwargs.get('params'))
+    headers = tuple(sorted(
+        (name.lower(), value)
+        for name, value in (request_kwargs.get('headers') or {}).items()
+    ))
+    auth = request_kwargs.get('auth')
+    if isinstance(auth, requests.auth.HTTPBasicAuth):
+        auth = (auth.username, auth.password)
+    elif auth is not None and not isinstance(auth, tuple):
+        auth = id(auth)
+    return (prepared.url, headers, auth)
+
+
+def get_response_cache(pulp_system):
+    """Return the shared cache for the given host's API, or ``None``.
+
+    A cache is returned if the host's ``api`` role has a ``cache`` section.
+    See :class:`pulp_smash.caching.ResponseCache`.
+
+    :param pulp_system: A :class:`pulp_smash.config.PulpSystem`.
+    :returns: A :class:`pulp_smash.caching.ResponseCache`, or ``None``.
+    """
+    settings = pulp_system.roles['api'].get('cache')
+    if settings is None:
+        return None
+    key = (pulp_system.hostname, pulp_system.roles['api'].get('port'))
+    with _RESPONSE_CACHES_LOCK:
+        if key not in _RESPONSE_CACHES:
+            _RESPONSE_CACHES[key] = ResponseCache(**settings)
+        return _RESPONSE_CACHES[key]
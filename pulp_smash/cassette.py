@@ -0,0 +1,412 @@
+# coding=utf-8
+"""Record HTTP requests and commands, and replay them without a Pulp host.
+
+A :class:`Cassette` records every HTTP exchange made through the sessions
+returned by :func:`pulp_smash.sessions.get_session`, which includes those made
+by :class:`pulp_smash.api.Client` and :func:`pulp_smash.polling.poll_task`,
+and every command run by :meth:`pulp_smash.cli.Client.run`. When a cassette
+is replayed, each request and command is answered from the recording, and no
+Pulp host is contacted. This lets changes to test logic be checked in
+seconds:
+
+>>> from pulp_smash import cassette
+>>> with cassette.use(cassette.Cassette('/tmp/test_sync', 'record')):
+...     pass  # Talk to Pulp.
+>>> with cassette.use(cassette.Cassette('/tmp/test_sync', 'replay')):
+...     pass  # Talk to Pulp again, but offline.
+
+A cassette may also be used for a whole test run by setting the
+``PULP_SMASH_CASSETTE`` environment variable to a directory. The
+``PULP_SMASH_CASSETTE_MODE`` environment variable may be set to "record" or
+"replay". By default, a cassette is replayed if it has been recorded, and
+recorded otherwise.
+
+A cassette is a directory. The recorded exchanges are listed in
+``cassette.json``, and response bodies and command outputs are stored in
+``bodies/``, in files named after the SHA-256 digest of their contents. As a
+result, identical bodies, such as repeated task reports, are stored once.
+
+Requests and commands are matched on their method, URL and body, or their
+host and arguments. Tests name resources with random UUIDs, such as those
+returned by :func:`pulp_smash.utils.uuid4`, so UUIDs are numbered in the
+order they are first seen before being compared. When a recording is
+replayed, the UUIDs in it are replaced by the UUIDs seen during the replay.
+If a request is made several times, its recorded responses are served in
+order, and the last one is served again if the replay makes more requests
+than the recording did. A response requested with ``stream=True`` is recorded
+once its whole body has been read, so that recording doesn't read it early.
+
+Only :meth:`pulp_smash.cli.Client.run` is replayed. Code that uses a CLI
+client's ``machine`` directly can't be replayed.
+"""
+import atexit
+import collections
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from pulp_smash import exceptions
+
+MODES = ('record', 'replay')
+
+# Strings such as those returned by pulp_smash.utils.uuid4().
+_UUID = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}',
+    re.IGNORECASE,
+)
+
+# The boundary parameter of a multipart Content-Type header. Requests makes
+# a random boundary for each multipart request body.
+_BOUNDARY = re.compile(r'boundary=([^\s;]+)')
+
+
+class Cassette(object):
+    """A recording of HTTP exchanges and commands. See module docs.
+
+    :param path: The directory holding the recording.
+    :param mode: "record" or "replay". Defaults to "replay" if ``path`` holds
+        a recording, and "record" otherwise.
+    """
+
+    def __init__(self, path, mode=None):
+        """Initialize this object with needed instance attributes."""
+        self.path = path
+        if mode is None:
+            mode = 'replay' if os.path.exists(self._index_path) else 'record'
+        if mode not in MODES:
+            raise ValueError(
+                'mode must be one of {}, not {!r}'.format(MODES, mode))
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._uuids = []  # UUIDs, in the order they were first seen.
+        self._interactions = []
+        self._recorded_uuids = {}
+        self._queues = collections.defaultdict(collections.deque)
+        if mode == 'replay':
+            with open(self._index_path) as handle:
+                index = json.load(handle)
+            self._recorded_uuids = {
+                uuid: ordinal for ordinal, uuid in enumerate(index['uuids'])
+            }
+            for interaction in index['interactions']:
+                key = _get_key(interaction)
+                self._queues[key].append(interaction)
+
+    @property
+    def _index_path(self):
+        """Return the path to the file listing recorded exchanges."""
+        return os.path.join(self.path, 'cassette.json')
+
+    def save(self):
+        """Write the recorded exchanges to disk, if recording."""
+        if self.mode != 'record':
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            index = {'uuids': self._uuids, 'interactions': self._interactions}
+            text = json.dumps(index, indent=2, sort_keys=True)
+        temp_path = '{}.{}.tmp'.format(self._index_path, os.getpid())
+        with open(temp_path, 'w') as handle:
+            handle.write(text)
+        os.replace(temp_path, self._index_path)
+
+    def send(self, request, send, stream=False):
+        """Answer an HTTP request, recording or replaying it.
+
+        If ``stream`` is true, the response body isn't read here, but as the
+        caller reads it, and the exchange is recorded once the whole body has
+        been read. A streamed response that is closed early isn't recorded.
+
+        :param request: A ``requests.PreparedRequest``.
+        :param send: A function that accepts ``request``, sends it, and returns
+            a ``requests.Response``. Used when recording.
+        :param stream: Whether the request was sent with ``stream=True``.
+        :returns: A ``requests.Response``.
+        """
+        body = request.body
+        if hasattr(body, 'read'):
+            body = body.read()
+            request.body = body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        elif isinstance(body, (bytearray, memoryview)):
+            body = bytes(body)
+        elif not isinstance(body, bytes):
+            body = None  # Such as a generator, which can't be read twice.
+        match = _BOUNDARY.search(request.headers.get('Content-Type', ''))
+        if match and body:
+            body = body.replace(match.group(1).encode('latin-1'), b'boundary')
+        with self._lock:
+            interaction = {
+                'kind': 'http',
+                'method': request.method,
+                'url': self._normalize(request.url),
+                'body': _digest(self._normalize(body)) if body else None,
+            }
+            if self.mode == 'replay':
+                recorded = self._pop(interaction)
+                response = Response()
+                response.status_code = recorded['status']
+                response.reason = recorded['reason']
+                response.url = self._denormalize(recorded['response_url'])
+                response.headers = CaseInsensitiveDict({
+                    name: self._denormalize(value)
+                    for name, value in recorded['headers'].items()
+                })
+                response.encoding = get_encoding_from_headers(
+                    response.headers)
+                # pylint:disable=protected-access
+                response._content = self._denormalize(
+                    self._read(recorded['content']))
+                response._content_consumed = True
+                response.raw = io.BytesIO(response.content)
+                response.request = request
+                return response
+        response = send(request)
+        interaction.update({
+            'status': response.status_code,
+            'reason': response.reason,
+            'response_url': response.url,
+            'headers': dict(response.headers),
+        })
+        if stream:
+            response.raw = _RecordingStream(
+                response.raw, functools.partial(self._record, interaction))
+        else:
+            self._record(interaction, response.content)
+        return response
+
+    def _record(self, interaction, content):
+        """Record an HTTP exchange, whose response body is ``content``."""
+        with self._lock:
+            interaction['content'] = self._write(content)
+            # Number the UUIDs made by the server, as _denormalize() will.
+            self._normalize(content)
+            self._interactions.append(interaction)
+
+    def run(self, hostname, args, stdin, run):
+        """Answer a command, recording or replaying it.
+
+        :param hostname: The host on which the command is run.
+        :param args: The command's arguments, as passed to
+            :meth:`pulp_smash.cli.Client.run`.
+        :param stdin: The command's standard input, or ``None``.
+        :param run: A function that runs the command and returns a
+            ``(returncode, stdout, stderr)`` tuple. Used when recording.
+        :returns: A ``(returncode, stdout, stderr)`` tuple.
+        """
+        with self._lock:
+            interaction = {
+                'kind': 'cli',
+                'hostname': hostname,
+                'args': [self._normalize(str(arg)) for arg in args],
+                'stdin': (
+                    _digest(self._normalize(stdin.encode('utf-8')))
+                    if stdin else None
+                ),
+            }
+            if self.mode == 'replay':
+                recorded = self._pop(interaction)
+                return (
+                    recorded['returncode'],
+                    self._denormalize(self._read(recorded['stdout']))
+                    .decode('utf-8'),
+                    self._denormalize(self._read(recorded['stderr']))
+                    .decode('utf-8'),
+                )
+        code, stdout, stderr = run()
+        with self._lock:
+            interaction['returncode'] = code
+            for name, output in (('stdout', stdout), ('stderr', stderr)):
+                output = (output or '').encode('utf-8')
+                interaction[name] = self._write(output)
+                self._normalize(output)
+            self._interactions.append(interaction)
+        return code, stdout, stderr
+
+    def _pop(self, interaction):
+        """Return the next recorded answer to ``interaction``."""
+        queue = self._queues.get(_get_key(interaction))
+        if not queue:
+            raise exceptions.CassetteMissError(self.path, interaction)
+        if len(queue) > 1:
+            return queue.popleft()
+        return queue[0]
+
+    def _normalize(self, text):
+        """Replace each UUID in ``text`` by its ordinal, like ``{uuid0}``.
+
+        UUIDs not seen before are given the next ordinal. ``text`` may be a
+        string or bytes.
+        """
+        if isinstance(text, bytes):
+            return self._normalize(text.decode('latin-1')).encode('latin-1')
+
+        def replace(match):
+            """Return the ordinal of the matched UUID."""
+            uuid = match.group(0).lower()
+            if uuid not in self._uuids:
+                self._uuids.append(uuid)
+            return '{{uuid{}}}'.format(self._uuids.index(uuid))
+
+        return _UUID.sub(replace, text)
+
+    def _denormalize(self, text):
+        """Replace recorded UUIDs in ``text`` by the UUIDs seen in replay.
+
+        A recorded UUID that hasn't been seen in replay was made by the server
+        while recording. The server is assumed to make it again.
+        """
+        if isinstance(text, bytes):
+            return self._denormalize(text.decode('latin-1')).encode('latin-1')
+
+        def replace(match):
+            """Return the replayed UUID matching the recorded UUID."""
+            ordinal = self._recorded_uuids.get(match.group(0).lower())
+            if ordinal is None:
+                return match.group(0)
+            if ordinal == len(self._uuids):
+                self._uuids.append(match.group(0).lower())
+            if ordinal < len(self._uuids):
+                return self._uuids[ordinal]
+            return match.group(0)
+
+        return _UUID.sub(replace, text)
+
+    def _write(self, content):
+        """Store ``content`` under its digest, and return the digest."""
+        digest = _digest(content)
+        path = os.path.join(self.path, 'bodies', digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.write(content)
+        return digest
+
+    def _read(self, digest):
+        """Return the content stored under ``digest``."""
+        with open(os.path.join(self.path, 'bodies', digest), 'rb') as handle:
+            return handle.read()
+
+
+def _digest(content):
+    """Return the hexadecimal SHA-256 digest of ``content``."""
+    return hashlib.sha256(content).hexdigest()
+
+
+class _RecordingStream(object):
+    """Wrap the ``raw`` attribute of a streamed response, keeping what is read.
+
+    Requests reads a streamed body through ``raw.stream`` or ``raw.read``.
+    Once either reports the end of the body, ``finish`` is called with every
+    byte read. Other attributes are looked up on the wrapped object.
+
+    :param raw: The ``raw`` attribute of a ``requests.Response``.
+    :param finish: A function accepting the body, as bytes.
+    """
+
+    def __init__(self, raw, finish):
+        """Initialize this object with needed instance attributes."""
+        self._raw = raw
+        self._finish = finish
+        self._chunks = []
+
+    def __getattr__(self, name):
+        """Look up ``name`` on the wrapped object."""
+        return getattr(self._raw, name)
+
+    def read(self, *args, **kwargs):
+        """Read from the wrapped object, and keep what is read."""
+        amt = args[0] if args else kwargs.get('amt')
+        data = self._raw.read(*args, **kwargs)
+        self._keep(data, amt is None or not data)
+        return data
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        """Yield chunks from the wrapped object, and keep them."""
+        if hasattr(self._raw, 'stream'):
+            chunks = self._raw.stream(amt, decode_content=decode_content)
+        else:
+            chunks = iter(functools.partial(self._raw.read, amt), b'')
+        for chunk in chunks:
+            self._keep(chunk, False)
+            yield chunk
+        self._keep(b'', True)
+
+    def _keep(self, data, last):
+        """Keep ``data``. If ``last``, pass the whole body to ``finish``."""
+        if self._chunks is None:
+            return
+        self._chunks.append(data or b'')
+        if last:
+            chunks, self._chunks = self._chunks, None
+            self._finish(b''.join(chunks))
+
+
+def _get_key(interaction):
+    """Return what identifies a request or command among others."""
+    if interaction['kind'] == 'http':
+        return ('http', interaction['method'], interaction['url'],
+                interaction['body'])
+    return ('cli', interaction['hostname'], tuple(interaction['args']),
+            interaction['stdin'])
+
+
+class CassetteAdapter(HTTPAdapter):
+    """A transport adapter that consults the active cassette, if any.
+
+    :func:`pulp_smash.sessions.get_session` mounts this adapter on every
+    session. When no cassette is in use, it behaves like its parent class.
+    """
+
+    def send(self, request, **kwargs):  # pylint:disable=arguments-differ
+        """Send ``request``, or answer it from the active cassette."""
+        cassette = get_cassette()
+        if cassette is None:
+            return super().send(request, **kwargs)
+        send = functools.partial(super().send, **kwargs)
+        response = cassette.send(request, send, kwargs.get('stream', False))
+        response.connection = self
+        return response
+
+
+# The cassette in use. See use().
+_CASSETTE = None
+
+
+def get_cassette():
+    """Return the cassette in use, or ``None``."""
+    return _CASSETTE
+
+
+@contextlib.contextmanager
+def use(cassette):
+    """Record or replay requests and commands made in this context.
+
+    When the context is exited, a recording is saved.
+    """
+    global _CASSETTE  # pylint:disable=global-statement
+    previous, _CASSETTE = _CASSETTE, cassette
+    try:
+        yield cassette
+    finally:
+        _CASSETTE = previous
+        cassette.save()
+
+
+if os.environ.get('PULP_SMASH_CASSETTE'):
+    _CASSETTE = Cassette(
+        os.environ['PULP_SMASH_CASSETTE'],
+        os.environ.get('PULP_SMASH_CASSETTE_MODE'),
+    )
+    atexit.register(_CASSETTE.save)
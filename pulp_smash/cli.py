@@ -1,25 +1,26 @@
 # coding=utf-8
 """A client for working with Pulp hosts via their CLI."""
+import collections
 import contextlib
 import os
+import queue
 import socket
+import threading
 from abc import ABCMeta, abstractmethod
-from urllib.parse import urlsplit
+from time import monotonic
 
 import plumbum
 
-from pulp_smash import exceptions
-
-
-# A dict mapping hostnames to *nix service managers.
-#
-# For example: {'old.example.com': 'sysv', 'new.example.com', 'systemd'}
-_SERVICE_MANAGERS = {}
-
-# A dict mapping hostnames to *nix package managers.
-#
-# For example: {'old.example.com': 'yum', 'new.example.com', 'yum'}
-_PACKAGE_MANAGERS = {}
+from pulp_smash import (
+    batching,
+    cassette,
+    exceptions,
+    facts,
+    instrumentation,
+    phases,
+    readiness,
+    ssh,
+)
 
 
 def _is_root(cfg, pulp_system=None):
@@ -31,10 +32,29 @@ def _is_root(cfg, pulp_system=None):
         instead of the first host with the ``pulp cli`` role.
     :returns: Either ``True`` or ``False``.
     """
-    result = Client(cfg, pulp_system=pulp_system).run(('id', '-u'))
-    if result.stdout.strip() == '0':
-        return True
-    return False
+    return get_facts(cfg, pulp_system)['uid'] == '0'
+
+
+def get_facts(cfg, pulp_system=None):
+    """Return facts about a host, such as its service manager.
+
+    The facts are gathered by one command, and cached. See
+    :func:`pulp_smash.facts.get_facts`.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about a Pulp
+        application.
+    :param pulp_smash.config.PulpSystem pulp_system: A specific host to target,
+        instead of the first host with the ``pulp cli`` role.
+    :returns: A dict mapping fact names to strings.
+    """
+    if pulp_system is None:
+        pulp_system = cfg.get_systems('pulp cli')[0]
+
+    def run(args):
+        """Run a command on the host, and return its standard output."""
+        return Client(cfg, pulp_system=pulp_system).run(args).stdout
+
+    return facts.get_facts(pulp_system.hostname, run)
 
 
 def echo_handler(completed_proc):
@@ -168,7 +188,12 @@ class Client(object):  # pylint:disable=too-few-public-methods
     the constructor will guess how to set ``machine`` by comparing the hostname
     embedded in ``pulp_system.hostname`` against the current host's hostname.
     If they match, ``machine`` is set to execute commands locally; and vice
-    versa.
+    versa. Clients that execute commands over SSH share one machine per host.
+    See :func:`pulp_smash.ssh.get_ssh_machine`.
+
+    Commands may be recorded and replayed by a cassette. When a cassette is
+    replayed, remote hosts aren't connected to, and ``machine`` is ``None``.
+    See :mod:`pulp_smash.cassette`.
 
     :param pulp_smash.config.PulpSmashConfig server_config: Information about
         the host on which commands will be executed.
@@ -192,12 +217,12 @@ class Client(object):  # pylint:disable=too-few-public-methods
             transport = 'local' if hostname == socket.getfqdn() else 'ssh'
         if transport == 'local':
             self.machine = plumbum.machines.local
+        elif getattr(cassette.get_cassette(), 'mode', None) == 'replay':
+            # Commands are answered by the cassette, so don't connect to the
+            # host. See pulp_smash.cassette.
+            self.machine = None
         else:  # transport == 'ssh'
-            # The SshMachine is a wrapper around the system's "ssh" binary.
-            # Thus, it uses ~/.ssh/config, ~/.ssh/known_hosts, etc.
-            self.machine = (
-                plumbum.machines.SshMachine(hostname)
-            )
+            self.machine = ssh.get_ssh_machine(hostname)
 
         # How do we handle responses?
         if response_handler is None:
@@ -205,7 +230,13 @@ class Client(object):  # pylint:disable=too-few-public-methods
         else:
             self.response_handler = response_handler
 
-    def run(self, args, **kwargs):
+    def run(
+            self,
+            args,
+            on_stdout=None,
+            on_stderr=None,
+            keep_lines=None,
+            **kwargs):
         """Run a command and ``return self.response_handler(result)``.
 
         This method is a thin wrapper around Plumbum's `BaseCommand.run`_
@@ -213,19 +244,327 @@ class Client(object):  # pylint:disable=too-few-public-methods
         `subprocess.Popen`_ class. See their documentation for detailed usage
         instructions. See :class:`pulp_smash.cli.Client` for a usage example.
 
+        To handle output as it is printed, instead of once the command exits,
+        pass a callback. Each line is passed to it:
+
+        >>> from pulp_smash import cli, config
+        >>> client = cli.Client(config.get_config())
+        >>> client.run(('pulp-manage-db',), on_stdout=print, keep_lines=100)
+
+        In that case, the command is run by :meth:`stream`, and only the last
+        ``keep_lines`` lines of output are kept in the result.
+
+        :param args: The command's arguments.
+        :param on_stdout: A function called with each line of standard output.
+        :param on_stderr: A function called with each line of standard error.
+        :param keep_lines: How many of the last lines of each output to keep.
+            Defaults to every line. Setting it streams the command's output.
+        :param kwargs: Passed to Plumbum.
+
         .. _BaseCommand.run:
            http://plumbum.readthedocs.io/en/latest/api/commands.html#plumbum.commands.base.BaseCommand.run
         .. _subprocess.Popen:
            https://docs.python.org/3/library/subprocess.html#subprocess.Popen
         """
+        if on_stdout or on_stderr or keep_lines is not None:
+            callbacks = {'stdout': on_stdout, 'stderr': on_stderr}
+            with self.stream(args, keep_lines, **kwargs) as lines:
+                for name, line in lines:
+                    if callbacks[name] is not None:
+                        callbacks[name](line)
+            return lines.result
         # Let self.response_handler check return codes. See:
         # https://plumbum.readthedocs.io/en/latest/api/commands.html#plumbum.commands.base.BaseCommand.run
         kwargs.setdefault('retcode')
-
-        code, stdout, stderr = self.machine[args[0]].run(args[1:], **kwargs)
+        code, stdout, stderr = self._run(args, kwargs)
         completed_process = CompletedProcess(args, code, stdout, stderr)
         return self.response_handler(completed_process)
 
+    def stream(self, args, keep_lines=None, **kwargs):
+        """Run a command, and iterate over its output as it is printed.
+
+        This is useful for long-running commands, such as ``pulp-admin rpm
+        repo sync run``, whose progress is of interest, or whose output is
+        large. For example:
+
+        >>> from pulp_smash import cli, config
+        >>> client = cli.Client(config.get_config())
+        >>> with client.stream(('dnf', '-y', 'install', 'foo')) as lines:
+        ...     for name, line in lines:
+        ...         if name == 'stdout' and line.startswith('Installing'):
+        ...             break  # Kill dnf.
+
+        See :class:`pulp_smash.cli.OutputStream`.
+
+        :param args: The command's arguments.
+        :param keep_lines: How many of the last lines of each output to keep,
+            to build the result passed to ``response_handler``. Defaults to
+            every line. Memory use is bounded if it is set.
+        :param kwargs: Passed to Plumbum's ``popen`` method. ``stdin`` may be a
+            string, as for :meth:`run`.
+        :returns: A :class:`pulp_smash.cli.OutputStream`.
+        """
+        return OutputStream(self, args, keep_lines, kwargs)
+
+    def run_batch(self, commands, stop_on_error=True, **kwargs):
+        """Run several commands in one shell. Return a list of results.
+
+        Each command is a sequence of arguments, as passed to :meth:`run`. The
+        commands are run one after another by a single ``sh`` process, so a
+        remote host is reached once instead of once per command. See
+        :mod:`pulp_smash.batching`. The output of the shell is split into one
+        :class:`pulp_smash.cli.CompletedProcess` per command, and each is
+        passed to ``response_handler``, as by :meth:`run`. With the default
+        handler, :func:`pulp_smash.cli.code_handler`, the first failed command
+        raises an exception.
+
+        :param commands: An iterable of sequences of arguments.
+        :param stop_on_error: Whether to skip the commands that follow a
+            command with a non-zero return code. If ``True``, no result is
+            returned for the skipped commands.
+        :param kwargs: Passed to Plumbum for the ``sh`` process, as by
+            :meth:`run`. For example, ``stdin`` is read by the first command
+            that reads its standard input.
+        :returns: A list of values returned by ``response_handler``, one per
+            command run.
+        """
+        commands = [tuple(args) for args in commands]
+        marker = batching.get_marker()
+        script = batching.get_script(commands, marker, stop_on_error)
+        kwargs.setdefault('retcode')
+        code, stdout, stderr = self._run(('sh', '-c', script), kwargs)
+        return [
+            self.response_handler(CompletedProcess(*result))
+            for result in batching.split_results(
+                commands, marker, code, stdout, stderr)
+        ]
+
+    def _run(self, args, kwargs):
+        """Run a command. Return its ``(returncode, stdout, stderr)``."""
+
+        def run():
+            """Run the command on ``self.machine``."""
+            return self.machine[args[0]].run(args[1:], **kwargs)
+
+        recording = cassette.get_cassette()
+        start = monotonic()
+        if recording is None:
+            code, stdout, stderr = run()
+        else:
+            code, stdout, stderr = recording.run(
+                self.pulp_system.hostname, args, kwargs.get('stdin'), run)
+        _record_run(
+            args,
+            kwargs.get('stdin'),
+            code,
+            len(stdout or '') + len(stderr or ''),
+            monotonic() - start,
+        )
+        return code, stdout, stderr
+
+
+class OutputStream(object):
+    """The output of a command, line by line, as it is printed.
+
+    Returned by :meth:`pulp_smash.cli.Client.stream`. Iterating over it
+    yields ``(name, line)`` tuples, where ``name`` is "stdout" or "stderr",
+    and ``line`` is a string ending with a newline, unless the command didn't
+    end its output with one. The lines of each output are yielded in order,
+    but the lines of standard output and standard error may be interleaved
+    differently than they were printed.
+
+    Once every line has been yielded, the command's return code and the kept
+    lines of output are passed to the client's ``response_handler``, and what
+    it returns is stored as :attr:`result`. If the handler raises an
+    exception, such as :func:`pulp_smash.cli.code_handler` for a failed
+    command, the exception is raised by the iteration.
+
+    To stop early, use this object as a context manager, or call
+    :meth:`close`. Either kills the command if it is still running. (For a
+    remote host, the ssh process is killed. The remote command may keep
+    running until it next prints.)
+
+    When a cassette is in use, the command is run to completion, and then
+    its output is yielded. See :mod:`pulp_smash.cassette`.
+    """
+
+    def __init__(self, client, args, keep_lines, kwargs):
+        """Initialize this object with needed instance attributes."""
+        self.args = tuple(args)
+        self.result = None
+        self._client = client
+        self._kwargs = dict(kwargs)
+        self._kept = {
+            'stdout': collections.deque(maxlen=keep_lines),
+            'stderr': collections.deque(maxlen=keep_lines),
+        }
+        self._lines = self._iterate()
+
+    def __iter__(self):
+        """Return this object, which yields lines of output."""
+        return self
+
+    def __next__(self):
+        """Return the next ``(name, line)`` tuple."""
+        return next(self._lines)
+
+    def __enter__(self):
+        """Return this object."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Kill the command, if it is still running."""
+        self.close()
+
+    def close(self):
+        """Kill the command, if it is still running."""
+        self._lines.close()
+
+    def _iterate(self):
+        """Yield the lines of output, then set :attr:`result`."""
+        self._kwargs.pop('retcode', None)
+        if cassette.get_cassette() is not None or self._client.machine is None:
+            code = yield from self._replay()
+        else:
+            code = yield from self._popen()
+        self.result = self._client.response_handler(CompletedProcess(
+            self.args,
+            code,
+            ''.join(self._kept['stdout']),
+            ''.join(self._kept['stderr']),
+        ))
+
+    def _replay(self):
+        """Run the command to completion, and yield its output."""
+        self._kwargs['retcode'] = None
+        # pylint:disable=protected-access
+        code, stdout, stderr = self._client._run(self.args, self._kwargs)
+        for name, output in (('stdout', stdout), ('stderr', stderr)):
+            for line in (output or '').splitlines(True):
+                self._kept[name].append(line)
+                yield name, line
+        return code
+
+    def _popen(self):
+        """Start the command, and yield its output as it is printed."""
+        stdin = self._kwargs.pop('stdin', None)
+        if stdin is not None and not isinstance(stdin, str):
+            self._kwargs['stdin'] = stdin
+            stdin = None
+        start = monotonic()
+        bytes_in = 0
+        command = self._client.machine[self.args[0]]
+        proc = command.popen(self.args[1:], **self._kwargs)
+        lines = queue.Queue()
+        threads = [
+            threading.Thread(
+                target=_read_lines, args=(proc, name, lines), daemon=True)
+            for name in ('stdout', 'stderr')
+        ]
+        threads.append(threading.Thread(
+            target=_write_stdin, args=(proc.stdin, stdin), daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            open_pipes = 2
+            while open_pipes:
+                name, line = lines.get()
+                if line is None:
+                    open_pipes -= 1
+                    continue
+                bytes_in += len(line)
+                self._kept[name].append(line)
+                yield name, line
+            code = proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        _record_run(self.args, stdin, code, bytes_in, monotonic() - start)
+        return code
+
+
+def _read_lines(proc, name, lines):
+    """Put each line of ``proc``'s stdout or stderr in ``lines``, then None.
+
+    This function holds a reference to ``proc``, so that it isn't garbage
+    collected, and its pipes closed, while they are being read. That would
+    block until a line is read.
+    """
+    pipe = getattr(proc, name)
+    for line in iter(pipe.readline, b''):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        if not line:
+            break
+        lines.put((name, line))
+    pipe.close()
+    lines.put((name, None))
+
+
+def _write_stdin(pipe, stdin):
+    """Write ``stdin`` to ``pipe``, if both exist, and close ``pipe``."""
+    if pipe is None:
+        return
+    with contextlib.suppress(OSError):
+        if stdin:
+            pipe.write(stdin.encode('utf-8'))
+        pipe.close()
+
+
+def _record_run(args, stdin, code, bytes_in, seconds):
+    """Record a command with :mod:`pulp_smash.instrumentation`."""
+    instrumentation.record(instrumentation.Call(
+        kind='cli',
+        method='run',
+        target=_get_program(args),
+        status=code,
+        bytes_out=len(stdin or ''),
+        bytes_in=bytes_in,
+        seconds=seconds,
+        attempt=0,
+    ))
+
+
+def _get_program(args):
+    """Return the name of the program run by ``args``, skipping ``sudo``."""
+    args = [arg for arg in args if arg != 'sudo']
+    return os.path.basename(args[0]) if args else 'sudo'
+
+
+def wait_until_ready(
+        cfg,
+        services,
+        pulp_system=None,
+        timeout=readiness.READY_TIMEOUT,
+        stale=frozenset()):
+    """Wait until services are ready to be used, instead of sleeping blindly.
+
+    Services are checked as described by
+    :func:`pulp_smash.readiness.get_ready_checks`, with commands run by a
+    :class:`pulp_smash.cli.Client`.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about a Pulp
+        application.
+    :param services: An iterable of service names.
+    :param pulp_smash.config.PulpSystem pulp_system: A specific host to check,
+        instead of every host.
+    :param timeout: How long to wait, in seconds.
+    :param stale: Worker heartbeats that don't count, as returned by
+        :func:`pulp_smash.readiness.get_heartbeats`.
+    :returns: Nothing.
+    :raises pulp_smash.exceptions.ServiceNotReadyError: If a service isn't
+        ready after ``timeout`` seconds.
+    """
+    def run(system, args):
+        """Run a command on a host, and return the completed process."""
+        return Client(cfg, echo_handler, pulp_system=system).run(args)
+
+    readiness.wait_for(
+        readiness.get_ready_checks(cfg, services, run, pulp_system, stale),
+        timeout,
+    )
+
 
 class BaseServiceManager(metaclass=ABCMeta):
     """A base service manager.
@@ -251,33 +590,18 @@ class BaseServiceManager(metaclass=ABCMeta):
 
     @staticmethod
     def _get_service_manager(cfg, pulp_system):
-        """Talk to the target host and determine the type of service manager.
+        """Determine the type of service manager on the target host.
 
         Return "systemd" or "sysv" if the service manager appears to be one of
-        those. Raise an exception otherwise.
+        those. Raise an exception otherwise. See :func:`get_facts`.
         """
-        try:
-            return _SERVICE_MANAGERS[pulp_system.hostname]
-        except KeyError:
-            pass
-
-        client = Client(cfg, echo_handler, pulp_system=pulp_system)
-        commands_managers = (
-            ('which systemctl', 'systemd'),
-            ('which service', 'sysv'),
-            ('test -x /sbin/service', 'sysv'),
-        )
-        for command, service_manager in commands_managers:
-            if client.run(command.split()).returncode == 0:
-                _SERVICE_MANAGERS[pulp_system.hostname] = service_manager
-                return service_manager
+        service_manager = get_facts(cfg, pulp_system)['service_manager']
+        if service_manager:
+            return service_manager
         raise exceptions.NoKnownServiceManagerError(
             'Unable to determine the service manager used by {}. It does not '
             'appear to be any of {}.'
-            .format(
-                pulp_system.hostname,
-                {manager for _, manager in commands_managers}
-            )
+            .format(pulp_system.hostname, {'systemd', 'sysv'})
         )
 
     @contextlib.contextmanager
@@ -333,10 +657,12 @@ class BaseServiceManager(metaclass=ABCMeta):
         return (client.run(cmd),)
 
     @abstractmethod
-    def start(self, services):
+    def start(self, services, wait=False):
         """Start the given services.
 
         :param services: A list or tuple of services to be started.
+        :param wait: Whether to wait until the services are ready. See
+            :func:`pulp_smash.cli.wait_until_ready`.
         """
         pass
 
@@ -349,10 +675,12 @@ class BaseServiceManager(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def restart(self, services):
+    def restart(self, services, wait=False):
         """Restart the given services.
 
         :param services: A list or tuple of services to be restarted.
+        :param wait: Whether to wait until the services are ready. See
+            :func:`pulp_smash.cli.wait_until_ready`.
         """
         pass
 
@@ -374,6 +702,13 @@ class GlobalServiceManager(BaseServiceManager):
     For each host that is declared as fulfilling the ``api`` role, Apache
     (httpd) will be restarted.
 
+    Hosts are acted upon concurrently, in phases that respect the dependencies
+    between services. For example, when stopping Pulp, workers are stopped on
+    every host before MongoDB is stopped on any host. See
+    :data:`pulp_smash.phases.SERVICE_PHASES`. To wait until started services
+    are ready to be used, pass ``wait=True``. See
+    :func:`pulp_smash.cli.wait_until_ready`.
+
     When asked to perform an action, this object may talk to each target host
     and determines whether it is running as root. If not root, all commands are
     prefixed with "sudo". Please ensure that Pulp Smash can either execute
@@ -395,51 +730,21 @@ class GlobalServiceManager(BaseServiceManager):
         """Initialize a GlobalServiceManager object."""
         super().__init__()
         self._cfg = cfg
-        self._is_root_cache = {}
 
     def _check_root(self, pulp_system):
-        """Tell if we are root on the target host.
+        """Tell if we are root on the target host. See :func:`get_facts`."""
+        return _is_root(self._cfg, pulp_system)
 
-        Use the cache if the information is already available.
-        """
-        try:
-            return self._is_root_cache[pulp_system.hostname]
-        except KeyError:
-            pass
-
-        is_root = _is_root(self._cfg, pulp_system)
-        self._is_root_cache[pulp_system.hostname] = is_root
-        return is_root
-
-    def start(self, services):
+    def start(self, services, wait=False):
         """Start the services on every host that has the services.
 
         :param services: An iterable of service names.
+        :param wait: Whether to wait until the services are ready. See
+            :func:`pulp_smash.cli.wait_until_ready`.
         :return: A dict mapping the affected hosts' hostnames with a list of
             :class:`pulp_smash.cli.CompletedProcess` objects.
         """
-        services = set(services)
-        result = {}
-        for system in self._cfg.systems:
-            intersection = services.intersection(
-                self._cfg.services_for_roles(system.roles))
-            if intersection:
-                client = Client(self._cfg, pulp_system=system)
-                svc_mgr = self._get_service_manager(self._cfg, system)
-                sudo = not self._check_root(system)
-                if svc_mgr == 'sysv':
-                    with self._disable_selinux(client, sudo):
-                        result[system.hostname] = self._start_sysv(
-                            client, sudo, services)
-                elif svc_mgr == 'systemd':
-                    result[system.hostname] = self._start_systemd(
-                        client, sudo, services)
-                else:
-                    raise NotImplementedError(
-                        'Service manager "{}" not supported on "{}"'.format(
-                            svc_mgr, system.hostname)
-                    )
-        return result
+        return self._fan_out('start', services, wait)
 
     def stop(self, services):
         """Stop the services on every host that has the services.
@@ -448,57 +753,51 @@ class GlobalServiceManager(BaseServiceManager):
         :return: A dict mapping the affected hosts' hostnames with a list of
             :class:`pulp_smash.cli.CompletedProcess` objects.
         """
-        services = set(services)
-        result = {}
-        for system in self._cfg.systems:
-            intersection = services.intersection(
-                self._cfg.services_for_roles(system.roles))
-            if intersection:
-                client = Client(self._cfg, pulp_system=system)
-                svc_mgr = self._get_service_manager(self._cfg, system)
-                sudo = not self._check_root(system)
-                if svc_mgr == 'sysv':
-                    with self._disable_selinux(client, sudo):
-                        result[system.hostname] = self._stop_sysv(
-                            client, sudo, services)
-                elif svc_mgr == 'systemd':
-                    result[system.hostname] = self._stop_systemd(
-                        client, sudo, services)
-                else:
-                    raise NotImplementedError(
-                        'Service manager not supported: {}'.format(svc_mgr)
-                    )
-        return result
+        return self._fan_out('stop', services)
 
-    def restart(self, services):
+    def restart(self, services, wait=False):
         """Restart the services on every host that has the services.
 
         :param services: An iterable of service names.
+        :param wait: Whether to wait until the services are ready. See
+            :func:`pulp_smash.cli.wait_until_ready`.
         :return: A dict mapping the affected hosts' hostnames with a list of
             :class:`pulp_smash.cli.CompletedProcess` objects.
         """
+        return self._fan_out('restart', services, wait)
+
+    def _fan_out(self, action, services, wait=False):
+        """Start, stop or restart services on all hosts, phase by phase.
+
+        See :func:`pulp_smash.phases.fan_out`. If ``wait`` is true, wait until
+        the services are ready once every phase is over, as the readiness of
+        workers can only be checked once httpd is up.
+        """
         services = set(services)
-        result = {}
-        for system in self._cfg.systems:
-            intersection = services.intersection(
-                self._cfg.services_for_roles(system.roles))
-            if intersection:
-                client = Client(self._cfg, pulp_system=system)
-                svc_mgr = self._get_service_manager(self._cfg, system)
-                sudo = not self._check_root(system)
-                if svc_mgr == 'sysv':
-                    with self._disable_selinux(client, sudo):
-                        result[system.hostname] = self._restart_sysv(
-                            client, sudo, services)
-                elif svc_mgr == 'systemd':
-                    result[system.hostname] = self._restart_systemd(
-                        client, sudo, services)
-                else:
-                    raise NotImplementedError(
-                        'Service manager not supported: {}'.format(svc_mgr)
-                    )
+        stale = readiness.get_heartbeats(self._cfg) if wait else frozenset()
+        result = phases.fan_out(self._cfg, self._act, action, services)
+        if wait:
+            wait_until_ready(self._cfg, services, stale=stale)
         return result
 
+    def _act(self, action, pulp_system, services):
+        """Start, stop or restart services on one host."""
+        client = Client(self._cfg, pulp_system=pulp_system)
+        svc_mgr = self._get_service_manager(self._cfg, pulp_system)
+        sudo = not self._check_root(pulp_system)
+        services = sorted(services)
+        if svc_mgr == 'sysv':
+            with self._disable_selinux(client, sudo):
+                return getattr(self, '_{}_sysv'.format(action))(
+                    client, sudo, services)
+        elif svc_mgr == 'systemd':
+            return getattr(self, '_{}_systemd'.format(action))(
+                client, sudo, services)
+        raise NotImplementedError(
+            'Service manager "{}" not supported on "{}"'.format(
+                svc_mgr, pulp_system.hostname)
+        )
+
 
 class ServiceManager(BaseServiceManager):
     """A service manager on a host.
@@ -540,26 +839,22 @@ class ServiceManager(BaseServiceManager):
     def __init__(self, cfg, pulp_system):
         """Initialize a new object."""
         super().__init__()
+        self._cfg = cfg
+        self._pulp_system = pulp_system
         self._client = Client(cfg, pulp_system=pulp_system)
         self._sudo = not _is_root(cfg, pulp_system)
         self._svc_mgr = self._get_service_manager(cfg, pulp_system)
 
-    def start(self, services):
+    def start(self, services, wait=False):
         """Start the given services.
 
         :param services: An iterable of service names.
+        :param wait: Whether to wait until the services are ready. See
+            :func:`pulp_smash.cli.wait_until_ready`.
         :return: An iterable of :class:`pulp_smash.cli.CompletedProcess`
             objects.
         """
-        if self._svc_mgr == 'sysv':
-            with self._disable_selinux(self._client, self._sudo):
-                return self._start_sysv(self._client, self._sudo, services)
-        elif self._svc_mgr == 'systemd':
-            return self._start_systemd(self._client, self._sudo, services)
-        else:
-            raise NotImplementedError(
-                'Service manager not supported: {}'.format(self._svc_mgr)
-            )
+        return self._act('start', services, wait)
 
     def stop(self, services):
         """Stop the given services.
@@ -568,32 +863,37 @@ class ServiceManager(BaseServiceManager):
         :return: An iterable of :class:`pulp_smash.cli.CompletedProcess`
             objects.
         """
-        if self._svc_mgr == 'sysv':
-            with self._disable_selinux(self._client, self._sudo):
-                return self._stop_sysv(self._client, self._sudo, services)
-        elif self._svc_mgr == 'systemd':
-            return self._stop_systemd(self._client, self._sudo, services)
-        else:
-            raise NotImplementedError(
-                'Service manager not supported: {}'.format(self._svc_mgr)
-            )
+        return self._act('stop', services)
 
-    def restart(self, services):
+    def restart(self, services, wait=False):
         """Restart the given services.
 
         :param services: An iterable of service names.
+        :param wait: Whether to wait until the services are ready. See
+            :func:`pulp_smash.cli.wait_until_ready`.
         :return: An iterable of :class:`pulp_smash.cli.CompletedProcess`
             objects.
         """
+        return self._act('restart', services, wait)
+
+    def _act(self, action, services, wait=False):
+        """Start, stop or restart services, and maybe wait until ready."""
+        stale = readiness.get_heartbeats(self._cfg) if wait else frozenset()
         if self._svc_mgr == 'sysv':
             with self._disable_selinux(self._client, self._sudo):
-                return self._restart_sysv(self._client, self._sudo, services)
+                result = getattr(self, '_{}_sysv'.format(action))(
+                    self._client, self._sudo, services)
         elif self._svc_mgr == 'systemd':
-            return self._restart_systemd(self._client, self._sudo, services)
+            result = getattr(self, '_{}_systemd'.format(action))(
+                self._client, self._sudo, services)
         else:
             raise NotImplementedError(
                 'Service manager not supported: {}'.format(self._svc_mgr)
             )
+        if wait:
+            wait_until_ready(
+                self._cfg, services, self._pulp_system, stale=stale)
+        return result
 
 
 class PackageManager(object):
@@ -635,30 +935,18 @@ class PackageManager(object):
 
     @staticmethod
     def _get_package_manager(cfg):
-        """Talk to the target host and determine the package manager.
+        """Determine the package manager on the target host.
 
         Return "dnf" or "yum" if the package manager appears to be one of
-        those. Raise an exception otherwise.
+        those. Raise an exception otherwise. See :func:`get_facts`.
         """
-        hostname = urlsplit(cfg.get_base_url()).hostname
-        try:
-            return _PACKAGE_MANAGERS[hostname]
-        except KeyError:
-            pass
-
-        client = Client(cfg, echo_handler)
-        commands_managers = (
-            (('which', 'dnf'), 'dnf'),
-            (('which', 'yum'), 'yum'),
-        )
-        for cmd, pkg_mgr in commands_managers:
-            if client.run(cmd).returncode == 0:
-                _PACKAGE_MANAGERS[hostname] = pkg_mgr
-                return pkg_mgr
+        pkg_mgr = get_facts(cfg)['package_manager']
+        if pkg_mgr:
+            return pkg_mgr
         raise exceptions.NoKnownPackageManagerError(
             'Unable to determine the package manager used by {}. It does not '
             'appear to be any of {}.'
-            .format(hostname, {pkg_mgr for _, pkg_mgr in commands_managers})
+            .format(cfg.get_systems('pulp cli')[0].hostname, {'dnf', 'yum'})
         )
 
     def install(self, *args):
@@ -99,11 +99,88 @@ CONFIG_JSON_SCHEMA = {
                             'required': ['scheme'],
                             'type': 'object',
                             'properties': {
+                                'balance': {
+                                    'additionalProperties': False,
+                                    'type': 'object',
+                                    'properties': {
+                                        'eject_after': {
+                                            'type': 'integer',
+                                            'minimum': 1,
+                                        },
+                                        'eject_for': {
+                                            'type': 'number',
+                                            'minimum': 0,
+                                        },
+                                        'strategy': {
+                                            'enum': [
+                                                'latency-weighted',
+                                                'least-outstanding',
+                                                'round-robin',
+                                            ],
+                                            'type': 'string',
+                                        },
+                                    },
+                                },
+                                'cache': {
+                                    'additionalProperties': False,
+                                    'type': 'object',
+                                    'properties': {
+                                        'max_entries': {
+                                            'type': 'integer',
+                                            'minimum': 1,
+                                        },
+                                        'ttl': {
+                                            'type': 'number',
+                                            'minimum': 0,
+                                        },
+                                        'ttls': {
+                                            'type': 'object',
+                                            'additionalProperties': {
+                                                'type': 'number',
+                                                'minimum': 0,
+                                            },
+                                        },
+                                    },
+                                },
+                                'pool_size': {
+                                    'type': 'integer',
+                                    'minimum': 1,
+                                },
                                 'port': {
                                     'type': 'integer',
                                     'minimum': 0,
                                     'maximum': 65535,
                                 },
+                                'retry': {
+                                    'additionalProperties': False,
+                                    'type': 'object',
+                                    'properties': {
+                                        'backoff': {
+                                            'type': 'number',
+                                            'minimum': 0,
+                                        },
+                                        'budget': {
+                                            'type': 'number',
+                                            'minimum': 0,
+                                        },
+                                        'max_backoff': {
+                                            'type': 'number',
+                                            'minimum': 0,
+                                        },
+                                        'methods': {
+                                            'type': 'array',
+                                            'items': {'type': 'string'},
+                                        },
+                                        'retries': {
+                                            'type': 'integer',
+                                            'minimum': 0,
+                                        },
+                                        'statuses': {
+                                            'type': 'array',
+                                            'items': {'type': 'integer'},
+                                        },
+                                    },
+                                },
                                 'scheme': {
                                     'enum': ['http', 'https'],
                                     'type': 'string',
@@ -158,19 +235,20 @@ def _public_attrs(obj):
 
 
 def get_config():
-    """Return a copy of the global ``PulpSmashConfig`` object.
+    """Return the global ``PulpSmashConfig`` object.
 
     This method makes use of a cache. If the cache is empty, the configuration
-    file is parsed and the cache is populated. Otherwise, a copy of the cached
-    configuration object is returned.
+    file is parsed and the cache is populated. Otherwise, the cached
+    configuration object is returned. It is frozen, and so it is shared rather
+    than copied. Call its ``copy`` method to make a changed copy.
 
-    :returns: A copy of the global server configuration object.
+    :returns: The global server configuration object.
     :rtype: pulp_smash.config.PulpSmashConfig
     """
     global _CONFIG  # pylint:disable=global-statement
     if _CONFIG is None:
         _CONFIG = PulpSmashConfig().read()
-    return deepcopy(_CONFIG)
+    return _CONFIG
 
 
 def convert_old_config(config_dict):
@@ -268,6 +346,85 @@ def validate_config(config_dict):
 PulpSystem = collections.namedtuple('PulpSystem', 'hostname roles')
 
 
+class FrozenDict(dict):
+    """A dict that can't be changed, and so can be hashed and shared.
+
+    :class:`pulp_smash.config.PulpSmashConfig` stores each host's roles as
+    frozen dicts. Methods that would change a frozen dict raise a
+    ``TypeError``. Build a new dict instead, for example with
+    ``dict(frozen, key=value)``.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        """Refuse to change this dict."""
+        raise TypeError('{} objects are read-only'.format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __hash__(self):
+        """Hash this dict's items."""
+        return hash(frozenset(self.items()))
+
+    def __copy__(self):
+        """Return this dict, which can't be changed anyway."""
+        return self
+
+    def __deepcopy__(self, memo):
+        """Return this dict, which can't be changed anyway."""
+        return self
+
+    def __reduce__(self):
+        """Pickle this dict as a call to its class."""
+        return type(self), (dict(self),)
+
+
+def _freeze(value):
+    """Return a read-only, hashable equivalent of ``value``.
+
+    Dicts become :class:`pulp_smash.config.FrozenDict` objects, and lists
+    become tuples, recursively.
+    """
+    if isinstance(value, dict):
+        return FrozenDict(
+            (key, _freeze(val)) for key, val in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _get_base_url(pulp_system):
+    """Return the base URL of a host's API. See ``get_base_url``."""
+    scheme = pulp_system.roles['api']['scheme']
+    netloc = pulp_system.hostname
+    try:
+        netloc += ':' + str(pulp_system.roles['api']['port'])
+    except KeyError:
+        pass
+    return urlunsplit((scheme, netloc, '', '', ''))
+
+
+def _get_requests_kwargs(pulp_system, pulp_auth):
+    """Return read-only Requests kwargs for a host's API.
+
+    See ``get_requests_kwargs``.
+    """
+    kwargs = {
+        key: _freeze(value)
+        for key, value in pulp_system.roles['api'].items()
+        if key not in (
+            'balance', 'cache', 'pool_size', 'port', 'retry', 'scheme')
+    }
+    kwargs['auth'] = tuple(pulp_auth or ())
+    return FrozenDict(kwargs)
+
+
+# The tables a PulpSmashConfig computes when it is created: the hosts fulfilling
+# each role, and the base URL and Requests kwargs of each API host.
+_ConfigIndex = collections.namedtuple(
+    '_ConfigIndex', ('systems_by_role', 'base_urls', 'requests_kwargs'))
+
+
 class PulpSmashConfig(object):
     """Information about a Pulp application.
 
@@ -347,6 +504,14 @@ class PulpSmashConfig(object):
     :param pulp_smash.config.PulpSystem systems: A list of the hosts comprising
         a Pulp application.
 
+    Objects of this class are frozen: ``pulp_auth`` and ``systems`` are stored
+    as tuples, each host's roles as :class:`pulp_smash.config.FrozenDict`
+    objects, and attributes can't be set. As a result, a config may be shared
+    without being copied, and may be hashed, for example to key a cache. The
+    hosts fulfilling each role, the base URL of each host and the Requests
+    kwargs of each host are computed once, when the config is created. To
+    change a config, make a changed copy of it with :meth:`copy`.
+
     .. _packaging: https://packaging.pypa.io/en/latest/
     .. _XDG Base Directory Specification:
         http://standards.freedesktop.org/basedir-spec/basedir-spec-latest.html
@@ -354,21 +519,103 @@ class PulpSmashConfig(object):
 
     def __init__(self, pulp_auth=None, pulp_version=None, systems=None):
         """Initialize this object with needed instance attributes."""
-        self.pulp_auth = pulp_auth
+        systems = tuple(
+            PulpSystem(system.hostname, _freeze(system.roles))
+            for system in (systems or ())
+        )
+        systems_by_role = collections.defaultdict(list)
+        for system in systems:
+            for role in system.roles:
+                systems_by_role[role].append(system)
+        index = _ConfigIndex(
+            systems_by_role={
+                role: tuple(role_systems)
+                for role, role_systems in systems_by_role.items()
+            },
+            base_urls={},
+            requests_kwargs={},
+        )
+        for system in systems_by_role['api']:
+            index.requests_kwargs[system] = _get_requests_kwargs(
+                system, pulp_auth)
+            # The base URL of an incomplete API role is left to fail when
+            # asked for, as it always has.
+            if 'scheme' in system.roles['api']:
+                index.base_urls[system] = _get_base_url(system)
+        self.pulp_auth = _freeze(pulp_auth)
         self.pulp_version = pulp_version
         self.systems = systems
-        if self.systems is None:
-            self.systems = []
+        self._index = index
         self._xdg_config_file = os.environ.get(
             'PULP_SMASH_CONFIG_FILE',
             'settings.json'
         )
         self._xdg_config_dir = 'pulp_smash'
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        """Refuse to set data attributes once created. See :meth:`copy`.
+
+        Methods may still be replaced, for example by ``mock.patch.object``.
+        """
+        if (getattr(self, '_frozen', False) and
+                not callable(getattr(type(self), name, None))):
+            raise AttributeError(
+                '{} objects are read-only. Call copy() to make a changed '
+                'copy.'.format(type(self).__name__)
+            )
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        """Refuse to delete data attributes. See :meth:`copy`."""
+        if not callable(getattr(type(self), name, None)):
+            raise AttributeError(
+                '{} objects are read-only.'.format(type(self).__name__))
+        object.__delattr__(self, name)
+
+    def __eq__(self, other):
+        """Tell whether ``other`` describes the same Pulp application."""
+        if not isinstance(other, PulpSmashConfig):
+            return NotImplemented
+        return self._key() == other._key()  # pylint:disable=protected-access
+
+    def __hash__(self):
+        """Hash the information about the Pulp application."""
+        return hash(self._key())
+
+    def _key(self):
+        """Return what tells this config apart from others."""
+        return (self.pulp_auth, str(self.pulp_version), self.systems)
+
+    def copy(self, **changes):
+        """Return a copy of this config, with some attributes changed.
+
+        For example, to test against a host whose API listens on another port:
+
+        >>> from pulp_smash import config
+        >>> cfg = config.get_config()
+        >>> system = cfg.get_systems('api')[0]
+        >>> api_role = dict(system.roles['api'], port=8080)
+        >>> cfg = cfg.copy(systems=[config.PulpSystem(
+        ...     system.hostname, dict(system.roles, api=api_role))])
+
+        :param changes: New values for ``pulp_auth``, ``pulp_version`` or
+            ``systems``.
+        :returns: A new :class:`pulp_smash.config.PulpSmashConfig`.
+        """
+        attrs = _public_attrs(self)
+        attrs.update(changes)
+        return type(self)(**attrs)
 
     def __repr__(self):
         """Create string representation of the object."""
         attrs = _public_attrs(self)
         attrs['pulp_version'] = type('')(attrs['pulp_version'])
+        # Render tuples as lists, as they are most often written, and so that
+        # the string may be passed to eval().
+        for name in ('pulp_auth', 'systems'):
+            if attrs[name] is not None:
+                attrs[name] = list(attrs[name])
         str_kwargs = ', '.join(
             '{}={}'.format(key, repr(value)) for key, value in attrs.items()
         )
@@ -459,7 +706,7 @@ class PulpSmashConfig(object):
         return PulpSmashConfig(pulp_auth, pulp_version, systems)
 
     def get_systems(self, role):
-        """Return a list of hosts fulfilling the given role.
+        """Return a tuple of hosts fulfilling the given role.
 
         :param role: The role to filter the available hosts, see
             `pulp_smash.config.ROLES` for more information.
@@ -469,7 +716,7 @@ class PulpSmashConfig(object):
                 'The given role, {}, is not recognized. Valid roles are: {}'
                 .format(role, ROLES)
             )
-        return [system for system in self.systems if role in system.roles]
+        return self._index.systems_by_role.get(role, ())
 
     @staticmethod
     def services_for_roles(roles):
@@ -503,13 +750,10 @@ class PulpSmashConfig(object):
         """
         if pulp_system is None:
             pulp_system = self.get_systems('api')[0]
-        scheme = pulp_system.roles['api']['scheme']
-        netloc = pulp_system.hostname
         try:
-            netloc += ':' + str(pulp_system.roles['api']['port'])
-        except KeyError:
-            pass
-        return urlunsplit((scheme, netloc, '', '', ''))
+            return self._index.base_urls[pulp_system]
+        except (KeyError, TypeError):  # TypeError if roles is a dict.
+            return _get_base_url(pulp_system)
 
     def get_requests_kwargs(self, pulp_system=None):
         """Get kwargs for use by the Requests functions.
@@ -535,11 +779,14 @@ class PulpSmashConfig(object):
         a host with api role to check for the verify config, then convert
         ``pulp_auth`` config to a tuple, and it will require maintenance if
         ``cfg`` gains or loses attributes.
+
+        The kwargs are computed when this config is created. Each call returns
+        a new dict, which may be changed, but its values are shared and
+        read-only.
         """
         if not pulp_system:
             pulp_system = self.get_systems('api')[0]
-        kwargs = deepcopy(pulp_system.roles['api'])
-        kwargs['auth'] = tuple(self.pulp_auth)
-        for key in ('port', 'scheme'):
-            kwargs.pop(key, None)
-        return kwargs
+        try:
+            return dict(self._index.requests_kwargs[pulp_system])
+        except (KeyError, TypeError):  # TypeError if roles is a dict.
+            return dict(_get_requests_kwargs(pulp_system, self.pulp_auth))
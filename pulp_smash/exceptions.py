@@ -45,6 +45,14 @@ class CalledProcessError(Exception):
         ).format(*self.args)
 
 
+class CassetteMissError(Exception):
+    """A replayed cassette has no recording of a request or command.
+
+    The exception's arguments are the cassette's path and a description of
+    the request or command. See :mod:`pulp_smash.cassette`.
+    """
+
+
 class ConfigFileNotFoundError(Exception):
     """We cannot find the requested Pulp Smash configuration file.
 
@@ -102,6 +110,14 @@ class NoKnownServiceManagerError(Exception):
     """
 
 
+class ServiceNotReadyError(Exception):
+    """A service didn't become ready in time.
+
+    See :func:`pulp_smash.readiness.get_ready_checks` for more information on
+    how services are checked.
+    """
+
+
 class TaskReportError(Exception):
     """A task contains an error.
 
@@ -0,0 +1,227 @@
+# coding=utf-8
+"""Facts about hosts, gathered by one command and cached on disk.
+
+Pulp Smash needs to know a few things about the hosts it talks to, such as
+whether it logs in as root, which service manager and AMQP broker a host uses
+and which OS it runs. Rather than running a command to learn each fact, every
+fact about a host is learnt by a single shell script. See :func:`get_facts`.
+
+Facts are cached in memory, so that the script is run at most once per host
+and process. They are also cached on disk, in
+``$XDG_CACHE_HOME/pulp_smash/facts.json``, so that later processes needn't run
+it either. An entry on disk is used for ``PULP_SMASH_FACTS_TTL`` seconds, or
+an hour by default. Set that environment variable to 0 to disable the cache on
+disk.
+
+Facts should only change when a host is reinstalled or reconfigured. Facts
+that may change while a host runs, such as whether SELinux is enforcing, are
+deliberately left out: check them each time they are needed.
+
+Each entry records the host's boot ID. Before an entry on disk is used, the
+host's current boot ID is read, and the entry is dropped if the host has
+rebooted since, as it may have been reconfigured. As facts are cached in
+memory, this happens at most once per host and process.
+:func:`pulp_smash.ssh.get_ssh_machine` also calls :func:`forget` when a host's
+persistent shell has died, as the host may have rebooted. Call it yourself
+after reconfiguring a host.
+
+When a cassette is in use, facts aren't read from or written to disk, so that
+a recording doesn't depend on the cache. See :mod:`pulp_smash.cassette`.
+"""
+import collections
+import json
+import os
+import threading
+from time import time
+
+from xdg import BaseDirectory
+
+from pulp_smash import cassette
+
+FACTS = (
+    'boot_id',
+    'broker',
+    'package_manager',
+    'redhat_release',
+    'service_manager',
+    'squid_version',
+    'uid',
+)
+"""The names of the facts returned by :func:`get_facts`."""
+
+# The script that prints every fact about a host, one "name=value" per line.
+#
+# On Fedora 23, /usr/sbin and /usr/local/sbin are only added to the $PATH for
+# login shells. (See pathmunge() in /etc/profile.) As a result, executables in
+# /usr/sbin are also looked for by their absolute paths.
+_SCRIPT = """\
+fact() { printf '%s=%s\\n' "$1" "$2"; }
+fact boot_id "$(cat /proc/sys/kernel/random/boot_id 2>/dev/null)"
+fact uid "$(id -u)"
+if which systemctl >/dev/null 2>&1; then
+    fact service_manager systemd
+elif which service >/dev/null 2>&1 || test -x /sbin/service; then
+    fact service_manager sysv
+fi
+if which dnf >/dev/null 2>&1; then
+    fact package_manager dnf
+elif which yum >/dev/null 2>&1; then
+    fact package_manager yum
+fi
+if test -e /usr/sbin/qpidd; then
+    fact broker qpidd
+elif test -e /usr/sbin/rabbitmq; then
+    fact broker rabbitmq
+fi
+fact squid_version "$( (squid -v || /usr/sbin/squid -v) 2>/dev/null |
+    head -n 1)"
+fact redhat_release "$(cat /etc/redhat-release 2>/dev/null)"
+"""
+
+# The script that prints a host's boot ID, or nothing if it can't be read.
+_BOOT_ID_SCRIPT = 'cat /proc/sys/kernel/random/boot_id 2>/dev/null || true'
+
+# A dict mapping hostnames to the facts gathered or read by this process.
+_FACTS = {}
+
+# A dict mapping hostnames to locks, so that facts about a host are gathered
+# only once, while facts about other hosts can be gathered at the same time.
+_LOCKS = collections.defaultdict(threading.Lock)
+_LOCKS_LOCK = threading.Lock()
+
+
+def get_facts(hostname, run):
+    """Return facts about a host, gathering them if they aren't cached.
+
+    The facts are:
+
+    ``boot_id``
+        The host's boot ID, which changes each time the host boots.
+    ``broker``
+        "qpidd" or "rabbitmq", depending on which AMQP broker is installed.
+    ``package_manager``
+        "dnf" or "yum".
+    ``redhat_release``
+        The contents of ``/etc/redhat-release``.
+    ``service_manager``
+        "systemd" or "sysv".
+    ``squid_version``
+        The first line of ``squid -v``, such as "Squid Cache: Version 3.5.20".
+    ``uid``
+        The ID of the user running commands, such as "0".
+
+    A fact that can't be learnt, such as the broker on a host without one, is
+    an empty string.
+
+    :param hostname: The host the facts are about.
+    :param run: A function that accepts a command's arguments, runs the
+        command on the host, and returns its standard output. It is only
+        called if the facts aren't cached in memory.
+    :returns: A dict mapping each name in :data:`pulp_smash.facts.FACTS` to a
+        string.
+    """
+    with _LOCKS_LOCK:
+        lock = _LOCKS[hostname]
+    with lock:
+        facts = _FACTS.get(hostname)
+        if facts is None:
+            facts = _read(hostname, run)
+        if facts is None:
+            facts = _parse(run(('sh', '-c', _SCRIPT)))
+            _write(hostname, facts)
+        _FACTS[hostname] = facts
+        return facts
+
+
+def forget(hostname):
+    """Drop the facts about a host, from memory and from disk.
+
+    The next call to :func:`get_facts` gathers them again.
+    """
+    with _LOCKS_LOCK:
+        lock = _LOCKS[hostname]
+    with lock:
+        _FACTS.pop(hostname, None)
+        if _get_ttl() > 0 and cassette.get_cassette() is None:
+            entries = _load()
+            if entries.pop(hostname, None) is not None:
+                _save(entries)
+
+
+def _parse(output):
+    """Parse the output of the script that prints facts."""
+    facts = dict.fromkeys(FACTS, '')
+    for line in output.splitlines():
+        name, _, value = line.partition('=')
+        if name in facts:
+            facts[name] = value.strip()
+    return facts
+
+
+def _get_ttl():
+    """Return how long facts on disk are used for, in seconds."""
+    return float(os.environ.get('PULP_SMASH_FACTS_TTL', 3600))
+
+
+def _get_path():
+    """Return the path to the file in which facts are cached."""
+    return os.path.join(
+        BaseDirectory.xdg_cache_home, 'pulp_smash', 'facts.json')
+
+
+def _read(hostname, run):
+    """Return the facts about a host cached on disk, or ``None``.
+
+    ``None`` is also returned if the host has rebooted since the facts were
+    gathered, or if its boot ID can't be read.
+    """
+    if _get_ttl() <= 0 or cassette.get_cassette() is not None:
+        return None
+    entry = _load().get(hostname)
+    if entry is None or time() - entry['gathered'] >= _get_ttl():
+        return None
+    boot_id = run(('sh', '-c', _BOOT_ID_SCRIPT)).strip()
+    if not boot_id or boot_id != entry['boot_id']:
+        return None
+    return entry['facts']
+
+
+def _write(hostname, facts):
+    """Cache the facts about a host on disk, and drop expired entries."""
+    if _get_ttl() <= 0 or cassette.get_cassette() is not None:
+        return
+    now = time()
+    entries = {
+        name: entry for name, entry in _load().items()
+        if now - entry['gathered'] < _get_ttl()
+    }
+    entries[hostname] = {
+        'boot_id': facts['boot_id'],
+        'facts': facts,
+        'gathered': now,
+    }
+    _save(entries)
+
+
+def _load():
+    """Return every entry cached on disk."""
+    try:
+        with open(_get_path()) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(entries):
+    """Replace the entries cached on disk.
+
+    The file is replaced atomically, so that processes and threads running at
+    the same time never read a partial file.
+    """
+    path = _get_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '{}.{}.{}.tmp'.format(
+        path, os.getpid(), threading.get_ident())
+    with open(temp_path, 'w') as handle:
+        json.dump(entries, handle, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
@@ -0,0 +1,454 @@
+# coding=utf-8
+"""An index of Pulp Smash's tests, built without importing them.
+
+Importing every module in :mod:`pulp_smash.tests` is slow, as they and their
+dependencies do a lot of work when imported. This module parses them instead,
+with :mod:`ast`, and tells which test modules, test classes and test methods
+exist, which test classes are smoke tests, and which bugs each test module
+references. See :func:`get_index`.
+
+Parsing is fast, but not free. The result of parsing each file is cached on
+disk, in ``$XDG_CACHE_HOME/pulp_smash/index.json``, along with the file's
+modification time, size and SHA-256 digest. A file whose modification time
+and size haven't changed isn't read again. A file whose contents haven't
+changed isn't parsed again.
+
+The index is built from source code, and so it can't see classes or methods
+created dynamically, such as with ``type()``. Test classes are recognized by
+following their base classes, as written, through the modules of the indexed
+package's top-level package, such as :mod:`pulp_smash`, to
+``unittest.TestCase``.
+"""
+import ast
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+from xdg import BaseDirectory
+
+TestModule = namedtuple('TestModule', ('name', 'path', 'classes', 'bug_ids'))
+"""A test module, as found by :func:`get_index`.
+
+``classes`` is a tuple of :class:`pulp_smash.index.TestClass` objects, and
+``bug_ids`` is a sorted tuple of the IDs of the bugs the module references.
+See :func:`find_bug_ids`.
+"""
+
+TestClass = namedtuple('TestClass', ('module', 'name', 'test_methods', 'smoke'))
+"""A test class, as found by :func:`get_index`.
+
+``test_methods`` is a sorted tuple of the names of the test methods the class
+defines or inherits, and ``smoke`` tells whether the class is a
+:class:`pulp_smash.utils.SmokeTest`.
+"""
+
+# The names of the classes that test classes and smoke tests inherit from.
+_TEST_CASES = frozenset(('unittest.TestCase', 'unittest.case.TestCase'))
+_SMOKE_TEST = 'pulp_smash.utils.SmokeTest'
+
+# The names of the functions whose first argument is a bug ID, and a pattern
+# matching the names of functions that check a given bug, such as
+# pulp_smash.tests.pulp2.rpm.utils.check_issue_2277. Used by `find_bug_ids`.
+_BUG_FUNCTIONS = frozenset(('bug_is_testable', 'bug_is_untestable'))
+_BUG_FUNCTION_PATTERN = re.compile(r'^check_issue_(\d+)$')
+
+# The version of the format of the entries cached on disk. Entries of other
+# versions are ignored.
+_VERSION = 1
+
+# A lock guarding the cache on disk.
+_LOCK = threading.Lock()
+
+
+def get_index(package='pulp_smash.tests', pattern='test*.py'):
+    """Return the test modules in a package, without importing them.
+
+    As with ``unittest.TestLoader.discover``, the test modules are those whose
+    file names match ``pattern``, in ``package`` and the packages it contains.
+    A test class is a class defined in a test module that inherits from
+    ``unittest.TestCase`` and has test methods.
+
+    :param package: The name of a package, such as "pulp_smash.tests".
+    :param pattern: A shell-style pattern matching test module file names.
+    :returns: A tuple of :class:`pulp_smash.index.TestModule` objects, sorted
+        by name.
+    """
+    modules = _get_modules(package.partition('.')[0])
+    test_modules = []
+    for name, entry in sorted(modules.items()):
+        if not (name == package or name.startswith(package + '.')):
+            continue
+        if not fnmatchcase(os.path.basename(entry['path']), pattern):
+            continue
+        classes = []
+        for class_name in sorted(entry['classes']):
+            ancestors = _get_ancestors(name + '.' + class_name, modules)
+            test_methods = sorted({
+                method
+                for ancestor in ancestors
+                for method in _get_class(ancestor, modules).get('methods', ())
+            })
+            if test_methods and ancestors & _TEST_CASES:
+                classes.append(TestClass(
+                    name,
+                    class_name,
+                    tuple(test_methods),
+                    _SMOKE_TEST in ancestors,
+                ))
+        test_modules.append(TestModule(
+            name, entry['path'], tuple(classes), tuple(entry['bug_ids'])))
+    return tuple(test_modules)
+
+
+def get_smoke_tests(package='pulp_smash.tests'):
+    """Return the names of the smoke tests in a package, without imports.
+
+    :param package: The name of a package, such as "pulp_smash.tests".
+    :returns: A sorted list of fully qualified class names, such as
+        ``pulp_smash.tests.pulp3.file.api_v3.test_sync.SyncFileRepoTestCase``.
+    """
+    return [
+        '{}.{}'.format(test_class.module, test_class.name)
+        for test_module in get_index(package)
+        for test_class in test_module.classes
+        if test_class.smoke
+    ]
+
+
+def get_bug_ids(paths):
+    """Return the IDs of the bugs referenced by several Python modules.
+
+    This is like calling :func:`find_bug_ids` on each path, except that the
+    result is cached on disk.
+
+    :param paths: An iterable of paths to Python source files.
+    :returns: A set of integer bug IDs.
+    """
+    paths = {os.path.abspath(path): None for path in paths}
+    return {
+        bug_id
+        for entry in _scan(paths).values()
+        for bug_id in entry['bug_ids']
+    }
+
+
+def find_bug_ids(path):
+    """Return the IDs of the bugs referenced by a Python module.
+
+    The module is parsed, not imported. A bug is referenced by a call to
+    :func:`pulp_smash.selectors.bug_is_testable` or
+    :func:`pulp_smash.selectors.bug_is_untestable` whose first argument is an
+    integer, or a variable looping over a tuple or list of integers. A bug is
+    also referenced by a function named like ``check_issue_2277``.
+
+    :param path: The path to a Python source file.
+    :returns: A set of integer bug IDs. It is empty if the file can't be read
+        or parsed.
+    """
+    try:
+        with open(path, 'rb') as handle:
+            tree = ast.parse(handle.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    return _find_bug_ids(tree)
+
+
+def _find_bug_ids(tree):
+    """Return the IDs of the bugs referenced by a parsed module."""
+    bug_ids = set()
+    loop_ids = {}  # Variables looping over integers, and those integers.
+    calls = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.For) and isinstance(node.target, ast.Name):
+            loop_ids.setdefault(node.target.id, set()).update(
+                _get_ints(node.iter))
+        elif isinstance(node, ast.Call) and node.args:
+            calls.append(node)
+        match = _BUG_FUNCTION_PATTERN.match(_get_name(node) or '')
+        if match:
+            bug_ids.add(int(match.group(1)))
+    for call in calls:
+        if _get_name(call.func) not in _BUG_FUNCTIONS:
+            continue
+        arg = call.args[0]
+        if isinstance(arg, ast.Name):
+            bug_ids.update(loop_ids.get(arg.id, ()))
+        elif _get_int(arg) is not None:
+            bug_ids.add(_get_int(arg))
+    return bug_ids
+
+
+def _get_name(node):
+    """Return the name defined or used by ``node``, or ``None``."""
+    if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+        return node.name
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _get_int(node):
+    """Return the value of an integer literal ``node``, or ``None``."""
+    try:
+        value = node.value
+    except AttributeError:  # An ast.Num, before Python 3.8.
+        value = getattr(node, 'n', None)
+    if type(value) is int:  # pylint:disable=unidiomatic-typecheck
+        return value
+    return None
+
+
+def _get_ints(node):
+    """Return the integers in a tuple or list literal ``node``."""
+    if not isinstance(node, (ast.List, ast.Tuple)):
+        return set()
+    values = (_get_int(elt) for elt in node.elts)
+    return {value for value in values if value is not None}
+
+
+def _parse(source, path, name):
+    """Parse the source code of module ``name``.
+
+    :returns: A dict, which may be serialized as JSON, with these keys:
+
+        ``bug_ids``
+            A sorted list of the IDs of the bugs the module references.
+        ``classes``
+            A dict mapping the name of each class defined at the top of the
+            module to a dict, whose ``bases`` are the qualified names of the
+            class's bases, and whose ``methods`` are the names of the test
+            methods the class defines.
+        ``names``
+            A dict mapping each name imported by the module to the qualified
+            name it refers to.
+        ``path``
+            The path to the module.
+    """
+    try:
+        tree = ast.parse(source, path)
+    except (SyntaxError, ValueError):
+        tree = ast.Module(body=[])
+    is_package = os.path.basename(path) == '__init__.py'
+    names = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    names[alias.asname] = alias.name
+                else:
+                    root = alias.name.partition('.')[0]
+                    names[root] = root
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ''
+            if node.level:
+                parts = name.split('.')
+                if not is_package:
+                    parts.pop()
+                parts = parts[:len(parts) - node.level + 1]
+                module = '.'.join(parts + ([module] if module else []))
+            for alias in node.names:
+                names[alias.asname or alias.name] = module + '.' + alias.name
+    classes = {}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        classes[node.name] = {
+            'bases': [
+                _qualify(base, name, names) for base in node.bases
+            ],
+            'methods': sorted(
+                child.name for child in node.body
+                if isinstance(child, ast.FunctionDef) and
+                child.name.startswith('test')
+            ),
+        }
+    return {
+        'bug_ids': sorted(_find_bug_ids(tree)),
+        'classes': classes,
+        'names': names,
+        'path': path,
+    }
+
+
+def _qualify(node, module, names):
+    """Return the qualified name of a base class, or ``None``.
+
+    :param node: An expression naming a class, such as ``utils.SmokeTest``.
+    :param module: The name of the module the expression is in.
+    :param names: The names the module imports. See ``_parse``.
+    """
+    attrs = []
+    while isinstance(node, ast.Attribute):
+        attrs.insert(0, node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    root = names.get(node.id, module + '.' + node.id)
+    return '.'.join([root] + attrs)
+
+
+def _get_class(qualname, modules):
+    """Return the class with a qualified name, following imports, or ``{}``."""
+    seen = set()
+    while qualname not in seen:
+        seen.add(qualname)
+        module, _, name = qualname.rpartition('.')
+        entry = modules.get(module)
+        if entry is None:
+            return {}
+        if name in entry['classes']:
+            return entry['classes'][name]
+        if name not in entry['names']:
+            return {}
+        qualname = entry['names'][name]
+    return {}
+
+
+def _resolve(qualname, modules):
+    """Return the qualified name of the module defining a class."""
+    seen = set()
+    while qualname not in seen:
+        seen.add(qualname)
+        module, _, name = qualname.rpartition('.')
+        entry = modules.get(module)
+        if entry is None or name in entry['classes']:
+            return qualname
+        if name not in entry['names']:
+            return qualname
+        qualname = entry['names'][name]
+    return qualname
+
+
+def _get_ancestors(qualname, modules):
+    """Return the qualified names of a class and of each class it inherits."""
+    ancestors = set()
+    pending = [qualname]
+    while pending:
+        qualname = _resolve(pending.pop(), modules)
+        if qualname in ancestors:
+            continue
+        ancestors.add(qualname)
+        pending.extend(
+            base for base in _get_class(qualname, modules).get('bases', ())
+            if base is not None
+        )
+    return ancestors
+
+
+def _get_modules(package):
+    """Return every module in ``package``, parsed.
+
+    :param package: The name of a top-level package, such as "pulp_smash".
+    :returns: A dict mapping module names to the dicts returned by ``_parse``.
+    """
+    spec = importlib.util.find_spec(package)
+    root = spec.submodule_search_locations[0]
+    paths = {}
+    for directory, dirnames, filenames in os.walk(root):
+        if '__init__.py' not in filenames:
+            dirnames[:] = []
+            continue
+        dirnames[:] = [name for name in dirnames if name != '__pycache__']
+        parts = [package] + os.path.relpath(directory, root).split(os.sep)
+        parts = [part for part in parts if part != '.']
+        for filename in filenames:
+            if not filename.endswith('.py'):
+                continue
+            name = parts[:]
+            if filename != '__init__.py':
+                name.append(filename[:-3])
+            paths[os.path.join(directory, filename)] = '.'.join(name)
+    return {entry['name']: entry for entry in _scan(paths).values()}
+
+
+def _scan(paths):
+    """Parse Python source files, or read the results from disk.
+
+    :param paths: A dict mapping absolute paths to module names. A module name
+        may be ``None`` if it doesn't matter.
+    :returns: A dict mapping each path to the dict returned by ``_parse``,
+        with an added ``name``.
+    """
+    with _LOCK:
+        cache = _load()
+        changed = False
+        entries = {}
+        for path, name in paths.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            cached = cache.get(path)
+            if cached is not None and name is not None and (
+                    cached['module']['name'] != name):
+                cached = None
+            if cached is not None and (
+                    cached['mtime_ns'] == stat.st_mtime_ns and
+                    cached['size'] == stat.st_size):
+                entries[path] = cached['module']
+                continue
+            try:
+                with open(path, 'rb') as handle:
+                    source = handle.read()
+            except OSError:
+                continue
+            digest = hashlib.sha256(source).hexdigest()
+            if cached is None or cached['sha256'] != digest:
+                module = _parse(source, path, name or '')
+                module['name'] = name
+            else:
+                module = cached['module']
+            cache[path] = {
+                'module': module,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': digest,
+                'size': stat.st_size,
+            }
+            entries[path] = module
+            changed = True
+        if changed:
+            _save(cache)
+        return entries
+
+
+def _get_path():
+    """Return the path to the file in which the index is cached."""
+    return os.path.join(
+        BaseDirectory.xdg_cache_home, 'pulp_smash', 'index.json')
+
+
+def _load():
+    """Return every entry cached on disk, keyed by path."""
+    try:
+        with open(_get_path()) as handle:
+            cache = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get('version') != _VERSION:
+        return {}
+    return cache['files']
+
+
+def _save(files):
+    """Replace the entries cached on disk.
+
+    The file is replaced atomically, so that processes running at the same
+    time never read a partial file.
+    """
+    path = _get_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = '{}.{}.{}.tmp'.format(
+            path, os.getpid(), threading.get_ident())
+        with open(temp_path, 'w') as handle:
+            json.dump({'files': files, 'version': _VERSION}, handle)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
@@ -0,0 +1,318 @@
+# coding=utf-8
+"""Record the HTTP requests and commands made by Pulp Smash.
+
+Each HTTP request made by :class:`pulp_smash.api.Client` and each command run
+by :class:`pulp_smash.cli.Client` is described by a :data:`Call`, which is
+passed to every hook registered with :func:`add_hook`. A hook is any callable
+accepting a ``Call``. For example, this prints every slow call:
+
+>>> from pulp_smash import instrumentation
+>>> def print_slow_calls(call):
+...     if call.seconds > 10:
+...         print(call)
+>>> instrumentation.add_hook(print_slow_calls)
+
+By default, one hook is registered: a :class:`Recorder` that aggregates calls
+into a latency histogram per endpoint. See :func:`get_recorder`. When the
+interpreter exits, the recorder's results are written to the paths named by
+the ``PULP_SMASH_METRICS_JSON`` and ``PULP_SMASH_METRICS_PROM`` environment
+variables, if set. The former receives a JSON document with the 50th, 90th
+and 99th percentile latencies of each endpoint, and the latter a Prometheus
+`textfile`_, suitable for node_exporter's textfile collector. Both also tell
+how many bytes of content weren't uploaded because Pulp already had them. See
+:meth:`Recorder.add_upload_bytes_saved`.
+
+.. _textfile:
+    https://github.com/prometheus/node_exporter#textfile-collector
+"""
+import atexit
+import bisect
+import collections
+import json
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+Call = collections.namedtuple('Call', (
+    'kind',
+    'method',
+    'target',
+    'status',
+    'bytes_out',
+    'bytes_in',
+    'seconds',
+    'attempt',
+))
+"""A description of one HTTP request or command.
+
+``kind`` is "http" or "cli". For HTTP requests, ``method`` is the HTTP method,
+``target`` a URL template made by :func:`url_template`, and ``status`` the
+response status code, or ``None`` if the request failed with a connection
+error. For commands, ``method`` is "run", ``target`` the name of the program
+run, and ``status`` its exit code. ``bytes_out`` and ``bytes_in`` are the
+number of bytes sent and received, and ``seconds`` is the wall time taken by
+the call. ``attempt`` is 0 for a first attempt, 1 for the first retry, and so
+on. See :class:`pulp_smash.retrying.RetryPolicy`.
+"""
+
+# Upper bounds of the buckets of each latency histogram, in seconds. They grow
+# by a factor of √2, from 1 ms to about 17 minutes.
+BUCKETS = tuple(0.001 * 2 ** (i / 2) for i in range(41))
+
+# URL path segments that identify one resource among many, such as UUIDs,
+# MongoDB object IDs and integers. They are replaced by url_template().
+_ID_SEGMENT = re.compile(
+    r'^([0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}'
+    r'|[0-9a-f]{24}|[0-9]+)$',
+    re.IGNORECASE,
+)
+
+_HOOKS = []
+
+
+def add_hook(hook):
+    """Call ``hook`` with a :data:`Call` after each call is made."""
+    _HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    """Stop calling ``hook``. See :func:`add_hook`."""
+    _HOOKS.remove(hook)
+
+
+def record(call):
+    """Pass ``call`` to each hook. See :func:`add_hook`."""
+    for hook in tuple(_HOOKS):
+        hook(call)
+
+
+def url_template(url):
+    """Return the path of ``url``, with resource IDs replaced by ``{id}``.
+
+    >>> url_template('https://pulp.example.com/pulp/api/v2/tasks/'
+    ...              '5a3b4b6c2f8e1a0001d7c1a2/?details=true')
+    '/pulp/api/v2/tasks/{id}/'
+
+    This lets requests for different resources of one kind be aggregated.
+    """
+    return '/'.join(
+        '{id}' if _ID_SEGMENT.match(segment) else segment
+        for segment in urlsplit(url).path.split('/')
+    )
+
+
+class Histogram(object):
+    """A latency histogram, with buckets bounded by :data:`BUCKETS`."""
+
+    def __init__(self):
+        """Initialize this object with needed instance attributes."""
+        self.counts = [0] * (len(BUCKETS) + 1)  # The last bucket is +Inf.
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, seconds):
+        """Count a call that took ``seconds``."""
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, quantile):
+        """Estimate the given quantile, such as 0.99, of the latencies.
+
+        The estimate is interpolated within the bucket holding the quantile,
+        as Prometheus' ``histogram_quantile()`` does.
+        """
+        if not self.count:
+            return 0
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[index - 1] if index else 0
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+                upper = min(upper, self.max)
+                lower = min(lower, upper)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class Recorder(object):
+    """A hook that aggregates calls into per-endpoint latency histograms.
+
+    Calls are grouped by their ``kind``, ``method`` and ``target``.
+    """
+
+    def __init__(self):
+        """Initialize this object with needed instance attributes."""
+        self._lock = threading.Lock()
+        self.histograms = collections.defaultdict(Histogram)
+        self.statuses = collections.defaultdict(collections.Counter)
+        self.bytes_out = collections.Counter()
+        self.bytes_in = collections.Counter()
+        self.retries = collections.Counter()
+        self.upload_bytes_saved = 0
+
+    def __call__(self, call):
+        """Aggregate ``call``."""
+        key = (call.kind, call.method, call.target)
+        with self._lock:
+            self.histograms[key].add(call.seconds)
+            self.statuses[key][call.status] += 1
+            self.bytes_out[key] += call.bytes_out
+            self.bytes_in[key] += call.bytes_in
+            if call.attempt:
+                self.retries[key] += 1
+
+    def add_upload_bytes_saved(self, size):
+        """Count ``size`` bytes that weren't uploaded, as Pulp had them.
+
+        See :func:`pulp_smash.utils.upload_import_unit`.
+        """
+        with self._lock:
+            self.upload_bytes_saved += size
+
+    def summary(self):
+        """Return a list of dicts describing each endpoint, slowest first."""
+        endpoints = []
+        with self._lock:
+            for key, histogram in self.histograms.items():
+                kind, method, target = key
+                endpoints.append({
+                    'kind': kind,
+                    'method': method,
+                    'target': target,
+                    'count': histogram.count,
+                    'seconds': histogram.sum,
+                    'p50': histogram.quantile(0.5),
+                    'p90': histogram.quantile(0.9),
+                    'p99': histogram.quantile(0.99),
+                    'max': histogram.max,
+                    'statuses': {
+                        str(status): count
+                        for status, count in self.statuses[key].items()
+                    },
+                    'bytes_out': self.bytes_out[key],
+                    'bytes_in': self.bytes_in[key],
+                    'retries': self.retries[key],
+                })
+        endpoints.sort(key=lambda endpoint: endpoint['p99'], reverse=True)
+        return endpoints
+
+    def to_json(self):
+        """Return :meth:`summary` as a JSON document."""
+        return json.dumps({
+            'endpoints': self.summary(),
+            'upload_bytes_saved': self.upload_bytes_saved,
+        }, indent=2)
+
+    def to_prometheus(self):
+        """Return the histograms in the Prometheus text exposition format."""
+        lines = [
+            '# HELP pulp_smash_call_seconds Wall time of calls made by Pulp '
+            'Smash.',
+            '# TYPE pulp_smash_call_seconds histogram',
+        ]
+        with self._lock:
+            items = sorted(self.histograms.items())
+            for key, histogram in items:
+                labels = _labels(key)
+                cumulative = 0
+                bounds = [repr(bound) for bound in BUCKETS] + ['+Inf']
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append('pulp_smash_call_seconds_bucket{{{},le="{}"}} '
+                                 '{}'.format(labels, bound, cumulative))
+                lines.append('pulp_smash_call_seconds_sum{{{}}} {!r}'.format(
+                    labels, histogram.sum))
+                lines.append('pulp_smash_call_seconds_count{{{}}} {}'.format(
+                    labels, histogram.count))
+            lines.extend((
+                '# HELP pulp_smash_calls_total Calls made by Pulp Smash, by '
+                'status.',
+                '# TYPE pulp_smash_calls_total counter',
+            ))
+            for key, _ in items:
+                for status, count in sorted(self.statuses[key].items(),
+                                            key=lambda item: str(item[0])):
+                    lines.append('pulp_smash_calls_total{{{},status="{}"}} {}'
+                                 .format(_labels(key), status, count))
+            lines.extend((
+                '# HELP pulp_smash_call_bytes_total Bytes sent and received '
+                'by calls made by Pulp Smash.',
+                '# TYPE pulp_smash_call_bytes_total counter',
+            ))
+            for key, _ in items:
+                for direction, counter in (('out', self.bytes_out),
+                                           ('in', self.bytes_in)):
+                    lines.append(
+                        'pulp_smash_call_bytes_total{{{},direction="{}"}} {}'
+                        .format(_labels(key), direction, counter[key])
+                    )
+            lines.extend((
+                '# HELP pulp_smash_call_retries_total Calls made by Pulp '
+                'Smash that were retries of failed calls.',
+                '# TYPE pulp_smash_call_retries_total counter',
+            ))
+            for key, _ in items:
+                lines.append('pulp_smash_call_retries_total{{{}}} {}'.format(
+                    _labels(key), self.retries[key]))
+            lines.extend((
+                '# HELP pulp_smash_upload_bytes_saved_total Bytes of content '
+                'that Pulp Smash did not upload, because Pulp already had '
+                'them.',
+                '# TYPE pulp_smash_upload_bytes_saved_total counter',
+                'pulp_smash_upload_bytes_saved_total {}'.format(
+                    self.upload_bytes_saved),
+            ))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(key):
+    """Format a ``(kind, method, target)`` key as Prometheus labels."""
+    return ','.join(
+        '{}="{}"'.format(name, _escape_label_value(value))
+        for name, value in zip(('kind', 'method', 'target'), key)
+    )
+
+
+def _escape_label_value(value):
+    """Escape a Prometheus label value."""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+# The recorder registered by default. See get_recorder().
+_RECORDER = Recorder()
+add_hook(_RECORDER)
+
+
+def get_recorder():
+    """Return the :class:`Recorder` registered by default."""
+    return _RECORDER
+
+
+def _write_atomically(path, text):
+    """Write ``text`` to ``path``, so that readers never see a partial file."""
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as handle:
+        handle.write(text)
+    os.replace(temp_path, path)
+
+
+@atexit.register
+def _export():
+    """Export the default recorder's results, if asked to. See module docs."""
+    for variable, method in (
+            ('PULP_SMASH_METRICS_JSON', _RECORDER.to_json),
+            ('PULP_SMASH_METRICS_PROM', _RECORDER.to_prometheus)):
+        path = os.environ.get(variable)
+        if path:
+            _write_atomically(path, method())
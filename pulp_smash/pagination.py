@@ -0,0 +1,74 @@
+# coding=utf-8
+"""Walk the paginated list endpoints of Pulp 3.
+
+See :func:`pulp_smash.pagination.page_results`.
+"""
+import concurrent.futures
+
+from pulp_smash import api
+
+
+def page_results(  # pylint:disable=too-many-arguments
+        server_config,
+        url,
+        params=None,
+        fields=None,
+        prefetch=True,
+        pulp_system=None):
+    """Lazily yield each result from a paginated Pulp 3 list endpoint.
+
+    Pages are fetched one at a time, following ``next`` links, so that only
+    one or two pages are held in memory at once. For example, this walks every
+    content unit in a repository version, no matter how many there are:
+
+    >>> from pulp_smash import config, pagination
+    >>> for unit in pagination.page_results(
+    ...         config.get_config(),
+    ...         version_href + 'content/',
+    ...         fields=('_href', 'artifact')):
+    ...     print(unit['artifact'])
+
+    Because this is a generator, no request is made until the first result is
+    consumed. Errors, such as an HTTP 404, are raised at that time.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param url: The URL or path of the list endpoint.
+    :param params: Query parameters, such as filters, for the first page. The
+        ``next`` links returned by Pulp carry them to later pages.
+    :param fields: If given, an iterable of field names. Each result is
+        trimmed to these fields. They are also requested from Pulp with the
+        ``fields`` query parameter, which servers may ignore.
+    :param prefetch: Whether to fetch the next page in a background thread
+        while the caller works on the current one.
+    :param pulp_system: The system to query. If ``None`` is provided, then the
+        first system found with the api role is used.
+    :returns: A generator of dicts.
+    """
+    client = api.Client(
+        server_config, api.json_handler, pulp_system=pulp_system)
+    params = dict(params or {})
+    if fields is not None:
+        fields = tuple(fields)
+        params['fields'] = ','.join(fields)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        page = client.get(url, params=params)
+        while True:
+            next_page = None
+            if page['next'] and prefetch:
+                next_page = executor.submit(client.get, page['next'])
+            for result in page['results']:
+                if fields is not None:
+                    result = {
+                        field: result[field]
+                        for field in fields if field in result
+                    }
+                yield result
+            if not page['next']:
+                break
+            if next_page is None:
+                page = client.get(page['next'])
+            else:
+                page = next_page.result()
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,76 @@
+# coding=utf-8
+"""Act upon the services of a Pulp application on all of its hosts at once.
+
+See :func:`pulp_smash.phases.fan_out`, which
+:class:`pulp_smash.cli.GlobalServiceManager` uses to start, stop and restart
+services.
+"""
+import collections
+import concurrent.futures
+
+from pulp_smash.config import AMQP_SERVICES
+
+SERVICE_PHASES = (
+    frozenset(AMQP_SERVICES | {'mongod'}),
+    frozenset(('pulp_celerybeat', 'pulp_resource_manager', 'pulp_workers')),
+    frozenset(('httpd', 'squid')),
+)
+"""The order in which :func:`fan_out` starts services.
+
+Services in one phase are started on every host at once, once the services in
+the phases before have started on every host. Services are stopped in reverse
+order: web servers, then Pulp's workers, then the AMQP broker and database.
+Services that are in no phase are started last and stopped first.
+"""
+
+# The maximum number of hosts that fan_out acts upon at once.
+_MAX_HOSTS = 8
+
+
+def fan_out(cfg, act, action, services):
+    """Start, stop or restart services on all hosts, phase by phase.
+
+    See :data:`pulp_smash.phases.SERVICE_PHASES`. Within a phase, hosts are
+    acted upon at the same time. If acting upon a host fails, the first
+    exception raised is re-raised once the phase is over, and later phases are
+    skipped.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about a Pulp
+        application.
+    :param act: A callable taking ``action``, a
+        :class:`pulp_smash.config.PulpSystem` and a set of service names. It
+        acts upon these services on that host, and returns an iterable of
+        results.
+    :param action: Either "start", "stop" or "restart".
+    :param services: A set of service names.
+    :returns: A dict mapping the affected hosts' hostnames to tuples of the
+        results returned by ``act``.
+    """
+    phases = _get_service_phases(services)
+    if action == 'stop':
+        phases.reverse()
+    result = {}
+    with concurrent.futures.ThreadPoolExecutor(_MAX_HOSTS) as executor:
+        for phase in phases:
+            futures = collections.OrderedDict(
+                (system.hostname, executor.submit(act, action, system, phase))
+                for system in cfg.systems
+                if phase.intersection(cfg.services_for_roles(system.roles))
+            )
+            concurrent.futures.wait(futures.values())
+            for hostname, future in futures.items():
+                result[hostname] = (
+                    result.get(hostname, ()) + tuple(future.result()))
+    return result
+
+
+def _get_service_phases(services):
+    """Split ``services`` into the phases in which they are started.
+
+    :param services: A set of service names.
+    :returns: A list of non-empty sets of service names. Services not named in
+        :data:`pulp_smash.phases.SERVICE_PHASES` are in the last set.
+    """
+    phases = [services.intersection(phase) for phase in SERVICE_PHASES]
+    phases.append(services.difference(*SERVICE_PHASES))
+    return [phase for phase in phases if phase]
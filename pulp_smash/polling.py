@@ -0,0 +1,327 @@
+# coding=utf-8
+"""Wait for the tasks Pulp spawns to complete.
+
+See :func:`pulp_smash.polling.poll_tasks`. The response handlers in
+:mod:`pulp_smash.api` use it to wait for the tasks listed in HTTP 202
+responses.
+"""
+import collections
+import warnings
+from time import monotonic, sleep
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from packaging.version import Version
+
+from pulp_smash import balancing, exceptions, retrying, sessions
+
+_TASK_END_STATES = ('canceled', 'error', 'finished', 'skipped', 'timed out')
+_P3_TASK_END_STATES = ('canceled', 'completed', 'failed', 'skipped')
+_P2_TASK_SEARCH_PATH = '/pulp/api/v2/tasks/search/'
+_P3_TASKS_PATH = '/pulp/api/v3/tasks/'
+
+# Base URLs of Pulp 3 hosts whose task list ignores the "id__in" filter. Used
+# by `_search_tasks`.
+_P3_UNFILTERED_HOSTS = set()
+
+# How long `poll_task` waits for a task to complete, in seconds.
+_TASK_TIMEOUT = 1800
+
+# The shortest and longest delays between two polls of a task, in seconds.
+_POLL_DELAY_MIN = 0.05
+_POLL_DELAY_MAX = 2
+
+
+def _poll_delays(minimum=_POLL_DELAY_MIN, maximum=_POLL_DELAY_MAX):
+    """Return the delays to wait between polls of a task.
+
+    See :func:`pulp_smash.retrying.get_delays`.
+    """
+    return retrying.get_delays(minimum, maximum)
+
+
+def poll_spawned_tasks(
+        server_config,
+        call_report,
+        pulp_system=None,
+        timeout=None):
+    """Recursively wait for spawned tasks to complete. Yield response bodies.
+
+    Recursively wait for each of the spawned tasks listed in the given `call
+    report`_ to complete. For each task that completes, yield a response body
+    representing that task's final state.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param call_report: A dict-like object with a `call report`_ structure.
+    :param pulp_system: The system from where to pool the task. If ``None`` is
+        provided then the first system found with api role will be used.
+    :param timeout: How long to wait for each task, in seconds. See
+        :meth:`poll_tasks`.
+    :returns: A generator yielding task bodies.
+    :raises: Same as :meth:`poll_tasks`.
+
+    .. _call report:
+        http://docs.pulpproject.org/en/latest/dev-guide/conventions/sync-v-async.html#call-report
+    """
+    if server_config.pulp_version < Version('3'):
+        hrefs = [task['_href'] for task in call_report['spawned_tasks']]
+    else:
+        hrefs = [call_report['_href']]
+    for final_task_state in poll_tasks(
+            server_config, hrefs, pulp_system, timeout):
+        yield final_task_state
+
+
+def poll_task(server_config, href, pulp_system=None, timeout=None):
+    """Wait for a task and its children to complete. Yield response bodies.
+
+    Poll the task at ``href``, waiting for the task to complete. When a
+    response is received indicating that the task is complete, yield that
+    response body and poll each child task. See :meth:`poll_tasks`.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param href: The path to a task you'd like to monitor recursively.
+    :param pulp_system: The system from where to pool the task. If ``None`` is
+        provided then the first system found with api role will be used.
+    :param timeout: How long to wait for the task to complete, in seconds.
+        See :meth:`poll_tasks`.
+    :returns: An generator yielding response bodies.
+    :raises pulp_smash.exceptions.TaskTimedOutError: If a task takes too
+        long to complete.
+    """
+    for final_task_state in poll_tasks(
+            server_config, (href,), pulp_system, timeout):
+        yield final_task_state
+
+
+def poll_tasks(server_config, hrefs, pulp_system=None, timeout=None):
+    """Wait for several tasks and their children to complete. Yield bodies.
+
+    Track all of the tasks at ``hrefs`` at once. Each time around, fetch the
+    state of every task still running with a single HTTP request: a task
+    search on Pulp 2, or a filtered task list on Pulp 3. When a task reaches
+    an end state, start tracking its children too.
+
+    Response bodies are yielded in the same order as they would be if each
+    task were polled one after another: a task, then (recursively) each of
+    its children in ``spawned_tasks`` order, then the next task in ``hrefs``.
+    A completed task is held back until every task before it in that order
+    has been yielded. As a result, callers may rely on ``next(...)`` and
+    ``tuple(...)[0]`` returning the first task in ``hrefs``.
+
+    The tasks are polled often at first, and then less and less often. This
+    keeps the latency of short tasks low without flooding Pulp with requests
+    while a long task, such as a sync, is running.
+
+    If no ``pulp_system`` is given and the application has a balancer, each
+    poll is sent to the host the balancer routes the first of ``hrefs`` to.
+    As a result, the polls stick to one host for as long as it is healthy.
+    See :class:`pulp_smash.balancing.Balancer`.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param hrefs: An iterable of paths to tasks you'd like to monitor
+        recursively.
+    :param pulp_system: The system from where to pool the task. If ``None`` is
+        provided then the first system found with api role will be used.
+    :param timeout: How long to wait for each task to complete, in seconds.
+        Each child task gets a deadline of its own, starting when its parent
+        completes. Defaults to 1800 seconds (30 minutes).
+    :returns: An generator yielding response bodies.
+    :raises pulp_smash.exceptions.TaskTimedOutError: If a task takes too
+        long to complete.
+    """
+    balancer = None
+    if not pulp_system:
+        balancer = balancing.get_balancer(server_config)
+        pulp_system = server_config.get_systems('api')[0]
+    if timeout is None:
+        timeout = _TASK_TIMEOUT
+    hrefs = tuple(hrefs)
+    # A mapping between the href and deadline of each task still running.
+    deadlines = collections.OrderedDict(
+        (href, monotonic() + timeout) for href in hrefs
+    )
+    # Completed tasks that have not been yielded yet, and a depth-first stack
+    # of the hrefs to be yielded. The top of the stack is yielded next.
+    completed = {}
+    stack = list(reversed(hrefs))
+    delays = _poll_delays()
+    while deadlines:
+        if balancer is None:
+            states = _get_task_states(
+                server_config, pulp_system, tuple(deadlines))
+        else:
+            states = _get_balanced_task_states(
+                server_config, balancer, hrefs[0], tuple(deadlines))
+        spawned = _complete_tasks(
+            server_config, states, deadlines, completed, timeout)
+        while stack and stack[-1] in completed:
+            attrs = completed.pop(stack.pop())
+            stack.extend(reversed(
+                [task['_href'] for task in attrs['spawned_tasks']]
+            ))
+            yield attrs
+        if deadlines and not spawned:
+            _wait_for_tasks(deadlines, delays, timeout)
+
+
+def _complete_tasks(server_config, states, deadlines, completed, timeout):
+    """Move each task in ``states`` that has ended into ``completed``.
+
+    A task that has ended is no longer tracked in ``deadlines``. Its children
+    are tracked instead, each with a deadline ``timeout`` seconds from now.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param states: A mapping between task hrefs and task bodies, as returned
+        by :func:`_get_task_states`.
+    :param deadlines: A mapping between the hrefs of running tasks and their
+        deadlines. Updated in place.
+    :param completed: A mapping between the hrefs of completed tasks and their
+        bodies. Updated in place.
+    :param timeout: How long to wait for each child task, in seconds.
+    :returns: Whether any of the tasks that have ended spawned children.
+    """
+    if server_config.pulp_version < Version('3'):
+        task_end_states = _TASK_END_STATES
+    else:
+        task_end_states = _P3_TASK_END_STATES
+    spawned = False
+    for href, attrs in states.items():
+        if attrs['state'] not in task_end_states:
+            continue
+        completed[href] = attrs
+        del deadlines[href]
+        for task in attrs['spawned_tasks']:
+            deadlines[task['_href']] = monotonic() + timeout
+            spawned = True
+    return spawned
+
+
+def _wait_for_tasks(deadlines, delays, timeout):
+    """Sleep until the tasks in ``deadlines`` should be polled again.
+
+    :param deadlines: A mapping between the hrefs of running tasks and their
+        deadlines, as returned by ``time.monotonic()``.
+    :param delays: An iterator yielding delays, such as
+        :func:`_poll_delays` returns.
+    :param timeout: How long each task was given, in seconds. Used in error
+        messages.
+    :raises pulp_smash.exceptions.TaskTimedOutError: If the deadline of a task
+        has passed.
+    """
+    now = monotonic()
+    href, deadline = min(deadlines.items(), key=lambda item: item[1])
+    if deadline <= now:
+        raise exceptions.TaskTimedOutError(
+            'Task {} is ongoing after {} seconds.'.format(href, timeout)
+        )
+    sleep(min(next(delays), deadline - now))
+
+
+def _get_task_states(server_config, pulp_system, hrefs):
+    """Fetch the current state of each of the tasks at ``hrefs``.
+
+    A single task is read directly. Several tasks are read with one task
+    search (Pulp 2) or one filtered task list (Pulp 3). See
+    :func:`_search_tasks`.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param pulp_system: The :class:`pulp_smash.config.PulpSystem` to query.
+    :param hrefs: A tuple of paths to tasks.
+    :returns: An ordered dict mapping each of ``hrefs`` to a task body.
+    """
+    base_url = server_config.get_base_url(pulp_system)
+    kwargs = server_config.get_requests_kwargs(pulp_system)
+    session = sessions.get_system_session(server_config, pulp_system)
+    if len(hrefs) > 1:
+        found = _search_tasks(server_config, pulp_system, hrefs)
+    else:
+        found = {}
+    states = collections.OrderedDict()
+    for href in hrefs:
+        path = urlsplit(urljoin(base_url, href)).path
+        if path in found:
+            states[href] = found[path]
+        else:
+            response = session.get(urljoin(base_url, href), **kwargs)
+            response.raise_for_status()
+            states[href] = response.json()
+    return states
+
+
+def _get_balanced_task_states(server_config, balancer, key, hrefs):
+    """Like :func:`_get_task_states`, on the host ``key`` is routed to.
+
+    :param balancer: A :class:`pulp_smash.balancing.Balancer`.
+    :param key: The key routing the polls to a host. See
+        :meth:`pulp_smash.balancing.Balancer.acquire`.
+    """
+    pulp_system = balancer.acquire(key)
+    start = monotonic()
+    error = None
+    try:
+        return _get_task_states(server_config, pulp_system, hrefs)
+    except requests.exceptions.RequestException as err:
+        error = err
+        raise
+    finally:
+        balancing.release_request(balancer, pulp_system, start, error=error)
+
+
+def _search_tasks(server_config, pulp_system, hrefs):
+    """Fetch the tasks at ``hrefs`` with a single search or list request.
+
+    On Pulp 2, ``POST`` a task search filtering on ``task_id``. On Pulp 3,
+    ``GET`` the task list filtered with ``id__in``, following ``next`` links.
+
+    Pulp 3 must apply the ``id__in`` filter. If a listed task wasn't asked
+    for, the filter was ignored. When this happens, warn, remember that the
+    host doesn't support the filter, and return nothing. The caller then reads
+    each task directly, as was done before this function existed.
+
+    :param server_config: A :class:`pulp_smash.config.PulpSmashConfig` object.
+    :param pulp_system: The :class:`pulp_smash.config.PulpSystem` to query.
+    :param hrefs: A tuple of paths to tasks.
+    :returns: A dict mapping the URL path of each task found to its body.
+    """
+    base_url = server_config.get_base_url(pulp_system)
+    kwargs = server_config.get_requests_kwargs(pulp_system)
+    session = sessions.get_system_session(server_config, pulp_system)
+    paths = {urlsplit(urljoin(base_url, href)).path for href in hrefs}
+    task_ids = [href.rstrip('/').rsplit('/', 1)[-1] for href in hrefs]
+    if server_config.pulp_version < Version('3'):
+        response = session.post(
+            urljoin(base_url, _P2_TASK_SEARCH_PATH),
+            json={'criteria': {'filters': {'task_id': {'$in': task_ids}}}},
+            **kwargs
+        )
+        response.raise_for_status()
+        tasks = response.json()
+    else:
+        if base_url in _P3_UNFILTERED_HOSTS:
+            return {}
+        tasks = []
+        url = urljoin(base_url, _P3_TASKS_PATH)
+        params = {'id__in': ','.join(task_ids)}
+        while url:
+            response = session.get(url, params=params, **kwargs)
+            response.raise_for_status()
+            page = response.json()
+            tasks.extend(page['results'])
+            url = page['next']
+            params = None  # The "next" link already carries the filter.
+            if len(tasks) > len(hrefs):
+                break
+    found = {}
+    for task in tasks:
+        found[urlsplit(urljoin(base_url, task['_href'])).path] = task
+    if server_config.pulp_version >= Version('3') and set(found) - paths:
+        _P3_UNFILTERED_HOSTS.add(base_url)
+        warnings.warn(
+            'The Pulp 3 task list at {} ignores the "id__in" filter, so tasks '
+            'will be polled one at a time, with one request per task.'
+            .format(urljoin(base_url, _P3_TASKS_PATH)),
+            RuntimeWarning
+        )
+        return {}
+    return found
@@ -0,0 +1,231 @@
+# coding=utf-8
+"""Tell whether the services making up a Pulp application are ready.
+
+Starting a service returns before the service is ready to be used. Rather
+than sleeping for a fixed time, probe each service until it answers. See
+:func:`pulp_smash.cli.wait_until_ready`, which service managers call when
+asked to wait, and :func:`get_ready_checks`, which lists the probes.
+
+This module doesn't run commands on hosts itself. Functions that need to,
+such as :func:`get_ready_checks`, are passed a function that does.
+"""
+import functools
+import socket
+from time import monotonic, sleep
+
+import requests
+from packaging.version import Version
+
+from pulp_smash import api, exceptions, retrying
+
+READY_TIMEOUT = 300
+"""How long :func:`pulp_smash.cli.wait_until_ready` waits, in seconds."""
+
+# How long to wait between rounds of readiness checks, in seconds. The delay
+# doubles after each round, up to the maximum.
+_READY_DELAY_MIN = 0.25
+_READY_DELAY_MAX = 5
+
+# The TCP ports on which services listen, for those checked by connecting.
+_SERVICE_PORTS = {'qpidd': 5672, 'rabbitmq': 5672, 'squid': 3128}
+
+# The prefixes of the names of the workers run by each service, as listed by
+# Pulp's status API.
+_WORKER_PREFIXES = {
+    'pulp_celerybeat': 'scheduler@',
+    'pulp_resource_manager': 'resource_manager@',
+    'pulp_workers': 'reserved_resource_worker',
+}
+
+
+def get_status(cfg, pulp_system=None):
+    """Return the body of Pulp's status API, or ``None`` if it can't be read.
+
+    The request isn't retried or cached, so that the answer is current.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about a Pulp
+        application.
+    :param pulp_smash.config.PulpSystem pulp_system: The host to ask. Defaults
+        to the first host with the ``api`` role.
+    :returns: A dict, or ``None`` if the status API can't be reached or
+        answers with an error.
+    """
+    client = api.Client(
+        cfg,
+        api.echo_handler,
+        pulp_system=pulp_system,
+        retry_policy=retrying.RetryPolicy(retries=0),
+    )
+    client.response_cache = None
+    if cfg.pulp_version >= Version('3'):
+        path = '/pulp/api/v3/status/'
+    else:
+        path = '/pulp/api/v2/status/'
+    try:
+        response = client.get(path, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+
+def get_heartbeats(cfg):
+    """Return the last heartbeat of each of Pulp's workers.
+
+    Pass the result to :func:`pulp_smash.cli.wait_until_ready` before
+    restarting workers, so that workers are only deemed ready once they have
+    sent a new heartbeat.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about a Pulp
+        application.
+    :returns: A frozenset of ``(worker name, last heartbeat)`` tuples. It is
+        empty if Pulp's status API can't be read.
+    """
+    return _get_heartbeats(get_status(cfg))
+
+
+def _get_heartbeats(status):
+    """Return the heartbeats listed in the body of a status API response."""
+    if not status:
+        return frozenset()
+    # Pulp 2 lists "known_workers", and Pulp 3 lists "online_workers".
+    workers = status.get('online_workers', status.get('known_workers', ()))
+    return frozenset(
+        (worker.get('name', worker.get('_id')), worker.get('last_heartbeat'))
+        for worker in workers
+    )
+
+
+def wait_for(checks, timeout=READY_TIMEOUT):
+    """Call functions until each has returned true, or time runs out.
+
+    Each round, the functions that haven't yet returned true are called. The
+    delay between rounds grows exponentially, so that a fast service is
+    noticed quickly and a slow one isn't hammered.
+
+    :param checks: A dict mapping descriptions, such as "httpd on
+        example.com", to functions that accept no arguments and return a
+        boolean.
+    :param timeout: How long to wait, in seconds.
+    :returns: Nothing.
+    :raises pulp_smash.exceptions.ServiceNotReadyError: If a function hasn't
+        returned true after ``timeout`` seconds.
+    """
+    deadline = monotonic() + timeout
+    delay = _READY_DELAY_MIN
+    while True:
+        checks = {
+            description: check
+            for description, check in checks.items()
+            if not check()
+        }
+        if not checks:
+            return
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            raise exceptions.ServiceNotReadyError(
+                'Still not ready after {} seconds: {}'
+                .format(timeout, ', '.join(sorted(checks)))
+            )
+        sleep(min(delay, remaining))
+        delay = min(delay * 2, _READY_DELAY_MAX)
+
+
+def get_ready_checks(cfg, services, run, pulp_system=None, stale=frozenset()):
+    """Return functions that tell whether services are ready to be used.
+
+    A service is checked on each host that the configuration says runs it.
+    The checks are:
+
+    httpd
+        Pulp's status API answers on the host, and reports that the database
+        is connected.
+    pulp_celerybeat, pulp_resource_manager, pulp_workers
+        Pulp's status API lists a worker of the right kind on the host, with
+        a heartbeat not in ``stale``.
+    mongod
+        ``mongo`` pings the database on the host.
+    qpidd, rabbitmq, squid
+        The service's port accepts TCP connections.
+
+    Other services aren't checked. Pass the result to :func:`wait_for`.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about a Pulp
+        application.
+    :param services: An iterable of service names.
+    :param run: A function that accepts a
+        :class:`pulp_smash.config.PulpSystem` and a command, runs the command
+        on the host, and returns a :class:`pulp_smash.cli.CompletedProcess`.
+    :param pulp_smash.config.PulpSystem pulp_system: A specific host to check,
+        instead of every host.
+    :param stale: Worker heartbeats that don't count, as returned by
+        :func:`get_heartbeats`.
+    :returns: A dict, as accepted by :func:`wait_for`.
+    """
+    services = set(services)
+    systems = cfg.systems if pulp_system is None else (pulp_system,)
+    checks = {}
+    for system in systems:
+        for service in services.intersection(
+                cfg.services_for_roles(system.roles)):
+            check = _get_ready_check(cfg, system, service, run, stale)
+            if check is not None:
+                checks['{} on {}'.format(service, system.hostname)] = check
+    return checks
+
+
+def _get_ready_check(cfg, pulp_system, service, run, stale):
+    """Return a function that tells whether a service is ready, or ``None``."""
+    if service in _SERVICE_PORTS:
+        return functools.partial(
+            _port_is_open, pulp_system.hostname, _SERVICE_PORTS[service])
+    if service == 'mongod':
+        return functools.partial(_mongod_is_ready, pulp_system, run)
+    if service == 'httpd':
+        return functools.partial(_httpd_is_ready, cfg, pulp_system)
+    if service in _WORKER_PREFIXES:
+        return functools.partial(
+            _workers_are_ready,
+            cfg,
+            pulp_system,
+            _WORKER_PREFIXES[service],
+            stale,
+        )
+    return None
+
+
+def _port_is_open(hostname, port):
+    """Tell whether a TCP connection to ``hostname`` and ``port`` succeeds."""
+    try:
+        socket.create_connection((hostname, port), timeout=5).close()
+    except OSError:
+        return False
+    return True
+
+
+def _mongod_is_ready(pulp_system, run):
+    """Tell whether MongoDB answers a ping on a host."""
+    result = run(pulp_system, (
+        'mongo', '--quiet', '--eval', 'db.runCommand({ping: 1}).ok'
+    ))
+    return result.returncode == 0 and result.stdout.strip() == '1'
+
+
+def _httpd_is_ready(cfg, pulp_system):
+    """Tell whether Pulp's status API answers, with its database connected."""
+    status = get_status(cfg, pulp_system)
+    return bool(status) and bool(
+        status.get('database_connection', {}).get('connected'))
+
+
+def _workers_are_ready(cfg, pulp_system, prefix, stale):
+    """Tell whether a worker on a host sent a new heartbeat.
+
+    Workers are named like ``reserved_resource_worker-0@example.com``. Only
+    those whose name has ``prefix``, and ends with the host's name, count.
+    """
+    suffix = '@' + pulp_system.hostname
+    return any(
+        name and name.startswith(prefix) and name.endswith(suffix)
+        for name, _ in _get_heartbeats(get_status(cfg)) - stale
+    )
@@ -0,0 +1,119 @@
+# coding=utf-8
+"""Decide whether, and after how long, to retry a failed request.
+
+See :class:`pulp_smash.retrying.RetryPolicy`, which
+:class:`pulp_smash.api.Client` consults after each failed request.
+"""
+import datetime
+import email.utils
+import random
+
+
+def get_delays(minimum, maximum):
+    """Yield an endless series of delays to wait between attempts, in seconds.
+
+    The delays grow exponentially from ``minimum`` to ``maximum``, so that a
+    short wait ends quickly while a long one doesn't flood the server with
+    requests. Each delay is jittered downwards by up to half its length, so
+    that many clients started at once drift apart. Task polls use these
+    delays too, as in :func:`pulp_smash.polling.poll_task`.
+    """
+    delay = minimum
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, maximum)
+
+
+class RetryPolicy(object):  # pylint:disable=too-few-public-methods
+    """Decide whether and when :class:`pulp_smash.api.Client` retries requests.
+
+    A request is retried if it fails with a connection error, such as a reset
+    connection, or if its response has one of ``statuses``, but only if its
+    method is one of ``methods``. Retries are made after jittered,
+    exponentially growing delays, as in :func:`pulp_smash.polling.poll_task`.
+    If a response has a ``Retry-After`` header, at least that long is waited.
+
+    By default, only idempotent methods are retried. To retry a POST, opt in:
+
+    >>> from pulp_smash import api, config, retrying
+    >>> client = api.Client(config.get_config())
+    >>> client.retry_policy = retrying.RetryPolicy(
+    ...     methods=retrying.RetryPolicy.IDEMPOTENT_METHODS | {'POST'})
+
+    A default policy may be set for each host in the configuration file, in
+    the ``retry`` section of the ``api`` role, whose keys are the names of
+    this class's arguments. Every retry is recorded by
+    :mod:`pulp_smash.instrumentation`.
+
+    :param retries: The maximum number of times a request is retried.
+    :param methods: The HTTP methods that may be retried.
+    :param statuses: The response status codes that cause a retry.
+    :param backoff: The delay before the first retry, in seconds.
+    :param max_backoff: The maximum delay between retries, in seconds.
+    :param budget: The maximum time spent on one request, including retries,
+        in seconds. A retry that would overrun the budget isn't made.
+    """
+
+    IDEMPOTENT_METHODS = frozenset(('DELETE', 'GET', 'HEAD', 'OPTIONS'))
+
+    def __init__(  # pylint:disable=too-many-arguments
+            self,
+            retries=3,
+            methods=IDEMPOTENT_METHODS,
+            statuses=(502, 503, 504),
+            backoff=0.5,
+            max_backoff=30,
+            budget=60):
+        """Initialize this object with needed instance attributes."""
+        self.retries = retries
+        self.methods = frozenset(method.upper() for method in methods)
+        self.statuses = frozenset(statuses)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+
+    def get_delays(self):
+        """Return an iterator of delays to use between retries of a request."""
+        return get_delays(self.backoff, self.max_backoff)
+
+    def get_delay(self, method, attempt, delays, remaining, response=None):
+        """Return how long to wait before retrying a request, or ``None``.
+
+        :param method: The request's HTTP method.
+        :param attempt: The number of times the request has been retried.
+        :param delays: An iterator returned by :meth:`get_delays`.
+        :param remaining: The number of seconds left in the budget.
+        :param response: The response received, or ``None`` if the request
+            failed with a connection error.
+        :returns: A number of seconds, or ``None`` if no retry should be made.
+        """
+        if attempt >= self.retries or method.upper() not in self.methods:
+            return None
+        if response is not None and response.status_code not in self.statuses:
+            return None
+        delay = next(delays)
+        if response is not None:
+            delay = max(delay, _parse_retry_after(response.headers))
+        if delay > remaining:
+            return None
+        return delay
+
+
+def _parse_retry_after(headers):
+    """Return the number of seconds asked for by a Retry-After header, or 0.
+
+    The header may hold a number of seconds or an HTTP date.
+    """
+    value = headers.get('Retry-After')
+    if not value:
+        return 0
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0, (date - now).total_seconds())
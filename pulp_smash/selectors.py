@@ -1,13 +1,44 @@
 # coding=utf-8
-"""Tools for selecting and deselecting tests."""
+"""Tools for selecting and deselecting tests.
+
+:func:`bug_is_testable` and :func:`bug_is_untestable` look bugs up at
+https://pulp.plan.io. Each bug is looked up at most once per process, and the
+result is also cached on disk, in ``$XDG_CACHE_HOME/pulp_smash/bugs.json``, so
+that later processes needn't look it up either:
+
+* An entry is fresh for ``PULP_SMASH_BUG_TTL`` seconds, or an hour by default.
+  Set that environment variable to 0 to disable the cache on disk.
+* For a day after that, a stale entry is still used, and the bug is looked up
+  again in the background. If the lookup fails, the stale entry is kept.
+* Older entries are not used. The bug is looked up before it is used.
+
+Set the ``PULP_SMASH_OFFLINE`` environment variable to 1 to never contact the
+bug tracker. Entries on disk of any age are used, and bugs that aren't cached
+are handled as if the bug tracker couldn't be reached.
+
+When a cassette is in use, bugs aren't read from or written to disk, so that
+a recording doesn't depend on the cache. See :mod:`pulp_smash.cassette`.
+
+Rather than looking bugs up one at a time as tests run, every bug referenced
+by the test modules loaded so far is looked up at once, with a few batched
+requests, the first time a bug isn't cached. By then, the test runner has
+loaded every test module it has been asked to run. See :func:`prefetch_bugs`.
+"""
+import concurrent.futures
+import json
+import os
+import sys
+import threading
 import warnings
 from collections import namedtuple
 from functools import wraps
+from time import time
 
 import requests
 from packaging.version import Version
+from xdg import BaseDirectory
 
-from pulp_smash import exceptions
+from pulp_smash import cassette, exceptions, index, sessions
 
 # These are all possible values for a bug's "status" field.
 #
@@ -40,6 +71,24 @@ _TESTABLE_BUGS = frozenset((
 #
 _BUG_STATUS_CACHE = {}
 
+# How long a stale entry on disk is used for, in seconds, while the bug is
+# looked up again in the background.
+_BUG_STALE_FOR = 86400
+
+# The IDs of the bugs being looked up again in the background, and a lock
+# guarding them and the cache on disk.
+_REFRESHING = set()
+_LOCK = threading.Lock()
+
+# Set once the bugs referenced by the loaded test modules have been looked up.
+# Used by `_get_bug`.
+_PREFETCHED = threading.Event()
+_PREFETCH_LOCK = threading.Lock()
+
+# The number of bugs looked up per request by `prefetch_bugs`. The bug tracker
+# returns at most 100 issues per page.
+_PREFETCH_BATCH_SIZE = 100
+
 
 # Information about a Pulp bug. (See: https://pulp.plan.io)
 #
@@ -121,17 +170,249 @@ def _get_bug(bug_id):
     except KeyError:
         pass
 
+    # Next, let's try the cache on disk. A stale bug is refreshed in the
+    # background, and returned in the meantime.
+    offline = _is_offline()
+    entry = _read_bug(bug_id)
+    if entry is not None:
+        bug, age = entry
+        if offline or age < _get_bug_ttl():
+            _BUG_STATUS_CACHE[bug_id] = bug
+            return bug
+        if age < _get_bug_ttl() + _BUG_STALE_FOR:
+            _BUG_STATUS_CACHE[bug_id] = bug
+            _refresh_bug(bug_id)
+            return bug
+    if offline:
+        raise requests.exceptions.ConnectionError(
+            'Bug {} is not cached, and PULP_SMASH_OFFLINE is set.'
+            .format(bug_id)
+        )
+
+    # The bug is not cached. Maybe other bugs aren't either. Let's look them
+    # all up at once, if that hasn't been done yet.
+    if not _PREFETCHED.is_set():
+        with _PREFETCH_LOCK:
+            if not _PREFETCHED.is_set():
+                try:
+                    prefetch_bugs()
+                finally:
+                    _PREFETCHED.set()
+        if bug_id in _BUG_STATUS_CACHE:
+            return _BUG_STATUS_CACHE[bug_id]
+
     # The bug is not cached. Let's fetch, cache and return it.
-    response = requests.get(
-        'https://pulp.plan.io/issues/{}.json'.format(bug_id)
-    )
+    _BUG_STATUS_CACHE[bug_id] = _fetch_bug(bug_id)
+    return _BUG_STATUS_CACHE[bug_id]
+
+
+def prefetch_bugs(bug_ids=None):
+    """Look up many bugs at once, and cache them.
+
+    Bugs that are freshly cached on disk are read from there. The others are
+    looked up with batched requests to the bug tracker's issue list, which are
+    sent concurrently. Nothing is looked up while offline or while a cassette
+    is in use. If a lookup fails, the bugs it was for are left to be looked up
+    one at a time, as they are needed.
+
+    This function is called the first time a bug isn't cached. It may also be
+    called earlier, for example by a test runner, with the IDs returned by
+    :func:`pulp_smash.index.get_bug_ids`.
+
+    :param bug_ids: An iterable of integer bug IDs. Defaults to the bugs
+        referenced by every module in :mod:`pulp_smash.tests` loaded so far.
+    :returns: Nothing.
+    """
+    if bug_ids is None:
+        paths = []
+        for module in tuple(sys.modules.values()):
+            name = getattr(module, '__name__', '')
+            path = getattr(module, '__file__', None)
+            if name.startswith('pulp_smash.tests.') and path:
+                paths.append(path)
+        bug_ids = index.get_bug_ids(paths)
+    missing = []
+    for bug_id in sorted(set(bug_ids) - set(_BUG_STATUS_CACHE)):
+        entry = _read_bug(bug_id)
+        if entry is not None and (
+                _is_offline() or entry[1] < _get_bug_ttl()):
+            _BUG_STATUS_CACHE[bug_id] = entry[0]
+        else:
+            missing.append(bug_id)
+    if not missing or _is_offline() or cassette.get_cassette() is not None:
+        return
+    batches = [
+        missing[i:i + _PREFETCH_BATCH_SIZE]
+        for i in range(0, len(missing), _PREFETCH_BATCH_SIZE)
+    ]
+    with concurrent.futures.ThreadPoolExecutor(len(batches)) as pool:
+        for future in [pool.submit(_fetch_bugs, batch) for batch in batches]:
+            try:
+                bugs = future.result()
+            except (requests.exceptions.RequestException, ValueError):
+                continue
+            _BUG_STATUS_CACHE.update(bugs)
+            _write_bugs(bugs)
+
+
+def _fetch_bugs(bug_ids):
+    """Fetch bugs ``bug_ids`` from https://pulp.plan.io with one request.
+
+    :returns: A dict mapping the ID of each bug found to a ``_Bug``. Bugs
+        without a Target Platform Release field are left out.
+    """
+    url = 'https://pulp.plan.io/issues.json'
+    response = sessions.get_session(url).get(url, params={
+        'issue_id': ','.join(str(bug_id) for bug_id in bug_ids),
+        'limit': len(bug_ids),
+        'status_id': '*',
+    })
+    response.raise_for_status()
+    bugs = {}
+    for issue in response.json()['issues']:
+        try:
+            tpr = _convert_tpr(_get_tpr({'issue': issue}))
+        except exceptions.BugTPRMissingError:
+            continue
+        bugs[issue['id']] = _Bug(issue['status']['name'], tpr)
+    return bugs
+
+
+def _fetch_bug(bug_id):
+    """Fetch bug ``bug_id`` from https://pulp.plan.io, and cache it on disk.
+
+    The request is sent through a pooled session. See
+    :func:`pulp_smash.sessions.get_session`.
+    """
+    url = 'https://pulp.plan.io/issues/{}.json'.format(bug_id)
+    response = sessions.get_session(url).get(url)
     response.raise_for_status()
     bug_json = response.json()
-    _BUG_STATUS_CACHE[bug_id] = _Bug(
+    bug = _Bug(
         bug_json['issue']['status']['name'],
         _convert_tpr(_get_tpr(bug_json)),
     )
-    return _BUG_STATUS_CACHE[bug_id]
+    _write_bug(bug_id, bug)
+    return bug
+
+
+def _refresh_bug(bug_id):
+    """Fetch bug ``bug_id`` again in a background thread.
+
+    If the bug is already being fetched, do nothing. If fetching it fails, the
+    cached bug is kept.
+    """
+    with _LOCK:
+        if bug_id in _REFRESHING:
+            return
+        _REFRESHING.add(bug_id)
+
+    def refresh():
+        """Fetch the bug, and replace the cached bug."""
+        try:
+            _BUG_STATUS_CACHE[bug_id] = _fetch_bug(bug_id)
+        except (requests.exceptions.RequestException, ValueError,
+                exceptions.BugTPRMissingError):
+            pass
+        finally:
+            with _LOCK:
+                _REFRESHING.discard(bug_id)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def _is_offline():
+    """Tell whether the bug tracker must not be contacted."""
+    return os.environ.get('PULP_SMASH_OFFLINE', '') not in ('', '0')
+
+
+def _get_bug_ttl():
+    """Return how long bugs on disk are fresh for, in seconds."""
+    return float(os.environ.get('PULP_SMASH_BUG_TTL', 3600))
+
+
+def _get_bugs_path():
+    """Return the path to the file in which bugs are cached."""
+    return os.path.join(
+        BaseDirectory.xdg_cache_home, 'pulp_smash', 'bugs.json')
+
+
+def _use_disk():
+    """Tell whether bugs may be read from and written to disk."""
+    if cassette.get_cassette() is not None:
+        return False
+    return _is_offline() or _get_bug_ttl() > 0
+
+
+def _read_bug(bug_id):
+    """Return a ``(bug, age)`` tuple for a bug cached on disk, or ``None``.
+
+    ``age`` is the number of seconds since the bug was fetched.
+    """
+    if not _use_disk():
+        return None
+    entry = _load_bugs().get(str(bug_id))
+    if entry is None:
+        return None
+    try:
+        bug = _Bug(entry['status'], Version(entry['target_platform_release']))
+        return bug, time() - entry['fetched']
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _write_bug(bug_id, bug):
+    """Cache a bug on disk, and drop entries too old to be used."""
+    _write_bugs({bug_id: bug})
+
+
+def _write_bugs(bugs):
+    """Cache bugs on disk, and drop entries too old to be used.
+
+    :param bugs: A dict mapping bug IDs to ``_Bug`` objects.
+    """
+    if not _use_disk():
+        return
+    with _LOCK:
+        now = time()
+        max_age = _get_bug_ttl() + _BUG_STALE_FOR
+        entries = {
+            key: entry for key, entry in _load_bugs().items()
+            if now - entry.get('fetched', 0) < max_age
+        }
+        for bug_id, bug in bugs.items():
+            entries[str(bug_id)] = {
+                'fetched': now,
+                'status': bug.status,
+                'target_platform_release': str(bug.target_platform_release),
+            }
+        _save_bugs(entries)
+
+
+def _load_bugs():
+    """Return every entry cached on disk, keyed by bug ID strings."""
+    try:
+        with open(_get_bugs_path()) as handle:
+            entries = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+def _save_bugs(entries):
+    """Replace the entries cached on disk.
+
+    The file is replaced atomically, so that test processes running in
+    parallel never read a partial file. If two processes save at once, the
+    entries added by one of them are lost, and are fetched again later.
+    """
+    path = _get_bugs_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '{}.{}.{}.tmp'.format(
+        path, os.getpid(), threading.get_ident())
+    with open(temp_path, 'w') as handle:
+        json.dump(entries, handle, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
 
 
 def bug_is_testable(bug_id, pulp_version):
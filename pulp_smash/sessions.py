@@ -0,0 +1,91 @@
+# coding=utf-8
+"""Pool the HTTP connections made to each host.
+
+See :func:`pulp_smash.sessions.get_session`, which
+:class:`pulp_smash.api.Client`, :func:`pulp_smash.polling.poll_tasks` and
+:func:`pulp_smash.utils.http_get` draw their sessions from.
+"""
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+
+from pulp_smash import cassette
+
+# The number of connections kept alive per host, unless a host's ``api`` role
+# declares a ``pool_size``. This matches the default used by Requests.
+_DEFAULT_POOL_SIZE = 10
+
+# A mapping between (scheme, netloc) pairs and ``requests.Session`` objects.
+# Used by `get_session`. It is intentionally a global, so that every client
+# talking to a given host shares one pool of keep-alive connections.
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# A mapping between (scheme, netloc) pairs and the pool size explicitly asked
+# for, if any. Used by `get_session`.
+_POOL_SIZES = {}
+
+
+def get_session(url, pool_size=None):
+    """Return a pooled ``requests.Session`` for the host named in ``url``.
+
+    Sessions are cached per scheme and network location. Reusing a session
+    lets Requests keep TCP connections alive and resume TLS sessions, instead
+    of performing a fresh handshake for each HTTP request. A session may also
+    be used to talk to other hosts, such as those serving fixture files, and
+    it keeps a separate pool of connections for each of them.
+
+    The returned session has no default auth, headers or verification
+    settings, and it refuses to store cookies. As a result, each request
+    behaves exactly as if it had been made with the module-level Requests
+    functions, and all options must be passed per-request.
+
+    The order in which callers reach a host doesn't matter. If a session was
+    created without a ``pool_size`` (for example by
+    :func:`pulp_smash.utils.http_get`) and a later caller asks for one (for
+    example a :class:`pulp_smash.api.Client` whose host declares a
+    ``pool_size``), the session's pools are resized. If several pool sizes
+    are asked for, the largest wins.
+
+    :param url: A URL, such as ``https://pulp.example.com/pulp/api/v2/``.
+        Only the scheme and network location are used.
+    :param pool_size: The maximum number of connections to keep alive to each
+        host. Defaults to ``10``.
+    :returns: A ``requests.Session`` object.
+    """
+    parts = urlsplit(url)
+    key = (parts.scheme.lower(), parts.netloc.lower())
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(
+                DefaultCookiePolicy(allowed_domains=())
+            )
+            _mount_adapters(session, _DEFAULT_POOL_SIZE)
+            _SESSIONS[key] = session
+        if pool_size is not None and pool_size > _POOL_SIZES.get(key, 0):
+            _mount_adapters(session, pool_size)
+            _POOL_SIZES[key] = pool_size
+        return session
+
+
+def _mount_adapters(session, pool_size):
+    """Make ``session`` keep up to ``pool_size`` connections to each host.
+
+    The adapters consult the cassette in use, if any. See
+    :mod:`pulp_smash.cassette`.
+    """
+    adapter = cassette.CassetteAdapter(pool_maxsize=pool_size)
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, adapter)
+
+
+def get_system_session(server_config, pulp_system):
+    """Return the pooled session for the given host's API."""
+    return get_session(
+        server_config.get_base_url(pulp_system),
+        pulp_system.roles['api'].get('pool_size'),
+    )
@@ -0,0 +1,89 @@
+# coding=utf-8
+"""Share one SSH connection per host among the commands run on it.
+
+See :func:`pulp_smash.ssh.get_ssh_machine`, which
+:class:`pulp_smash.cli.Client` uses to reach remote hosts.
+"""
+import atexit
+import collections
+import contextlib
+import os
+import tempfile
+import threading
+
+import plumbum
+
+from pulp_smash import facts
+
+# Options passed to ssh by each SshMachine. Plumbum spawns an ssh process per
+# command, so make those processes share one TCP connection and SSH session
+# per host, and keep it open for a while after the last command.
+_SSH_OPTS = (
+    '-o', 'ControlMaster=auto',
+    '-o', 'ControlPath={}'.format(
+        os.path.join(tempfile.gettempdir(), 'pulp-smash-ssh-%r@%h:%p')
+    ),
+    '-o', 'ControlPersist=10m',
+)
+
+# A dict mapping hostnames to plumbum SshMachine objects. Used by
+# `get_ssh_machine`. It is intentionally a global, so that every client
+# talking to a given host shares one machine.
+_SSH_MACHINES = {}
+
+# A dict mapping hostnames to locks, so that a host is connected to only once,
+# while other hosts can be connected to at the same time.
+_SSH_LOCKS = collections.defaultdict(threading.Lock)
+_SSH_LOCKS_LOCK = threading.Lock()
+
+
+def get_ssh_machine(hostname):
+    """Return a pooled ``plumbum.machines.SshMachine`` for ``hostname``.
+
+    Machines are cached per hostname, so that clients share one persistent
+    shell per host instead of each connecting anew. Each command is still run
+    by a new ssh process, but these processes multiplex their sessions over a
+    single connection per host, with OpenSSH's ``ControlMaster`` option. As a
+    result, the cost of a TCP and SSH handshake is paid about once per host.
+
+    Before a cached machine is returned, its health is checked. If its shell
+    has exited, for example because the host rebooted, it is closed and a new
+    machine is returned. The facts about the host are forgotten too. See
+    :mod:`pulp_smash.facts`.
+
+    :param hostname: The host to connect to. As with ``ssh $hostname``,
+        ``~/.ssh/config`` may set a user, port and key for it.
+    :returns: A ``plumbum.machines.SshMachine``.
+    """
+    with _SSH_LOCKS_LOCK:
+        lock = _SSH_LOCKS[hostname]
+    with lock:
+        machine = _SSH_MACHINES.get(hostname)
+        if machine is not None and not _is_alive(machine):
+            with contextlib.suppress(Exception):
+                machine.close()
+            machine = None
+            facts.forget(hostname)
+        if machine is None:
+            # The SshMachine is a wrapper around the system's "ssh" binary.
+            # Thus, it uses ~/.ssh/config, ~/.ssh/known_hosts, etc.
+            machine = plumbum.machines.SshMachine(hostname, ssh_opts=_SSH_OPTS)
+            _SSH_MACHINES[hostname] = machine
+        return machine
+
+
+def _is_alive(machine):
+    """Tell whether the persistent shell of an SshMachine is still running."""
+    session = machine._session  # pylint:disable=protected-access
+    return getattr(session, 'alive', lambda: False)()
+
+
+@atexit.register
+def close_ssh_machines():
+    """Close every machine returned by :func:`get_ssh_machine`."""
+    with _SSH_LOCKS_LOCK:
+        machines = tuple(_SSH_MACHINES.values())
+        _SSH_MACHINES.clear()
+    for machine in machines:
+        with contextlib.suppress(Exception):
+            machine.close()
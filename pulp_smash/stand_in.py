@@ -0,0 +1,548 @@
+# coding=utf-8
+"""A local stand-in for a Pulp server, for measuring Pulp Smash itself.
+
+A :class:`StandIn` is an HTTP server that answers the subset of Pulp 2's v2
+and Pulp 3's v3 REST APIs that Pulp Smash uses: repositories, tasks with HTTP
+202 call reports, uploads, unit searches and status. Nothing is persisted and
+nothing is done: repositories are dicts, and tasks merely take some time to
+finish. It lets the overhead of Pulp Smash's response handlers, task polling
+and uploads be measured and regression-tested without a Pulp server:
+
+>>> from pulp_smash import api, stand_in
+>>> with stand_in.StandIn(task_seconds=0.5) as server:
+...     client = api.Client(server.get_config(), api.json_handler)
+...     repo = client.post('/pulp/api/v2/repositories/', {'id': 'foo'})
+...     client.post(repo['_href'] + 'actions/sync/', {})  # Takes 0.5 seconds.
+
+See ``scripts/benchmark.py`` for a benchmark suite built on this class.
+"""
+import email.parser
+import hashlib
+import http.server
+import json
+import re
+import socketserver
+import threading
+import uuid
+from datetime import datetime
+from time import monotonic
+from urllib.parse import parse_qs, urlsplit
+
+from packaging.version import Version
+
+from pulp_smash import config
+
+_V2 = '/pulp/api/v2/'
+_V3 = '/pulp/api/v3/'
+
+# The number of results in each page of a Pulp 3 list.
+_PAGE_SIZE = 100
+
+# The workers listed by the status API, on the host named by
+# :meth:`StandIn.get_config`. Pulp 3 has no scheduler.
+_WORKER_NAMES = (
+    'scheduler',
+    'resource_manager',
+    'reserved_resource_worker-0',
+)
+
+
+class StandIn(object):
+    """A local HTTP server that behaves like a fast, empty Pulp server.
+
+    Use it as a context manager, or call :meth:`start` and :meth:`stop`.
+
+    :param task_seconds: How long each task takes to finish, in seconds.
+    :param units: The number of content units in each Pulp 2 repository.
+    :param unit_padding: The number of filler bytes in each content unit, to
+        make search responses larger.
+    :param pulp_version: The Pulp version reported by :meth:`get_config`. It
+        decides which API Pulp Smash talks to. Both are always served.
+    :param port: The port to listen on. Defaults to an arbitrary free port.
+    """
+
+    def __init__(
+            self,
+            task_seconds=0,
+            units=10,
+            unit_padding=0,
+            pulp_version='2.16',
+            port=0):
+        """Initialize this object with needed instance attributes."""
+        self.pulp_version = pulp_version
+        self._server = _Server(('localhost', port), _Handler)
+        self._server.pulp = _FakePulp(
+            task_seconds, units, unit_padding, pulp_version)
+        self._thread = None
+
+    @property
+    def port(self):
+        """Return the port this server listens on."""
+        return self._server.server_address[1]
+
+    def start(self):
+        """Start serving requests in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests, and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        """Start serving requests."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving requests."""
+        self.stop()
+
+    def get_config(self):
+        """Return a config that points Pulp Smash at this server."""
+        return config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            pulp_version=Version(self.pulp_version),
+            systems=[
+                config.PulpSystem(
+                    hostname='localhost',
+                    roles={
+                        'api': {
+                            'port': self.port,
+                            'scheme': 'http',
+                            'verify': False,
+                        },
+                        'shell': {'transport': 'local'},
+                    },
+                )
+            ],
+        )
+
+
+class _FakePulp(object):  # pylint:disable=too-few-public-methods
+    """The state of a :class:`StandIn`, and the methods answering requests.
+
+    Each route in ``_ROUTES`` names one of this class's private methods. Each
+    accepts the request handler and the route's match object, even if it
+    needs neither, and returns a status code and a JSON-serializable body.
+    See :class:`StandIn` for the meaning of the arguments.
+    """
+
+    # pylint:disable=unused-argument
+
+    def __init__(self, task_seconds, units, unit_padding, pulp_version):
+        """Initialize this object with needed instance attributes."""
+        self.task_seconds = task_seconds
+        self.units = units
+        self.unit_padding = unit_padding
+        self.pulp_version = pulp_version
+        self._lock = threading.Lock()
+        # Artifacts, repositories, tasks and uploads, each keyed by ID.
+        self._resources = {
+            kind: {} for kind in ('artifacts', 'repositories', 'tasks',
+                                  'uploads')
+        }
+
+    def _add_task(self, pulp3=False):
+        """Add a task, and return its href."""
+        task_id = str(uuid.uuid4())
+        href = '{}tasks/{}/'.format(_V3 if pulp3 else _V2, task_id)
+        with self._lock:
+            self._resources['tasks'][task_id] = (monotonic(), href, pulp3)
+        return href
+
+    def _call_report(self):
+        """Return a Pulp 2 call report, and the task it spawned."""
+        href = self._add_task()
+        task_id = href.rstrip('/').rsplit('/', 1)[-1]
+        return 202, {
+            'error': None,
+            'result': None,
+            'spawned_tasks': [{'_href': href, 'task_id': task_id}],
+        }
+
+    def _get_task(self, task_id):
+        """Return the current state of a task, or ``None``."""
+        with self._lock:
+            task = self._resources['tasks'].get(task_id)
+        if task is None:
+            return None
+        created, href, pulp3 = task
+        done = monotonic() - created >= self.task_seconds
+        if pulp3:
+            state = 'completed' if done else 'running'
+        else:
+            state = 'finished' if done else 'running'
+        return {
+            '_href': href,
+            'task_id': task_id,
+            'state': state,
+            'error': None,
+            'exception': None,
+            'traceback': None,
+            'result': None,
+            'spawned_tasks': [],
+        }
+
+    def _get_units(self, repo_id):
+        """Return the content units in a Pulp 2 repository."""
+        padding = 'x' * self.unit_padding
+        return [{
+            'metadata': {
+                '_id': '{:024x}'.format(index),
+                'name': 'unit-{}'.format(index),
+                'version': '1.{}'.format(index),
+                'checksum': hashlib.sha256(
+                    '{}-{}'.format(repo_id, index).encode()).hexdigest(),
+                'padding': padding,
+            },
+            'repo_id': repo_id,
+            'unit_type_id': 'rpm',
+        } for index in range(self.units)]
+
+    # Pulp 2
+
+    def _status(self, request, match):
+        """Answer ``GET /pulp/api/v2/status/``."""
+        return 200, {
+            'api_version': '2',
+            'database_connection': {'connected': True},
+            'known_workers': [
+                {'_id': name + '@localhost', '_ns': 'workers',
+                 'last_heartbeat': _now()}
+                for name in _WORKER_NAMES
+            ],
+            'messaging_connection': {'connected': True},
+            'versions': {'platform_version': self.pulp_version},
+        }
+
+    def _list_repositories(self, request, match):
+        """Answer ``GET /pulp/api/v2/repositories/``."""
+        with self._lock:
+            return 200, [
+                repo for repo in self._resources['repositories'].values()
+                if repo['_href'].startswith(_V2)
+            ]
+
+    def _create_repository(self, request, match):
+        """Answer ``POST /pulp/api/v2/repositories/``."""
+        body = request.get_json()
+        repo = dict(body, _href='{}repositories/{}/'.format(_V2, body['id']))
+        with self._lock:
+            if body['id'] in self._resources['repositories']:
+                return 409, {'error_message': 'Duplicate resource'}
+            self._resources['repositories'][body['id']] = repo
+        return 201, repo
+
+    def _read_repository(self, request, match):
+        """Answer ``GET /pulp/api/v2/repositories/<id>/``."""
+        with self._lock:
+            repo = self._resources['repositories'].get(match.group('id'))
+        if repo is None:
+            return 404, {'error_message': 'Missing resource'}
+        return 200, repo
+
+    def _delete_repository(self, request, match):
+        """Answer ``DELETE /pulp/api/v2/repositories/<id>/``."""
+        with self._lock:
+            repo = self._resources['repositories'].pop(match.group('id'), None)
+        if repo is None:
+            return 404, {'error_message': 'Missing resource'}
+        return self._call_report()
+
+    def _repository_action(self, request, match):
+        """Answer ``POST /pulp/api/v2/repositories/<id>/actions/<action>/``."""
+        return self._call_report()
+
+    def _search_units(self, request, match):
+        """Answer ``POST /pulp/api/v2/repositories/<id>/search/units/``."""
+        criteria = (request.get_json() or {}).get('criteria', {})
+        units = [
+            unit for unit in self._get_units(match.group('id'))
+            if all(
+                unit['metadata'].get(key) == value
+                for key, value in criteria.get('filters', {})
+                .get('unit', {}).items()
+            )
+        ]
+        skip = criteria.get('skip', 0)
+        limit = criteria.get('limit')
+        units = units[skip:None if limit is None else skip + limit]
+        fields = criteria.get('fields', {}).get('unit')
+        if fields:
+            for unit in units:
+                unit['metadata'] = {
+                    key: value for key, value in unit['metadata'].items()
+                    if key in fields or key == '_id'
+                }
+        return 200, units
+
+    def _search_content_units(self, request, match):
+        """Answer ``POST /pulp/api/v2/content/units/<type>/search/``.
+
+        Every repository's units are searched. Units are never orphaned.
+        """
+        body = request.get_json() or {}
+        filters = body.get('criteria', {}).get('filters', {})
+        with self._lock:
+            repo_ids = [
+                repo_id for repo_id, repo in
+                self._resources['repositories'].items()
+                if repo['_href'].startswith(_V2)
+            ]
+        units = []
+        for repo_id in repo_ids:
+            for unit in self._get_units(repo_id):
+                if unit['unit_type_id'] != match.group('type') or any(
+                        unit['metadata'].get(key) != value
+                        for key, value in filters.items()):
+                    continue
+                if body.get('include_repos'):
+                    unit['metadata']['repository_memberships'] = [repo_id]
+                units.append(unit['metadata'])
+        return 200, units
+
+    def _create_upload(self, request, match):
+        """Answer ``POST /pulp/api/v2/content/uploads/``."""
+        upload_id = str(uuid.uuid4())
+        with self._lock:
+            self._resources['uploads'][upload_id] = 0
+        return 201, {
+            '_href': '{}content/uploads/{}/'.format(_V2, upload_id),
+            'upload_id': upload_id,
+        }
+
+    def _upload_chunk(self, request, match):
+        """Answer ``PUT /pulp/api/v2/content/uploads/<id>/<offset>/``."""
+        with self._lock:
+            if match.group('id') not in self._resources['uploads']:
+                return 404, {'error_message': 'Missing resource'}
+            self._resources['uploads'][match.group('id')] += len(request.body)
+        return 200, None
+
+    def _delete_upload(self, request, match):
+        """Answer ``DELETE /pulp/api/v2/content/uploads/<id>/``."""
+        with self._lock:
+            self._resources['uploads'].pop(match.group('id'), None)
+        return 200, None
+
+    def _read_task(self, request, match):
+        """Answer ``GET /pulp/api/v2/tasks/<id>/`` and its Pulp 3 twin."""
+        task = self._get_task(match.group('id'))
+        if task is None:
+            return 404, {'error_message': 'Missing resource'}
+        return 200, task
+
+    def _search_tasks(self, request, match):
+        """Answer ``POST /pulp/api/v2/tasks/search/``."""
+        criteria = (request.get_json() or {}).get('criteria', {})
+        task_ids = criteria.get('filters', {}).get('task_id', {}).get('$in')
+        if task_ids is None:
+            with self._lock:
+                task_ids = list(self._resources['tasks'])
+        tasks = (self._get_task(task_id) for task_id in task_ids)
+        return 200, [task for task in tasks if task is not None]
+
+    # Pulp 3
+
+    def _page(self, request, results):
+        """Return one page of ``results``, as Pulp 3 does."""
+        page = int(request.query.get('page', ['1'])[0])
+        start = (page - 1) * _PAGE_SIZE
+        next_ = None
+        if start + _PAGE_SIZE < len(results):
+            query = dict(request.query, page=[str(page + 1)])
+            next_ = 'http://{}{}?{}'.format(
+                request.headers['Host'],
+                urlsplit(request.path).path,
+                '&'.join(
+                    '{}={}'.format(key, value[0])
+                    for key, value in sorted(query.items())
+                ),
+            )
+        return 200, {
+            'count': len(results),
+            'next': next_,
+            'previous': None,
+            'results': results[start:start + _PAGE_SIZE],
+        }
+
+    def _status_v3(self, request, match):
+        """Answer ``GET /pulp/api/v3/status/``."""
+        return 200, {
+            'database_connection': {'connected': True},
+            'messaging_connection': {'connected': True},
+            'online_workers': [
+                {'name': name + '@localhost', 'last_heartbeat': _now()}
+                for name in _WORKER_NAMES[1:]
+            ],
+            'versions': [{'component': 'pulpcore',
+                          'version': self.pulp_version}],
+        }
+
+    def _list_repositories_v3(self, request, match):
+        """Answer ``GET /pulp/api/v3/repositories/``."""
+        with self._lock:
+            results = [
+                repo for repo in self._resources['repositories'].values()
+                if repo['_href'].startswith(_V3)
+            ]
+        return self._page(request, results)
+
+    def _create_repository_v3(self, request, match):
+        """Answer ``POST /pulp/api/v3/repositories/``."""
+        repo_id = str(uuid.uuid4())
+        repo = dict(
+            request.get_json(),
+            _href='{}repositories/{}/'.format(_V3, repo_id),
+            _versions_href='{}repositories/{}/versions/'.format(_V3, repo_id),
+        )
+        with self._lock:
+            self._resources['repositories'][repo_id] = repo
+        return 201, repo
+
+    def _delete_repository_v3(self, request, match):
+        """Answer ``DELETE /pulp/api/v3/repositories/<id>/``."""
+        with self._lock:
+            repo = self._resources['repositories'].pop(match.group('id'), None)
+        if repo is None:
+            return 404, {'detail': 'Not found.'}
+        href = self._add_task(pulp3=True)
+        return 202, {'_href': href, 'task_id': href.split('/')[-2]}
+
+    def _list_tasks_v3(self, request, match):
+        """Answer ``GET /pulp/api/v3/tasks/``, honouring ``id__in``."""
+        with self._lock:
+            task_ids = [
+                task_id
+                for task_id, task in self._resources['tasks'].items()
+                if task[2]
+            ]
+        if 'id__in' in request.query:
+            wanted = set(request.query['id__in'][0].split(','))
+            task_ids = [task_id for task_id in task_ids if task_id in wanted]
+        results = [self._get_task(task_id) for task_id in task_ids]
+        return self._page(request, results)
+
+    def _create_artifact(self, request, match):
+        """Answer ``POST /pulp/api/v3/artifacts/``, with a multipart body."""
+        message = email.parser.BytesParser().parsebytes(
+            'Content-Type: {}\r\n\r\n'.format(
+                request.headers['Content-Type']).encode('latin-1')
+            + request.body
+        )
+        content = b''.join(
+            part.get_payload(decode=True) for part in message.get_payload()
+            if part.get_param('name', header='Content-Disposition') == 'file'
+        )
+        sha256 = hashlib.sha256(content).hexdigest()
+        artifact = {
+            '_href': '{}artifacts/{}/'.format(_V3, uuid.uuid4()),
+            'sha256': sha256,
+            'size': len(content),
+        }
+        with self._lock:
+            artifact = self._resources['artifacts'].setdefault(
+                sha256, artifact)
+        return 201, artifact
+
+    def _list_artifacts(self, request, match):
+        """Answer ``GET /pulp/api/v3/artifacts/``, honouring ``sha256``."""
+        with self._lock:
+            results = list(self._resources['artifacts'].values())
+        if 'sha256' in request.query:
+            sha256 = request.query['sha256'][0]
+            results = [
+                artifact for artifact in results
+                if artifact['sha256'] == sha256
+            ]
+        return self._page(request, results)
+
+
+# Pairs of HTTP methods and path patterns, and the _FakePulp methods that
+# answer them. The first match wins.
+_ROUTES = tuple(
+    (method, re.compile('^{}$'.format(pattern)), name)
+    for method, pattern, name in (
+        ('GET', _V2 + 'status/', '_status'),
+        ('GET', _V2 + 'repositories/', '_list_repositories'),
+        ('POST', _V2 + 'repositories/', '_create_repository'),
+        ('GET', _V2 + 'repositories/(?P<id>[^/]+)/', '_read_repository'),
+        ('DELETE', _V2 + 'repositories/(?P<id>[^/]+)/', '_delete_repository'),
+        ('POST', _V2 + 'repositories/(?P<id>[^/]+)/actions/[^/]+/',
+         '_repository_action'),
+        ('POST', _V2 + 'repositories/(?P<id>[^/]+)/search/units/',
+         '_search_units'),
+        ('POST', _V2 + 'content/units/(?P<type>[^/]+)/search/',
+         '_search_content_units'),
+        ('POST', _V2 + 'content/uploads/', '_create_upload'),
+        ('PUT', _V2 + 'content/uploads/(?P<id>[^/]+)/[0-9]+/',
+         '_upload_chunk'),
+        ('DELETE', _V2 + 'content/uploads/(?P<id>[^/]+)/', '_delete_upload'),
+        ('POST', _V2 + 'tasks/search/', '_search_tasks'),
+        ('GET', _V2 + 'tasks/(?P<id>[^/]+)/', '_read_task'),
+        ('GET', _V3 + 'status/', '_status_v3'),
+        ('GET', _V3 + 'repositories/', '_list_repositories_v3'),
+        ('POST', _V3 + 'repositories/', '_create_repository_v3'),
+        ('GET', _V3 + 'repositories/(?P<id>[^/]+)/', '_read_repository'),
+        ('DELETE', _V3 + 'repositories/(?P<id>[^/]+)/',
+         '_delete_repository_v3'),
+        ('GET', _V3 + 'tasks/', '_list_tasks_v3'),
+        ('GET', _V3 + 'tasks/(?P<id>[^/]+)/', '_read_task'),
+        ('GET', _V3 + 'artifacts/', '_list_artifacts'),
+        ('POST', _V3 + 'artifacts/', '_create_artifact'),
+    )
+)
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """An HTTP server that answers each connection in a thread of its own."""
+
+    daemon_threads = True
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Route each request to a method of the server's ``_FakePulp``."""
+
+    # Keep connections alive, as Pulp's web server does. Send the headers and
+    # body of a response without waiting for acknowledgements in between.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    query = None
+    body = b''
+
+    def _answer(self):
+        """Read the request, route it, and write the response."""
+        parts = urlsplit(self.path)
+        self.query = parse_qs(parts.query)
+        self.body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status, body = 404, {'error_message': 'Unknown path'}
+        for method, pattern, name in _ROUTES:
+            match = pattern.match(parts.path)
+            if match and method == self.command:
+                status, body = getattr(self.server.pulp, name)(self, match)
+                break
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    # pylint:disable=invalid-name
+    do_DELETE = do_GET = do_POST = do_PUT = _answer
+
+    def get_json(self):
+        """Return the decoded request body, or ``None``."""
+        return json.loads(self.body.decode('utf-8')) if self.body else None
+
+    def log_message(self, *args):  # pylint:disable=arguments-differ
+        """Don't log requests."""
+
+
+def _now():
+    """Return the current time, formatted like a worker's last heartbeat."""
+    return datetime.utcnow().isoformat()
@@ -24,12 +24,12 @@ There are two scenarios to test here:
 Both scenarios are executed by
 :class:`pulp_smash.tests.pulp2.rpm.api_v2.test_broker.BrokerTestCase`.
 """
-import time
+import functools
 import unittest
 
 from packaging.version import Version
 
-from pulp_smash import api, cli, config, selectors, utils
+from pulp_smash import api, cli, config, readiness, selectors, utils
 from pulp_smash.constants import (
     RPM,
     RPM_SIGNED_FEED_URL,
@@ -48,6 +48,12 @@ from pulp_smash.tests.pulp2.rpm.utils import (
 )
 from pulp_smash.tests.pulp2.rpm.utils import set_up_module as setUpModule  # pylint:disable=unused-import
 
+# Logged by Pulp's Celery workers each time they fail to reach the broker.
+_BROKER_RETRY_MESSAGE = 'Cannot connect to'
+
+# How long Pulp's workers have to try reaching a dead broker, in seconds.
+_BROKER_RETRY_TIMEOUT = 120
+
 
 class BrokerTestCase(unittest.TestCase):
     """Test Pulp's support for broker connections and reconnections."""
@@ -73,7 +79,7 @@ class BrokerTestCase(unittest.TestCase):
         """
         services = PULP_SERVICES.union(self.broker)
         self.svc_mgr.stop(services)
-        self.svc_mgr.start(services)
+        self.svc_mgr.start(services, wait=True)
 
     def test_broker_connect(self):
         """Test Pulp's support for initially connecting to a broker.
@@ -81,15 +87,27 @@ class BrokerTestCase(unittest.TestCase):
         Do the following:
 
         1. Stop both the broker and several other services.
-        2. Start the several other resources, wait, and start the broker.
+        2. Start the several other resources, wait until each host's workers
+           log that they can't reach the broker, and start the broker.
         3. Test Pulp's health. Create an RPM repository, sync it, add a
            distributor, publish it, and download an RPM.
         """
         # Step 1 and 2.
         self.svc_mgr.stop(PULP_SERVICES.union(self.broker))
+        # Let services try to connect to the dead broker. Pulp's status API
+        # reports the broker as disconnected before any worker has tried to
+        # reach it, so the workers' logs are read instead.
+        systems = self.cfg.get_systems('pulp workers')
+        marks = [_mark_log(self.cfg, system) for system in systems]
         self.svc_mgr.start(PULP_SERVICES)
-        time.sleep(15)  # Let services try to connect to the dead broker.
-        self.svc_mgr.start(self.broker)
+        readiness.wait_for({
+            'Pulp workers on {} to retry connecting to the broker'
+            .format(system.hostname):
+                functools.partial(_broker_retried, self.cfg, system, mark)
+            for system, mark in zip(systems, marks)
+        }, _BROKER_RETRY_TIMEOUT)
+        self.svc_mgr.start(self.broker, wait=True)
+        cli.wait_until_ready(self.cfg, PULP_SERVICES)
         self.health_check()  # Step 3.
 
     def test_broker_reconnect(self):
@@ -98,7 +116,7 @@ class BrokerTestCase(unittest.TestCase):
         Do the following:
 
         1. Start both the broker and several other services.
-        2. Stop the broker, wait, and start it again.
+        2. Stop the broker, wait until Pulp notices, and start it again.
         3. Test Pulp's health. Create an RPM repository, sync it, add a
            distributor, publish it, and download an RPM.
 
@@ -114,9 +132,14 @@ class BrokerTestCase(unittest.TestCase):
             self.skipTest('https://pulp.plan.io/issues/2613')
         # We assume that the broker and other services are already running. As
         # a result, we skip step 1 and go straight to step 2.
+        heartbeats = readiness.get_heartbeats(self.cfg)
         self.svc_mgr.stop(self.broker)
-        time.sleep(30)
-        self.svc_mgr.start(self.broker)
+        readiness.wait_for({
+            'Pulp to notice the broker is gone':
+                lambda: not _messaging_is_connected(self.cfg),
+        })
+        self.svc_mgr.start(self.broker, wait=True)
+        cli.wait_until_ready(self.cfg, PULP_SERVICES, stale=heartbeats)
         self.health_check()  # Step 3.
 
     def health_check(self):
@@ -135,3 +158,44 @@ class BrokerTestCase(unittest.TestCase):
         # Does this RPM match the original RPM?
         rpm = utils.http_get(RPM_SIGNED_URL)
         self.assertEqual(rpm, pulp_rpm)
+
+
+def _messaging_is_connected(cfg):
+    """Tell whether Pulp's status API says the broker is connected."""
+    status = readiness.get_status(cfg) or {}
+    return status.get('messaging_connection', {}).get('connected', False)
+
+
+def _mark_log(cfg, pulp_system):
+    """Return where the system log of ``pulp_system`` currently ends.
+
+    Pass the result to :func:`_read_log`.
+    """
+    client = cli.Client(cfg, pulp_system=pulp_system)
+    if cli.get_facts(cfg, pulp_system)['service_manager'] == 'systemd':
+        return client.run(('date', '+%Y-%m-%d %H:%M:%S')).stdout.strip()
+    sudo = () if utils.is_root(cfg, pulp_system) else ('sudo',)
+    cmd = sudo + ('wc', '-l', '/var/log/messages')
+    return int(client.run(cmd).stdout.split()[0])
+
+
+def _read_log(cfg, pulp_system, mark):
+    """Return what has been written to the system log since ``mark``.
+
+    :param mark: A value returned by :func:`_mark_log`.
+    """
+    sudo = () if utils.is_root(cfg, pulp_system) else ('sudo',)
+    if cli.get_facts(cfg, pulp_system)['service_manager'] == 'systemd':
+        cmd = ('journalctl', '--output', 'cat', '--since', mark)
+    else:
+        cmd = ('tail', '--lines', '+{}'.format(mark + 1), '/var/log/messages')
+    return cli.Client(cfg, pulp_system=pulp_system).run(sudo + cmd).stdout
+
+
+def _broker_retried(cfg, pulp_system, mark):
+    """Tell whether workers on ``pulp_system`` retried reaching the broker.
+
+    Only what has been logged since ``mark`` is considered. See
+    :func:`_mark_log`.
+    """
+    return _BROKER_RETRY_MESSAGE in _read_log(cfg, pulp_system, mark)
@@ -5,7 +5,6 @@ Beware that the test cases for the "on demand" download policy will fail if
 Pulp's Squid server is not configured to return an appropriate hostname or IP
 when performing redirection.
 """
-import hashlib
 import unittest
 from urllib.parse import urljoin
 
@@ -104,7 +103,12 @@ class BackgroundTestCase(utils.BaseAPITestCase):
         cls.tasks = tuple(api.poll_spawned_tasks(cls.cfg, report))
 
         # Download an RPM.
-        cls.rpm = get_unit(cls.cfg, cls.repo['distributors'][0], RPM)
+        cls.rpm = get_unit(
+            cls.cfg,
+            cls.repo['distributors'][0],
+            RPM,
+            response_handler=api.stream_handler,
+        )
 
     def test_repo_local_units(self):
         """Assert that all content is downloaded for the repository."""
@@ -127,7 +131,7 @@ class BackgroundTestCase(utils.BaseAPITestCase):
 
     def test_rpm_checksum(self):
         """Assert the checksum of the downloaded RPM matches the metadata."""
-        actual = hashlib.sha256(self.rpm.content).hexdigest()
+        actual = self.rpm.digests['sha256']
         expect = utils.get_sha256_checksum(RPM_SIGNED_URL)
         self.assertEqual(actual, expect)
 
@@ -176,8 +180,18 @@ class OnDemandTestCase(utils.BaseAPITestCase):
         cls.repo = client.get(repo['_href'], params={'details': True}).json()
 
         # Download the same RPM twice.
-        cls.rpm = get_unit(cls.cfg, cls.repo['distributors'][0], RPM)
-        cls.same_rpm = get_unit(cls.cfg, cls.repo['distributors'][0], RPM)
+        cls.rpm = get_unit(
+            cls.cfg,
+            cls.repo['distributors'][0],
+            RPM,
+            response_handler=api.stream_handler,
+        )
+        cls.same_rpm = get_unit(
+            cls.cfg,
+            cls.repo['distributors'][0],
+            RPM,
+            response_handler=api.stream_handler,
+        )
 
     def test_local_units(self):
         """Assert no content units were downloaded besides metadata."""
@@ -201,7 +215,7 @@ class OnDemandTestCase(utils.BaseAPITestCase):
 
     def test_rpm_checksum(self):
         """Assert the checksum of the downloaded RPM matches the metadata."""
-        actual = hashlib.sha256(self.rpm.content).hexdigest()
+        actual = self.rpm.digests['sha256']
         expect = utils.get_sha256_checksum(RPM_SIGNED_URL)
         self.assertEqual(actual, expect)
 
@@ -225,7 +239,7 @@ class OnDemandTestCase(utils.BaseAPITestCase):
 
     def test_same_rpm_checksum(self):
         """Assert the checksum of the second RPM matches the metadata."""
-        actual = hashlib.sha256(self.same_rpm.content).hexdigest()
+        actual = self.same_rpm.digests['sha256']
         expect = utils.get_sha256_checksum(RPM_SIGNED_URL)
         self.assertEqual(actual, expect)
 
@@ -414,7 +428,12 @@ class SwitchPoliciesTestCase(utils.BaseAPITestCase):
     def _assert_background_immediate(self, repo):
         """Make assertions about background and immediate download policies."""
         # Download an RPM.
-        rpm = get_unit(self.cfg, repo['distributors'][0], RPM)
+        rpm = get_unit(
+            self.cfg,
+            repo['distributors'][0],
+            RPM,
+            response_handler=api.stream_handler,
+        )
 
         # Assert that all content is downloaded for the repository.
         self.assertEqual(
@@ -429,7 +448,7 @@ class SwitchPoliciesTestCase(utils.BaseAPITestCase):
         self.assertEqual(0, len(rpm.history), history_headers)
 
         # Assert the checksum of the downloaded RPM matches the metadata.
-        actual = hashlib.sha256(rpm.content).hexdigest()
+        actual = rpm.digests['sha256']
         expect = utils.get_sha256_checksum(RPM_SIGNED_URL)
         self.assertEqual(actual, expect)
 
@@ -478,14 +497,24 @@ class SwitchPoliciesTestCase(utils.BaseAPITestCase):
         self.assertEqual(repo['total_repository_units'], total_units)
 
         # Download the same RPM twice.
-        rpm = get_unit(self.cfg, repo['distributors'][0], RPM)
-        same_rpm = get_unit(self.cfg, repo['distributors'][0], RPM)
+        rpm = get_unit(
+            self.cfg,
+            repo['distributors'][0],
+            RPM,
+            response_handler=api.stream_handler,
+        )
+        same_rpm = get_unit(
+            self.cfg,
+            repo['distributors'][0],
+            RPM,
+            response_handler=api.stream_handler,
+        )
 
         # Assert the initial request received a 302 Redirect.
         self.assertTrue(rpm.history[0].is_redirect)
 
         # Assert the checksum of the downloaded RPM matches the metadata.
-        actual = hashlib.sha256(rpm.content).hexdigest()
+        actual = rpm.digests['sha256']
         expect = utils.get_sha256_checksum(RPM_SIGNED_URL)
         self.assertEqual(actual, expect)
 
@@ -493,7 +522,7 @@ class SwitchPoliciesTestCase(utils.BaseAPITestCase):
         self.assertIn('MISS', rpm.headers['X-Cache-Lookup'], rpm.headers)
 
         # Assert the checksum of the second RPM matches the metadata.
-        actual = hashlib.sha256(same_rpm.content).hexdigest()
+        actual = same_rpm.digests['sha256']
         expect = utils.get_sha256_checksum(RPM_SIGNED_URL)
         self.assertEqual(actual, expect)
 
@@ -82,5 +82,5 @@ class DuplicateUploadsTestCase(unittest.TestCase):
             call_report = utils.upload_import_unit(self.cfg, unit, {
                 'unit_type_id': type_id,
                 'unit_key': unit_key
-            }, repo)
+            }, repo, fresh=True)
             self.assertIsNone(call_report['result'])
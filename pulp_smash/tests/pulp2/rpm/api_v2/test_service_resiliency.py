@@ -56,7 +56,7 @@ class MissingWorkersTestCase(unittest.TestCase):
             "{} bash -c 'echo PULP_CONCURRENCY=1 >> {}'"
             .format(sudo, _PULP_WORKERS_CFG)
         )
-        cli.GlobalServiceManager(self.cfg).restart(PULP_SERVICES)
+        cli.GlobalServiceManager(self.cfg).restart(PULP_SERVICES, wait=True)
 
     def test_all(self):
         """Test that Pulp deals well with missing workers."""
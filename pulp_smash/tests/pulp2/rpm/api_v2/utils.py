@@ -163,7 +163,9 @@ class DisableSELinuxMixin(object):  # pylint:disable=too-few-public-methods
         .. _Pulp issue: https://pulp.plan.io/issues/
         """
         # Abort if the Pulp issue is resolved, if SELinux is not installed or
-        # if SELinux is not enforcing.
+        # if SELinux is not enforcing. SELinux's mode may be changed at any
+        # time with setenforce, so it is read now rather than from the facts
+        # cached by pulp_smash.cli.get_facts.
         #
         # NOTE: Hard-coding the absolute path to a command is a Bad Idea™.
         # However, non-login non-root shells may have short PATH environment
@@ -254,15 +256,18 @@ class TemporaryUserMixin(object):
         client.run((sudo + cmd.format(username)).split())
         yield username
 
-        cmd = 'runuser --shell /bin/sh {} --command'.format(username)
-        cmd = (sudo + cmd).split()
-        cmd.append('ssh-keygen -N "" -f /home/{}/.ssh/mykey'.format(username))
-        client.run(cmd)
-        cmd = 'cp /home/{0}/.ssh/mykey.pub /home/{0}/.ssh/authorized_keys'
-        client.run((sudo + cmd.format(username)).split())
-        cmd = 'cat /home/{0}/.ssh/mykey'
-        private_key = client.run((sudo + cmd.format(username)).split()).stdout
-        yield private_key
+        keygen = 'runuser --shell /bin/sh {} --command'.format(username)
+        keygen = (sudo + keygen).split()
+        keygen.append(
+            'ssh-keygen -N "" -f /home/{}/.ssh/mykey'.format(username))
+        copy = 'cp /home/{0}/.ssh/mykey.pub /home/{0}/.ssh/authorized_keys'
+        cat = 'cat /home/{0}/.ssh/mykey'
+        results = client.run_batch((
+            keygen,
+            (sudo + copy.format(username)).split(),
+            (sudo + cat.format(username)).split(),
+        ))
+        yield results[-1].stdout
 
     @staticmethod
     def delete_user(cfg, username):
@@ -323,8 +328,10 @@ class TemporaryUserMixin(object):
         client.machine.session().run(
             "echo '{}' > {}".format(private_key, ssh_identity_file)
         )
-        client.run(['chmod', '600', ssh_identity_file])
-        client.run((sudo + 'chown apache ' + ssh_identity_file).split())
+        client.run_batch((
+            ['chmod', '600', ssh_identity_file],
+            (sudo + 'chown apache ' + ssh_identity_file).split(),
+        ))
         # Pulp's SELinux policy requires files handled by Pulp to have the
         # httpd_sys_rw_content_t label
         enforcing = client.run(['getenforce']).stdout.strip()
@@ -336,7 +343,12 @@ class TemporaryUserMixin(object):
         return ssh_identity_file
 
 
-def get_unit(cfg, distributor, unit_name, primary_xml=None):
+def get_unit(
+        cfg,
+        distributor,
+        unit_name,
+        primary_xml=None,
+        response_handler=None):
     """Download a file from a published repository.
 
     A typical invocation is as follows:
@@ -358,7 +370,12 @@ def get_unit(cfg, distributor, unit_name, primary_xml=None):
         "bear-4.1-1.noarch.rpm".
     :param primary_xml: A ``primary.xml`` file as an ``ElementTree``. If not
         given, :func:`get_repodata` is consulted.
-    :returns: A raw response. The unit is available as ``response.content``.
+    :param response_handler: A response handler for the
+        :class:`pulp_smash.api.Client` that fetches the unit. Pass
+        :func:`pulp_smash.api.stream_handler` to digest the unit without
+        loading it into memory.
+    :returns: Whatever ``response_handler`` returns. By default, a raw
+        response, in which case the unit is available as ``response.content``.
     """
     if primary_xml is None:
         primary_xml = get_repodata(cfg, distributor, 'primary')
@@ -376,7 +393,7 @@ def get_unit(cfg, distributor, unit_name, primary_xml=None):
     if not path.endswith('/'):
         path += '/'
     path = urljoin(path, href)
-    return api.Client(cfg).get(path)
+    return api.Client(cfg, response_handler).get(path)
 
 
 def get_dists_by_type_id(cfg, repo):
@@ -432,7 +449,12 @@ def get_rpm_names_versions(cfg, repo):
         versions sorted in ascending order. For example: ``{'walrus': ['0.71',
         '5.21']}``.
     """
-    rpms = utils.search_units(cfg, repo, {'type_ids': ['rpm']})
+    rpms = utils.iter_search_units(
+        cfg,
+        repo,
+        {'type_ids': ['rpm']},
+        fields=('name', 'version'),
+    )
     names_versions = {}
     for rpm in rpms:
         rpm_name = rpm['metadata']['name']
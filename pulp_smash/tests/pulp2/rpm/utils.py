@@ -108,13 +108,8 @@ def os_is_rhel6(cfg):
         being targeted.
     :returns: True or false.
     """
-    response = cli.Client(cfg, cli.echo_handler).run((
-        'grep',
-        '-i',
-        'red hat enterprise linux server release 6',
-        '/etc/redhat-release',
-    ))
-    return response.returncode == 0
+    release = cli.get_facts(cfg)['redhat_release']
+    return 'red hat enterprise linux server release 6' in release.lower()
 
 
 def gen_yum_config_file(cfg, repositoryid, **kwargs):
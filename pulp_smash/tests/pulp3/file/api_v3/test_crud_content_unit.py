@@ -9,7 +9,6 @@ from requests.exceptions import HTTPError
 from pulp_smash import api, config, selectors, utils
 from pulp_smash.constants import FILE_FEED_URL, FILE_URL
 from pulp_smash.tests.pulp3.constants import (
-    ARTIFACTS_PATH,
     FILE_CONTENT_PATH,
     FILE_REMOTE_PATH,
     REPO_PATH,
@@ -22,6 +21,7 @@ from pulp_smash.tests.pulp3.utils import (
     get_auth,
     get_content,
     sync_repo,
+    upload_artifact,
 )
 
 
@@ -42,8 +42,7 @@ class ContentUnitTestCase(unittest.TestCase, utils.SmokeTest):
         cls.content_unit = {}
         cls.client = api.Client(cls.cfg, api.json_handler)
         cls.client.request_kwargs['auth'] = get_auth()
-        files = {'file': utils.http_get(FILE_URL)}
-        cls.artifact = cls.client.post(ARTIFACTS_PATH, files=files)
+        cls.artifact = upload_artifact(cls.cfg, utils.http_get(FILE_URL))
 
     @classmethod
     def tearDownClass(cls):
@@ -138,10 +137,10 @@ class DeleteContentUnitRepoVersionTestCase(unittest.TestCase, utils.SmokeTest):
         self.addCleanup(client.delete, repo['_href'])
         sync_repo(cfg, remote, repo)
         repo = client.get(repo['_href'])
-        content = get_content(repo)['results']
+        content = get_content(repo)
         with self.assertRaises(HTTPError):
             client.delete(choice(content)['_href'])
         self.assertEqual(
             len(content),
-            len(get_content(repo)['results'])
+            len(get_content(repo))
         )
@@ -30,6 +30,7 @@ from pulp_smash.tests.pulp3.utils import (
     get_content,
     get_removed_content,
     get_repo_versions,
+    iter_content,
     publish_repo,
     sync_repo,
 )
@@ -111,13 +112,13 @@ class AddRemoveContentTestCase(unittest.TestCase, utils.SmokeTest):
         self.assertIsNotNone(repo['_latest_version_href'])
 
         content = get_content(repo)
-        self.assertEqual(len(content['results']), FILE_FEED_COUNT)
+        self.assertEqual(len(content), FILE_FEED_COUNT)
 
         added_content = get_added_content(repo)
-        self.assertEqual(len(added_content['results']), 3, added_content)
+        self.assertEqual(len(added_content), 3, added_content)
 
         removed_content = get_removed_content(repo)
-        self.assertEqual(len(removed_content['results']), 0, removed_content)
+        self.assertEqual(len(removed_content), 0, removed_content)
 
         content_summary = self.get_content_summary(repo)
         self.assertEqual(content_summary, {'file': FILE_FEED_COUNT})
@@ -129,7 +130,7 @@ class AddRemoveContentTestCase(unittest.TestCase, utils.SmokeTest):
         Make roughly the same assertions as :meth:`test_02_sync_content`.
         """
         repo = self.client.get(self.repo['_href'])
-        self.content.update(choice(get_content(repo)['results']))
+        self.content.update(choice(get_content(repo)))
         self.client.post(
             repo['_versions_href'],
             {'remove_content_units': [self.content['_href']]}
@@ -142,13 +143,13 @@ class AddRemoveContentTestCase(unittest.TestCase, utils.SmokeTest):
         self.assertIsNotNone(repo['_latest_version_href'])
 
         content = get_content(repo)
-        self.assertEqual(len(content['results']), FILE_FEED_COUNT - 1)
+        self.assertEqual(len(content), FILE_FEED_COUNT - 1)
 
         added_content = get_added_content(repo)
-        self.assertEqual(len(added_content['results']), 0, added_content)
+        self.assertEqual(len(added_content), 0, added_content)
 
         removed_content = get_removed_content(repo)
-        self.assertEqual(len(removed_content['results']), 1, removed_content)
+        self.assertEqual(len(removed_content), 1, removed_content)
 
         content_summary = self.get_content_summary(repo)
         self.assertEqual(content_summary, {'file': FILE_FEED_COUNT - 1})
@@ -172,13 +173,13 @@ class AddRemoveContentTestCase(unittest.TestCase, utils.SmokeTest):
         self.assertIsNotNone(repo['_latest_version_href'])
 
         content = get_content(repo)
-        self.assertEqual(len(content['results']), FILE_FEED_COUNT)
+        self.assertEqual(len(content), FILE_FEED_COUNT)
 
         added_content = get_added_content(repo)
-        self.assertEqual(len(added_content['results']), 1, added_content)
+        self.assertEqual(len(added_content), 1, added_content)
 
         removed_content = get_removed_content(repo)
-        self.assertEqual(len(removed_content['results']), 0, removed_content)
+        self.assertEqual(len(removed_content), 0, removed_content)
 
         content_summary = self.get_content_summary(repo)
         self.assertEqual(content_summary, {'file': FILE_FEED_COUNT})
@@ -251,7 +252,7 @@ class AddRemoveRepoVersionTestCase(unittest.TestCase, utils.SmokeTest):
         """Delete the first repository version."""
         delete_repo_version(self.repo, self.repo_versions[0])
         with self.assertRaises(HTTPError):
-            get_content(self.repo, self.repo_versions[0])
+            next(iter_content(self.repo, self.repo_versions[0]))
         for repo_version in self.repo_versions[1:]:
             artifact_paths = get_artifact_paths(self.repo, repo_version)
             self.assertIn(self.content[0]['artifact'], artifact_paths)
@@ -266,7 +267,7 @@ class AddRemoveRepoVersionTestCase(unittest.TestCase, utils.SmokeTest):
         # Delete the last repo version.
         delete_repo_version(self.repo, self.repo_versions[-1])
         with self.assertRaises(HTTPError):
-            get_content(self.repo, self.repo_versions[-1])
+            next(iter_content(self.repo, self.repo_versions[-1]))
 
         # Make new repo version from new last repo version.
         self.client.post(
@@ -283,7 +284,7 @@ class AddRemoveRepoVersionTestCase(unittest.TestCase, utils.SmokeTest):
         index = randint(1, len(self.repo_versions) - 2)
         delete_repo_version(self.repo, self.repo_versions[index])
         with self.assertRaises(HTTPError):
-            get_content(self.repo, self.repo_versions[index])
+            next(iter_content(self.repo, self.repo_versions[index]))
         for repo_version in self.repo_versions[index + 1:]:
             artifact_paths = get_artifact_paths(self.repo, repo_version)
             self.assertIn(self.content[index]['artifact'], artifact_paths)
@@ -19,7 +19,7 @@ from pulp_smash.tests.pulp3.file.utils import set_up_module as setUpModule  # py
 from pulp_smash.tests.pulp3.pulpcore.utils import gen_repo
 from pulp_smash.tests.pulp3.utils import (
     get_auth,
-    get_content,
+    iter_content,
     publish_repo,
     sync_repo,
 )
@@ -71,12 +71,9 @@ class RemotesPublishersTestCase(unittest.TestCase, utils.SmokeTest):
             repos.append(client.get(repo['_href']))
 
         # Compare contents of repositories.
-        contents = []
-        for repo in repos:
-            contents.append(get_content(repo)['results'])
         self.assertEqual(
-            {content['_href'] for content in contents[0]},
-            {content['_href'] for content in contents[1]},
+            {content['_href'] for content in iter_content(repos[0])},
+            {content['_href'] for content in iter_content(repos[1])},
         )
 
         # Publish repositories.
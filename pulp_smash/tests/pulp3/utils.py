@@ -1,5 +1,6 @@
 # coding=utf-8
 """Utility functions for Pulp 3 tests."""
+import hashlib
 import random
 import unittest
 import warnings
@@ -9,8 +10,9 @@ from urllib.parse import urljoin, urlsplit
 from packaging.version import Version
 from requests.auth import AuthBase, HTTPBasicAuth
 
-from pulp_smash import api, config, selectors
+from pulp_smash import api, config, pagination, selectors, utils
 from pulp_smash.tests.pulp3.constants import (
+    ARTIFACTS_PATH,
     JWT_PATH,
     ORPHANS_PATH,
     STATUS_PATH,
@@ -199,20 +201,75 @@ def publish_repo(cfg, publisher, repo, version_href=None):
     return client.get(tasks[-1]['created_resources'][0])
 
 
+def upload_artifact(cfg, content, fresh=False):
+    """Create an artifact, unless Pulp already has one with the same content.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about the Pulp
+        host.
+    :param content: The artifact's content, as a binary blob.
+    :param fresh: Whether to upload ``content`` even if Pulp already has an
+        artifact with the same SHA 256 checksum. Pass ``True`` when artifact
+        creation itself is under test.
+    :returns: A dict of information about the artifact.
+    """
+    client = api.Client(cfg, api.json_handler)
+    if not fresh:
+        sha256 = hashlib.sha256(content).hexdigest()
+        artifacts = client.get(ARTIFACTS_PATH, params={'sha256': sha256})
+        if artifacts['results']:
+            utils.add_upload_bytes_saved(len(content))
+            return artifacts['results'][0]
+    return client.post(ARTIFACTS_PATH, files={'file': content})
+
+
+def iter_content(repo, version_href=None):
+    """Lazily yield the content units of a given repository.
+
+    Pages of content units are read as they are needed. Use this rather than
+    :func:`get_content` if the content units are only iterated over.
+
+    :param repo: A dict of information about the repository.
+    :param version_href: The repository version to read. If none, read the
+        latest repository version.
+    :returns: A generator of dicts of information about the content units
+        present in a given repository version.
+    """
+    if version_href is None:
+        version_href = repo['_latest_version_href']
+    return pagination.page_results(
+        config.get_config(),
+        urljoin(version_href, 'content/'),
+    )
+
+
 def get_content(repo, version_href=None):
     """Read the content units of a given repository.
 
     :param repo: A dict of information about the repository.
     :param version_href: The repository version to read. If none, read the
         latest repository version.
-    :returns: A dict of information about the content units present in a given
-        repository version.
+    :returns: A list of dicts of information about the content units present
+        in a given repository version. Every page is read. See
+        :func:`iter_content`.
+    """
+    return list(iter_content(repo, version_href))
+
+
+def iter_added_content(repo, version_href=None):
+    """Lazily yield the added content of a given repository version.
+
+    :param repo: A dict of information about a repository.
+    :param version_href: The repository version to read. If none, read the
+        latest repository version.
+    :returns: A generator of dicts of information about the content added
+        since the previous repository version.
     """
     if version_href is None:
         version_href = repo['_latest_version_href']
-    return (api
-            .Client(config.get_config(), api.json_handler)
-            .get(urljoin(version_href, 'content/')))
+    return pagination.page_results(
+        config.get_config(),
+        urljoin(version_href, 'added_content/'),
+    )
 
 
 def get_added_content(repo, version_href=None):
@@ -221,14 +278,28 @@ def get_added_content(repo, version_href=None):
     :param repo: A dict of information about a repository.
     :param version_href: The repository version to read. If none, read the
         latest repository version.
-    :returns: A dict of information about the content added since the previous
-        repository version.
+    :returns: A list of dicts of information about the content added since the
+        previous repository version. Every page is read. See
+        :func:`iter_added_content`.
+    """
+    return list(iter_added_content(repo, version_href))
+
+
+def iter_removed_content(repo, version_href=None):
+    """Lazily yield the removed content of a given repository version.
+
+    :param repo: A dict of information about the repository.
+    :param version_href: The repository version to read. If none, read the
+        latest repository version.
+    :returns: A generator of dicts of information about the content removed
+        since the previous repository version.
     """
     if version_href is None:
         version_href = repo['_latest_version_href']
-    return (api
-            .Client(config.get_config(), api.json_handler)
-            .get(urljoin(version_href, 'added_content/')))
+    return pagination.page_results(
+        config.get_config(),
+        urljoin(version_href, 'removed_content/'),
+    )
 
 
 def get_removed_content(repo, version_href=None):
@@ -237,14 +308,11 @@ def get_removed_content(repo, version_href=None):
     :param repo: A dict of information about the repository.
     :param version_href: The repository version to read. If none, read the
         latest repository version.
-    :returns: A dict of information about the content removed since the
-        previous repository version.
+    :returns: A list of dicts of information about the content removed since
+        the previous repository version. Every page is read. See
+        :func:`iter_removed_content`.
     """
-    if version_href is None:
-        version_href = repo['_latest_version_href']
-    return (api
-            .Client(config.get_config(), api.json_handler)
-            .get(urljoin(version_href, 'removed_content/')))
+    return list(iter_removed_content(repo, version_href))
 
 
 def get_content_unit_paths(repo):
@@ -255,7 +323,11 @@ def get_content_unit_paths(repo):
     """
     return [
         content_unit['relative_path']  # file path and name
-        for content_unit in get_content(repo)['results']
+        for content_unit in pagination.page_results(
+            config.get_config(),
+            urljoin(repo['_latest_version_href'], 'content/'),
+            fields=('relative_path',),
+        )
     ]
 
 
@@ -280,8 +352,11 @@ def get_repo_versions(repo):
     :param repo: A dict of information about the repository.
     :returns: A sorted list with the hrefs of repository versions.
     """
-    client = api.Client(config.get_config(), api.json_handler)
-    versions = client.get(repo['_versions_href'])['results']
+    versions = pagination.page_results(
+        config.get_config(),
+        repo['_versions_href'],
+        fields=('_href',),
+    )
     return sorted(
         [version['_href'] for version in versions],
         key=lambda url: int(urlsplit(url).path.split('/')[-2])
@@ -292,12 +367,19 @@ def get_artifact_paths(repo, version_href=None):
     """Return the paths of artifacts present in a given repository version.
 
     :param repo: A dict of information about the repository.
-    :param version_href: The repository version to read.
+    :param version_href: The repository version to read. If none, read the
+        latest repository version.
     :returns: A set with the paths of units present in a given repository.
     """
+    if version_href is None:
+        version_href = repo['_latest_version_href']
     return {
         content_unit['artifact']  # file path and name
-        for content_unit in get_content(repo, version_href)['results']
+        for content_unit in pagination.page_results(
+            config.get_config(),
+            urljoin(version_href, 'content/'),
+            fields=('artifact',),
+        )
     }
 
 
@@ -4,18 +4,31 @@
 This module may make use of :mod:`pulp_smash.api` and :mod:`pulp_smash.cli`,
 but the reverse should not be done.
 """
+import codecs
+import concurrent.futures
+import contextlib
 import hashlib
 import io
+import mmap
+import os
 import unittest
 import uuid
+from json import JSONDecoder
 from urllib.parse import urljoin, urlparse
 
-import requests
 from packaging.version import Version
 
-from pulp_smash import api, cli, config, exceptions
+from pulp_smash import (
+    api,
+    cli,
+    config,
+    exceptions,
+    instrumentation,
+    sessions,
+)
 from pulp_smash.cli import _is_root as is_root  # for backward compatibility
 from pulp_smash.tests.pulp2.constants import (
+    CONTENT_UNITS_PATH,
     CONTENT_UPLOAD_PATH,
     ORPHANS_PATH,
     PULP_SERVICES,
@@ -25,6 +38,26 @@ from pulp_smash.tests.pulp2.constants import (
 # A mapping between URLs and SHA 256 checksums. Used by get_sha256_checksum().
 _CHECKSUM_CACHE = {}
 
+# The number of units requested per search by iter_search_units().
+_SEARCH_PAGE_SIZE = 1000
+
+# Bounds on the size of the chunks PUT by upload_import_unit(), in bytes, and
+# the number of chunks it PUTs at once. Small units are uploaded in chunks of
+# about 200 kB, as Pulp Smash always did, and large units in fewer, larger
+# chunks.
+_UPLOAD_CHUNK_MIN = 200000
+_UPLOAD_CHUNK_MAX = 8 * 1024 * 1024
+_UPLOAD_WORKERS = 4
+
+# Unit types whose duplicate uploads upload_import_unit() can skip, and the
+# unit field holding their SHA 256 checksum.
+_DEDUP_CHECKSUM_FIELDS = {
+    'drpm': 'checksum',
+    'iso': 'checksum',
+    'rpm': 'checksum',
+    'srpm': 'checksum',
+}
+
 
 def uuid4():
     """Return a random UUID4 as a string."""
@@ -35,9 +68,10 @@ def uuid4():
 def get_broker(server_config):
     """Build an object for managing the target system's AMQP broker.
 
-    Talk to the host named by ``server_config`` and use simple heuristics to
-    determine which AMQP broker is installed. If Qpid or RabbitMQ appear to be
-    installed, return the name of that service. Otherwise, raise an exception.
+    Use facts about the host named by ``server_config`` to determine which
+    AMQP broker is installed. If Qpid or RabbitMQ appear to be installed,
+    return the name of that service. Otherwise, raise an exception. See
+    :func:`pulp_smash.cli.get_facts`.
 
     :param pulp_smash.config.PulpSmashConfig server_config: Information about
         the system on which an AMQP broker exists.
@@ -45,37 +79,51 @@ def get_broker(server_config):
     :raises pulp_smash.exceptions.NoKnownBrokerError: If unable to find any
         AMQP brokers on the target system.
     """
-    # On Fedora 23, /usr/sbin and /usr/local/sbin are only added to the $PATH
-    # for login shells. (See pathmunge() in /etc/profile.) As a result, logging
-    # into a system and executing `which qpidd` and remotely executing `ssh
-    # pulp.example.com which qpidd` may return different results.
-    client = cli.Client(server_config, cli.echo_handler)
-    executables = ('qpidd', 'rabbitmq')  # ordering indicates preference
-    for executable in executables:
-        command = ('test', '-e', '/usr/sbin/' + executable)
-        if client.run(command).returncode == 0:
-            return executable
+    broker = cli.get_facts(server_config)['broker']
+    if broker:
+        return broker
     raise exceptions.NoKnownBrokerError(
         'Unable to determine the AMQP broker used by {}. It does not appear '
         'to be any of {}.'
-        .format(urlparse(server_config.get_base_url()).hostname, executables)
+        .format(
+            urlparse(server_config.get_base_url()).hostname,
+            ('qpidd', 'rabbitmq'),
+        )
     )
 
 
 def http_get(url, **kwargs):
     """Issue a HTTP request to the ``url`` and return the response content.
 
-    This is useful for downloading file contents over HTTP[S].
+    This is useful for downloading file contents over HTTP[S]. Connections are
+    drawn from the pool returned by :func:`pulp_smash.sessions.get_session`.
 
     :param url: the URL where the content should be get.
     :param kwargs: additional kwargs to be passed to ``requests.get``.
     :returns: the response content of a GET request to ``url``.
     """
-    response = requests.get(url, **kwargs)
+    response = sessions.get_session(url).get(url, **kwargs)
     response.raise_for_status()
     return response.content
 
 
+def http_download(url, path=None, algorithms=('sha256',), **kwargs):
+    """Download the file at ``url`` in chunks, and digest it as it arrives.
+
+    Unlike :func:`http_get`, the body is never held in memory as a whole. This
+    is useful for large files, such as ISOs.
+
+    :param url: The URL of the file to download.
+    :param path: A path to which the file should be written, or ``None``.
+    :param algorithms: Names of algorithms accepted by ``hashlib.new``.
+    :param kwargs: Additional kwargs to be passed to ``requests.get``.
+    :returns: A :data:`pulp_smash.api.StreamedResponse`.
+    """
+    kwargs['stream'] = True
+    response = sessions.get_session(url).get(url, **kwargs)
+    return api.stream_handler(None, response, algorithms, path)
+
+
 def pulp_admin_login(server_config):
     """Execute ``pulp-admin login``.
 
@@ -109,24 +157,27 @@ def reset_pulp(server_config):
     # Why not use runuser's `-u` flag? Because RHEL 6 ships an old version of
     # runuser that doesn't support the flag, and RHEL 6 is a supported Pulp
     # platform.
+    #
+    # The commands are run as one batch, to save a round trip per command.
     system = server_config.get_systems('mongod')[0]
     client = cli.Client(server_config, pulp_system=system)
-    client.run('mongo pulp_database --eval db.dropDatabase()'.split())
+    commands = ['mongo pulp_database --eval db.dropDatabase()'.split()]
 
     for index, system in enumerate(server_config.get_systems('api')):
         prefix = '' if is_root(server_config, pulp_system=system) else 'sudo '
         if index == 0:
-            client.run((
+            commands.append((
                 prefix + 'runuser --shell /bin/sh apache --command '
                 'pulp-manage-db'
             ).split())
-        client.run((prefix + 'rm -rf /var/lib/pulp/content').split())
-        client.run((prefix + 'rm -rf /var/lib/pulp/published').split())
+        commands.append((prefix + 'rm -rf /var/lib/pulp/content').split())
+        commands.append((prefix + 'rm -rf /var/lib/pulp/published').split())
+    client.run_batch(commands)
 
-    svc_mgr.start(PULP_SERVICES)
+    svc_mgr.start(PULP_SERVICES, wait=True)
 
 
-def upload_import_unit(cfg, unit, import_params, repo):
+def upload_import_unit(cfg, unit, import_params, repo, fresh=False):
     """Upload a content unit to a Pulp server and import it into a repository.
 
     This procedure only works for some unit types, such as ``rpm`` or
@@ -159,27 +210,37 @@ def upload_import_unit(cfg, unit, import_params, repo):
 
     :param pulp_smash.config.PulpSmashConfig cfg: Information about a Pulp
         host.
-    :param unit: The unit to be uploaded and imported, as a binary blob.
+    :param unit: The unit to be uploaded and imported. Either a binary blob,
+        the path to a file, or a binary file object. Files are memory-mapped
+        where possible, so that large units need not be read into memory.
     :param import_params: A dict of parameters to be merged into the default
         set of import parameters during step 3.
     :param repo: A dict of information about the target repository.
-    :returns: The call report returned when importing the unit.
+    :param fresh: Whether to upload and import the unit even if Pulp already
+        has an identical unit. By default, RPM, SRPM, DRPM and ISO units are
+        searched for across all of Pulp by SHA 256 checksum, and if one is
+        found, steps 1 to 4 are skipped. Instead, the unit is copied into
+        ``repo`` from a repository that has it, and the call report of that
+        copy is returned. If ``repo`` already has the unit, nothing is done
+        and ``None`` is returned. Pass ``True`` when the upload itself is
+        under test.
+    :returns: The call report returned when importing or copying the unit, or
+        ``None`` if the unit was already in ``repo``.
     """
     client = api.Client(cfg, api.json_handler)
-    malloc = client.post(CONTENT_UPLOAD_PATH)
-
-    # 200,000 bytes ~= 200 kB
-    chunk_size = 200000
-    offset = 0
-    with io.BytesIO(unit) as handle:
-        while True:
-            chunk = handle.read(chunk_size)
-            if not chunk:  # if chunk == b'':
-                break  # we've reached EOF
-            path = urljoin(malloc['_href'], '{}/'.format(offset))
-            client.put(path, data=chunk)
-            offset += chunk_size
-
+    with _unit_buffer(unit) as view:
+        criteria = None if fresh else _get_dedup_criteria(view, import_params)
+        repo_ids = _get_unit_repo_ids(client, criteria) if criteria else ()
+        if repo_ids:
+            add_upload_bytes_saved(len(view))
+            if repo['id'] in repo_ids:
+                return None
+            return client.post(urljoin(repo['_href'], 'actions/associate/'), {
+                'criteria': criteria,
+                'source_repo_id': repo_ids[0],
+            })
+        malloc = client.post(CONTENT_UPLOAD_PATH)
+        _upload_chunks(client, malloc['_href'], view)
     path = urljoin(repo['_href'], 'actions/import_upload/')
     body = {'unit_key': {}, 'upload_id': malloc['upload_id']}
     body.update(import_params)
@@ -188,6 +249,130 @@ def upload_import_unit(cfg, unit, import_params, repo):
     return call_report
 
 
+def _upload_chunks(client, upload_href, view):
+    """Upload ``view`` to the upload request at ``upload_href``, in chunks.
+
+    Several chunks are uploaded at once. See ``_UPLOAD_WORKERS``.
+    """
+    def put_chunk(offset, chunk_size):
+        """Upload one chunk of the unit."""
+        client.put(
+            urljoin(upload_href, '{}/'.format(offset)),
+            data=bytes(view[offset:offset + chunk_size]),
+        )
+
+    chunk_size = _get_upload_chunk_size(len(view))
+    with concurrent.futures.ThreadPoolExecutor(_UPLOAD_WORKERS) as pool:
+        futures = [
+            pool.submit(put_chunk, offset, chunk_size)
+            for offset in range(0, len(view), chunk_size)
+        ]
+        for future in futures:
+            future.result()  # Raise the first error, if any.
+
+
+def _get_dedup_criteria(view, import_params):
+    """Return criteria matching units with the same checksum as ``view``.
+
+    The criteria are suitable for copying units between repositories. Return
+    ``None`` if the unit's type can't be searched by checksum.
+    """
+    type_id = import_params.get('unit_type_id')
+    if type_id not in _DEDUP_CHECKSUM_FIELDS:
+        return None
+    field = _DEDUP_CHECKSUM_FIELDS[type_id]
+    return {
+        'type_ids': [type_id],
+        'filters': {'unit': {field: hashlib.sha256(view).hexdigest()}},
+    }
+
+
+def _get_unit_repo_ids(client, criteria):
+    """Return the IDs of the repositories with a unit matching ``criteria``.
+
+    Units are searched for across all of Pulp. An orphaned unit, which no
+    repository has, can't be copied, so it is treated like a missing one.
+    """
+    type_id = criteria['type_ids'][0]
+    filters = criteria['filters']['unit']
+    units = client.post(
+        urljoin(CONTENT_UNITS_PATH, '{}/search/'.format(type_id)),
+        {
+            'criteria': {'filters': filters, 'fields': list(filters)},
+            'include_repos': True,
+        },
+    )
+    return [
+        repo_id
+        for unit in units
+        for repo_id in unit.get('repository_memberships', ())
+    ]
+
+
+def add_upload_bytes_saved(size):
+    """Record that ``size`` bytes weren't uploaded, as Pulp already had them.
+
+    The total is kept by :func:`pulp_smash.instrumentation.get_recorder`, and
+    exported along with the other metrics it gathers. See
+    :func:`get_upload_bytes_saved`.
+    """
+    instrumentation.get_recorder().add_upload_bytes_saved(size)
+
+
+def get_upload_bytes_saved():
+    """Return the number of bytes that weren't uploaded, so far.
+
+    Uploads are skipped by :func:`upload_import_unit` and
+    :func:`pulp_smash.tests.pulp3.utils.upload_artifact` when Pulp already
+    has the content being uploaded.
+    """
+    return instrumentation.get_recorder().upload_bytes_saved
+
+
+def _get_upload_chunk_size(size):
+    """Return the size of the chunks in which to upload ``size`` bytes.
+
+    Aim for several chunks per worker, so that the workers stay busy, within
+    the bounds of ``_UPLOAD_CHUNK_MIN`` and ``_UPLOAD_CHUNK_MAX``.
+    """
+    chunk_size = size // (_UPLOAD_WORKERS * 4)
+    return max(_UPLOAD_CHUNK_MIN, min(chunk_size, _UPLOAD_CHUNK_MAX))
+
+
+@contextlib.contextmanager
+def _unit_buffer(unit):
+    """Yield a ``memoryview`` of ``unit``, as accepted by upload_import_unit.
+
+    Files are memory-mapped when they can be. Other file objects, such as
+    ``io.BytesIO``, are read from their current position.
+    """
+    if isinstance(unit, (bytes, bytearray, memoryview)):
+        yield memoryview(unit)
+        return
+    with contextlib.ExitStack() as stack:
+        if isinstance(unit, str) or hasattr(unit, '__fspath__'):
+            handle = stack.enter_context(open(unit, 'rb'))
+        else:
+            handle = unit
+        try:
+            fileno = handle.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            yield memoryview(handle.read())
+            return
+        if os.fstat(fileno).st_size == 0:
+            yield memoryview(b'')  # Empty files can't be memory-mapped.
+            return
+        mapped = stack.enter_context(
+            mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+        # Views must be released before the map is closed. Callbacks are
+        # called in the reverse order of their registration.
+        view = memoryview(mapped)
+        stack.callback(view.release)
+        view = view[handle.tell():]
+        stack.callback(view.release)
+        yield view
+
+
 def upload_import_erratum(server_config, erratum, repo_href):
     """Upload an erratum to a Pulp server and import it into a repository.
 
@@ -383,12 +568,14 @@ class DuplicateUploadsMixin(object):  # pylint:disable=too-few-public-methods
 
     def test_01_first_upload(self):
         """Upload a content unit to a repository."""
-        call_report = upload_import_unit(*self.upload_import_unit_args)
+        call_report = upload_import_unit(
+            *self.upload_import_unit_args, fresh=True)
         self.assertIsNone(call_report['result'])
 
     def test_02_second_upload(self):
         """Upload the same content unit to the same repository."""
-        call_report = upload_import_unit(*self.upload_import_unit_args)
+        call_report = upload_import_unit(
+            *self.upload_import_unit_args, fresh=True)
         self.assertIsNone(call_report['result'])
 
 
@@ -403,30 +590,31 @@ def reset_squid(cfg):
     svc_mgr = cli.GlobalServiceManager(cfg)
     svc_mgr.stop(('squid',))
 
-    # Remove and re-initialize the cache directory.
+    # Remove and re-initialize the cache directory, in one batch.
     sudo = () if is_root(cfg) else ('sudo',)
-    client = cli.Client(cfg)
-    client.run(sudo + ('rm', '-rf', '/var/spool/squid'))
-    client.run(sudo + (
-        'mkdir', '--context=system_u:object_r:squid_cache_t:s0', '--mode=750',
-        '/var/spool/squid'))
-    client.run(sudo + ('chown', 'squid:squid', '/var/spool/squid'))
+    commands = [
+        sudo + ('rm', '-rf', '/var/spool/squid'),
+        sudo + (
+            'mkdir', '--context=system_u:object_r:squid_cache_t:s0',
+            '--mode=750', '/var/spool/squid'),
+        sudo + ('chown', 'squid:squid', '/var/spool/squid'),
+    ]
     if squid_version < Version('4'):
-        client.run(sudo + ('squid', '-z'))
+        commands.append(sudo + ('squid', '-z'))
     else:
-        client.run(sudo + ('squid', '-z', '--foreground'))
+        commands.append(sudo + ('squid', '-z', '--foreground'))
+    cli.Client(cfg).run_batch(commands)
 
     svc_mgr.start(('squid',))
 
 
 def _get_squid_version(cfg):
     """Get Squid's version, as a ``packaging.version.Version`` object."""
-    # The --version option was added in Squid 4.
-    resp = cli.Client(cfg).run(('squid', '-v'))
-    # The first line of output is 'Squid Cache: Version ...' for at least Squid
-    # 3 and 4, and at least Fedora 24, Fedora 25, RHEL 6.8 and RHEL 7.3.
+    # The first line of `squid -v` is 'Squid Cache: Version ...' for at least
+    # Squid 3 and 4, and at least Fedora 24, Fedora 25, RHEL 6.8 and RHEL 7.3.
     phrase = 'squid cache: version '
-    return Version(resp.stdout.splitlines()[0].lower()[len(phrase):].strip())
+    line = cli.get_facts(cfg)['squid_version']
+    return Version(line.lower()[len(phrase):].strip())
 
 
 def sync_repo(cfg, repo):
@@ -457,8 +645,7 @@ def get_sha256_checksum(url):
     # files. Otherwise, unnecessary downloads and cache entries may be made.
     url = urlparse(url).geturl()
     if url not in _CHECKSUM_CACHE:
-        checksum = hashlib.sha256(http_get(url)).hexdigest()
-        _CHECKSUM_CACHE[url] = checksum
+        _CHECKSUM_CACHE[url] = http_download(url).digests['sha256']
     return _CHECKSUM_CACHE[url]
 
 
@@ -492,6 +679,9 @@ def publish_repo(cfg, repo, json=None):
 def search_units(cfg, repo, criteria=None, response_handler=None):
     """Find content units in a ``repo``.
 
+    The whole response body is decoded at once. For repositories with many
+    units, consider :func:`iter_search_units`.
+
     :param pulp_smash.config.PulpSmashConfig cfg: Information about the Pulp
         host.
     :param repo: A dict of detailed information about the repository.
@@ -512,6 +702,119 @@ def search_units(cfg, repo, criteria=None, response_handler=None):
     )
 
 
+def iter_search_units(
+        cfg,
+        repo,
+        criteria=None,
+        fields=None,
+        page_size=_SEARCH_PAGE_SIZE):
+    """Find content units in a ``repo``, and yield them one at a time.
+
+    This is a streaming alternative to :func:`search_units`, for repositories
+    with many units. Units are searched for ``page_size`` at a time, by setting
+    ``limit`` and ``skip`` in the search criteria, and each response body is
+    decoded incrementally as it is read from the network. Only one unit and
+    one chunk of the response body are held in memory at a time.
+
+    If ``criteria`` includes a ``limit`` or ``skip``, they apply to the search
+    as a whole. Pages are only consistent if the units are in the same order
+    in each response, so units are sorted by ``_id`` unless ``criteria``
+    includes a ``sort``.
+
+    :param pulp_smash.config.PulpSmashConfig cfg: Information about the Pulp
+        host.
+    :param repo: A dict of detailed information about the repository.
+    :param criteria: A dict of criteria to pass in the search body. Defaults to
+        an empty dict.
+    :param fields: An iterable of unit fields to fetch, such as ``('name',
+        'version')``. Defaults to all fields. Fetching fewer fields makes
+        responses smaller.
+    :param page_size: The number of units to request per search.
+    :returns: A generator of dicts of information about units.
+    """
+    criteria = dict(criteria or {})
+    if fields is not None:
+        criteria['fields'] = {'unit': list(fields)}
+    criteria.setdefault('sort', {'unit': [['_id', 'ascending']]})
+    remaining = criteria.pop('limit', None)
+    skip = criteria.pop('skip', 0)
+    client = api.Client(cfg, api.code_handler)
+    path = urljoin(repo['_href'], 'search/units/')
+    while remaining is None or remaining > 0:
+        limit = page_size if remaining is None else min(page_size, remaining)
+        response = client.post(
+            path,
+            {'criteria': dict(criteria, limit=limit, skip=skip)},
+            stream=True,
+        )
+        with response:
+            count = 0
+            for unit in _iter_json_array(response):
+                count += 1
+                yield unit
+        if count < limit:
+            break
+        skip += count
+        if remaining is not None:
+            remaining -= count
+
+
+def _iter_json_array(response, chunk_size=64 * 1024):
+    """Incrementally decode a streamed response whose body is a JSON array.
+
+    :param response: A ``requests.Response`` made with ``stream=True``.
+    :param chunk_size: The number of bytes to read at a time.
+    :returns: A generator of the decoded array's items.
+    """
+    decoder = JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+    chunks = response.iter_content(chunk_size)
+    buffer = ''
+    expected = '['  # The next punctuation mark, if any.
+    empty = True  # Whether no item has been decoded yet.
+    exhausted = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer[:1] == ']' and expected != '[':
+            # Like json.loads, reject a trailing comma, as in "[1,]".
+            if expected or empty:
+                return
+            raise ValueError(
+                'Expected an item in a JSON array, but got {!r}.'
+                .format(buffer[:20])
+            )
+        if buffer and expected:
+            if buffer[0] != expected:
+                raise ValueError(
+                    'Expected {!r} in a JSON array, but got {!r}.'
+                    .format(expected, buffer[:20])
+                )
+            buffer = buffer[1:]
+            expected = None
+            continue
+        if buffer and not expected:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if exhausted:
+                    raise
+            else:
+                # A number at the end of the buffer might be truncated.
+                if end < len(buffer) or exhausted:
+                    yield item
+                    buffer = buffer[end:]
+                    expected = ','
+                    empty = False
+                    continue
+        if exhausted:
+            raise ValueError('Unexpected end of a JSON array.')
+        try:
+            buffer += text_decoder.decode(next(chunks))
+        except StopIteration:
+            buffer += text_decoder.decode(b'', final=True)
+            exhausted = True
+
+
 def os_is_f26(cfg, pulp_system=None):
     """Return ``True`` if the server runs Fedora 26, or ``False`` otherwise.
 
@@ -521,13 +824,8 @@ def os_is_f26(cfg, pulp_system=None):
         instead of the default chosen by :class:`pulp_smash.cli.Client`.
     :returns: True or false.
     """
-    response = cli.Client(cfg, cli.echo_handler, pulp_system).run((
-        'grep',
-        '-i',
-        'fedora release 26',
-        '/etc/redhat-release',
-    ))
-    return response.returncode == 0
+    release = cli.get_facts(cfg, pulp_system)['redhat_release']
+    return 'fedora release 26' in release.lower()
 
 
 def os_is_f27(cfg, pulp_system=None):
@@ -539,13 +837,8 @@ def os_is_f27(cfg, pulp_system=None):
         instead of the default chosen by :class:`pulp_smash.cli.Client`.
     :returns: True or false.
     """
-    response = cli.Client(cfg, cli.echo_handler, pulp_system).run((
-        'grep',
-        '-i',
-        'fedora release 27',
-        '/etc/redhat-release',
-    ))
-    return response.returncode == 0
+    release = cli.get_facts(cfg, pulp_system)['redhat_release']
+    return 'fedora release 27' in release.lower()
 
 
 class SmokeTest():  # pylint:disable=too-few-public-methods
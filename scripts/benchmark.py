@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Measure Pulp Smash's own overhead, against a local stand-in for Pulp.
+
+Start a :class:`pulp_smash.stand_in.StandIn`, and drive it from many threads
+at once with :class:`pulp_smash.api.Client`,
+:func:`pulp_smash.api.poll_spawned_tasks` and
+:func:`pulp_smash.utils.upload_import_unit`. For each benchmark, print the
+number of operations, their throughput and their latency percentiles. A
+typical use case is comparing the output before and after a change::
+
+    python3 scripts/benchmark.py --concurrency 64 --operations 2000
+
+Run ``python3 scripts/benchmark.py --help`` for the list of options.
+"""
+import argparse
+import concurrent.futures
+import os
+from time import monotonic
+
+from pulp_smash import api, instrumentation, stand_in, utils
+from pulp_smash.tests.pulp2.constants import REPOSITORY_PATH
+
+
+def get_repo(cfg, repo):
+    """Read a repository with a JSON response handler."""
+    api.Client(cfg, api.json_handler).get(repo['_href'])
+
+
+def sync_repo(cfg, repo):
+    """Start a sync, and poll the spawned task until it finishes."""
+    call_report = api.Client(cfg).post(
+        repo['_href'] + 'actions/sync/', {}).json()
+    tuple(api.poll_spawned_tasks(cfg, call_report))
+
+
+def search_units(cfg, repo):
+    """Stream every unit in a repository, in pages."""
+    for _ in utils.iter_search_units(cfg, repo, page_size=100):
+        pass
+
+
+def upload_unit(cfg, repo, unit):
+    """Upload and import a unit, and poll the import task."""
+    utils.upload_import_unit(
+        cfg, unit, {'unit_type_id': 'iso'}, repo, fresh=True)
+
+
+def run(name, operation, args):
+    """Call ``operation`` many times from many threads. Print statistics."""
+    histogram = instrumentation.Histogram()
+
+    def timed():
+        """Call ``operation``, and record how long it took."""
+        start = monotonic()
+        operation()
+        histogram.add(monotonic() - start)
+
+    start = monotonic()
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [pool.submit(timed) for _ in range(args.operations)]
+        for future in futures:
+            future.result()
+    seconds = monotonic() - start
+    print('{:<8} {:>6} ops {:>9.1f} ops/s  p50 {:>7.1f} ms  p99 {:>7.1f} ms'
+          .format(name, histogram.count, histogram.count / seconds,
+                  histogram.quantile(0.5) * 1000,
+                  histogram.quantile(0.99) * 1000))
+
+
+def main():
+    """Parse arguments, start a stand-in and run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='The number of threads making calls.')
+    parser.add_argument('--operations', type=int, default=500,
+                        help='The number of calls made per benchmark.')
+    parser.add_argument('--task-seconds', type=float, default=0.1,
+                        help='How long each task takes to finish.')
+    parser.add_argument('--units', type=int, default=1000,
+                        help='The number of units in each repository.')
+    parser.add_argument('--unit-padding', type=int, default=0,
+                        help='The number of filler bytes in each unit.')
+    parser.add_argument('--upload-size', type=int, default=1024 * 1024,
+                        help='The size of each uploaded unit, in bytes.')
+    args = parser.parse_args()
+    server = stand_in.StandIn(
+        task_seconds=args.task_seconds,
+        units=args.units,
+        unit_padding=args.unit_padding,
+    )
+    with server:
+        cfg = server.get_config()
+        repo = api.Client(cfg, api.json_handler).post(
+            REPOSITORY_PATH, {'id': utils.uuid4()})
+        unit = os.urandom(args.upload_size)
+        run('get', lambda: get_repo(cfg, repo), args)
+        run('sync', lambda: sync_repo(cfg, repo), args)
+        run('search', lambda: search_units(cfg, repo), args)
+        run('upload', lambda: upload_unit(cfg, repo, unit), args)
+
+
+if __name__ == '__main__':
+    exit(main())
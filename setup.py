@@ -33,7 +33,6 @@ setup(
         'Intended Audience :: Developers',
         ('License :: OSI Approved :: GNU General Public License v3 or later '
          '(GPLv3+)'),
-        'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
     ],
@@ -48,6 +47,8 @@ setup(
         'requests',
     ],
     extras_require={
+        # For `pulp_smash.async_api.AsyncClient`
+        'async': ['aiohttp'],
         'dev': [
             # For `make lint`
             'flake8',
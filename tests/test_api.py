@@ -1,9 +1,18 @@
 # coding=utf-8
 """Unit tests for :mod:`pulp_smash.api`."""
+import functools
+import hashlib
+import os
+import tempfile
 import unittest
 from unittest import mock
 
-from pulp_smash import api, config
+import requests
+
+from pulp_smash import api, config, instrumentation, retrying
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
 
 
 class EchoHandlerTestCase(unittest.TestCase):
@@ -103,6 +112,70 @@ class JsonHandlerTestCase(unittest.TestCase):
         self.assertEqual(kwargs['response'].json.call_count, 0)
 
 
+class StreamHandlerTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.api.stream_handler`."""
+
+    @staticmethod
+    def _get_response(*chunks):
+        """Return a mock response whose body is made of ``chunks``."""
+        response = mock.Mock(
+            status_code=200,
+            history=[],
+            url='http://example.com/foo',
+            headers={'Content-Length': str(sum(len(c) for c in chunks))},
+        )
+        response.iter_content.return_value = chunks
+        return response
+
+    def test_digests(self):
+        """Assert each chunk is digested, and a compact summary returned."""
+        response = self._get_response(b'ab', b'c')
+        result = api.stream_handler(
+            mock.Mock(), response, algorithms=('md5', 'sha256'))
+        self.assertEqual(result.size, 3)
+        self.assertEqual(result.digests, {
+            'md5': hashlib.md5(b'abc').hexdigest(),
+            'sha256': hashlib.sha256(b'abc').hexdigest(),
+        })
+        self.assertIsNone(result.path)
+        self.assertIs(result.headers, response.headers)
+        self.assertEqual(response.raise_for_status.call_count, 1)
+        self.assertEqual(response.close.call_count, 1)
+
+    def test_path(self):
+        """Assert the body is written to ``path``, if given."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'body')
+            result = api.stream_handler(
+                mock.Mock(), self._get_response(b'ab', b'c'), path=path)
+            with open(path, 'rb') as handle:
+                self.assertEqual(handle.read(), b'abc')
+        self.assertEqual(result.path, path)
+
+    def test_client_streams(self):
+        """Assert clients make streaming requests for this handler."""
+        cfg = config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            systems=[
+                config.PulpSystem(
+                    hostname='example.com',
+                    roles={'api': {'scheme': 'http'}},
+                )
+            ]
+        )
+        handlers = (
+            api.stream_handler,
+            functools.partial(api.stream_handler, algorithms=('md5',)),
+        )
+        for handler in handlers:
+            with self.subTest(handler=handler):
+                client = api.Client(cfg, handler)
+                with mock.patch.object(client, 'session') as session:
+                    session.request.return_value = self._get_response()
+                    client.get('foo')
+                self.assertTrue(session.request.call_args[1]['stream'])
+
+
 class ClientTestCase(unittest.TestCase):
     """Tests for :class:`pulp_smash.api.Client`."""
 
@@ -185,3 +258,128 @@ class ClientTestCase2(unittest.TestCase):
                 self.assertEqual(
                     request.call_args[0], (method.upper(), 'some url'))
                 self.assertIs(request.call_args[1]['json'], json)
+
+
+class RetryTestCase(unittest.TestCase):
+    """Tests for how clients follow a :class:`pulp_smash.retrying.RetryPolicy`."""
+
+    def setUp(self):
+        """Create a client with a mock session, and don't sleep."""
+        self.cfg = config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            systems=[
+                config.PulpSystem(
+                    hostname='example.com',
+                    roles={'api': {
+                        'scheme': 'http',
+                        'retry': {'retries': 2, 'max_backoff': 1},
+                    }},
+                )
+            ]
+        )
+        self.client = api.Client(self.cfg, api.echo_handler)
+        patcher = mock.patch.object(self.client, 'session')
+        self.session = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(api, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _get_response(status_code, headers=None):
+        """Return a mock response."""
+        return mock.Mock(
+            status_code=status_code,
+            headers=headers or {},
+            url='http://example.com/foo/',
+            content=b'',
+        )
+
+    def test_config(self):
+        """Assert the policy is read from the configuration file."""
+        self.assertEqual(self.client.retry_policy.retries, 2)
+        self.assertEqual(self.client.retry_policy.max_backoff, 1)
+        policy = retrying.RetryPolicy(retries=0)
+        client = api.Client(self.cfg, retry_policy=policy)
+        self.assertIs(client.retry_policy, policy)
+
+    def test_status(self):
+        """Assert idempotent requests are retried after an HTTP 503."""
+        responses = [self._get_response(503), self._get_response(200)]
+        self.session.request.side_effect = responses
+        self.assertIs(self.client.get('/foo/'), responses[1])
+        self.assertEqual(self.sleep.call_count, 1)
+        self.assertEqual(responses[0].close.call_count, 1)
+
+    def test_connection_error(self):
+        """Assert idempotent requests are retried after connection errors."""
+        self.session.request.side_effect = (
+            requests.exceptions.ConnectionError(),
+            self._get_response(200),
+        )
+        self.assertEqual(self.client.delete('/foo/').status_code, 200)
+
+    def test_retries(self):
+        """Assert requests are retried at most ``retries`` times."""
+        self.session.request.side_effect = requests.exceptions.ConnectionError
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.get('/foo/')
+        self.assertEqual(self.session.request.call_count, 3)
+
+    def test_post(self):
+        """Assert POST requests are retried only if the policy allows it."""
+        self.session.request.return_value = self._get_response(503)
+        self.assertEqual(self.client.post('/foo/').status_code, 503)
+        self.assertEqual(self.session.request.call_count, 1)
+        self.client.retry_policy = retrying.RetryPolicy(
+            methods=retrying.RetryPolicy.IDEMPOTENT_METHODS | {'POST'})
+        self.client.post('/foo/')
+        self.assertEqual(self.session.request.call_count, 5)
+
+    def test_other_status(self):
+        """Assert requests aren't retried after other error responses."""
+        self.session.request.return_value = self._get_response(500)
+        self.client.get('/foo/')
+        self.assertEqual(self.session.request.call_count, 1)
+
+    def test_retry_after(self):
+        """Assert Retry-After headers are honored, within the budget."""
+        self.session.request.side_effect = (
+            self._get_response(503, {'Retry-After': '5'}),
+            self._get_response(200),
+        )
+        self.client.get('/foo/')
+        self.assertEqual(self.sleep.call_args[0][0], 5)
+        self.session.request.side_effect = None
+        self.session.request.return_value = self._get_response(
+            503, {'Retry-After': '3600'})
+        self.assertEqual(self.client.get('/foo/').status_code, 503)
+
+    def test_recorded(self):
+        """Assert retries are recorded by the instrumentation hooks."""
+        hook = mock.Mock()
+        instrumentation.add_hook(hook)
+        self.addCleanup(instrumentation.remove_hook, hook)
+        self.session.request.side_effect = (
+            self._get_response(502),
+            self._get_response(200),
+        )
+        self.client.get('/foo/')
+        self.assertEqual(
+            [call[0][0].attempt for call in hook.call_args_list], [0, 1])
+
+    def test_failures_recorded(self):
+        """Assert connection errors are recorded, even if not retried."""
+        hook = mock.Mock()
+        instrumentation.add_hook(hook)
+        self.addCleanup(instrumentation.remove_hook, hook)
+        self.session.request.side_effect = requests.exceptions.ConnectionError
+        for method in ('get', 'post'):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                getattr(self.client, method)('/foo/')
+        self.assertEqual(
+            [(call[0][0].method, call[0][0].attempt, call[0][0].status)
+             for call in hook.call_args_list],
+            [('GET', 0, None), ('GET', 1, None), ('GET', 2, None),
+             ('POST', 0, None)],
+        )
@@ -0,0 +1,254 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.async_api`."""
+import asyncio
+import io
+import ssl
+import unittest
+from unittest import mock
+
+from pulp_smash import async_api, config, exceptions
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+@unittest.skipIf(async_api.aiohttp is None, 'aiohttp is not installed')
+class AsyncClientTestCase(unittest.TestCase):
+    """Tests for :class:`pulp_smash.async_api.AsyncClient`.
+
+    Requests are made against a Pulp-like server listening on localhost.
+    """
+
+    def setUp(self):
+        """Start an event loop and a server with a few routes."""
+        from aiohttp import web
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.addCleanup(self.loop.close)
+        self.polls = {'1': 0, '2': 0}
+        self.requests = []
+
+        async def echo(request):
+            """Describe the request."""
+            self.requests.append(request)
+            return web.json_response({
+                'method': request.method,
+                'auth': request.headers.get('Authorization'),
+                'query': dict(request.query),
+                'body': (await request.text()) or None,
+            })
+
+        async def sync(request):  # pylint:disable=unused-argument
+            """Return a Pulp 2 call report spawning two tasks."""
+            return web.json_response({'error': None, 'spawned_tasks': [
+                {'_href': '/pulp/api/v2/tasks/1/'},
+                {'_href': '/pulp/api/v2/tasks/2/'},
+            ]}, status=202)
+
+        async def task(request):
+            """Finish a task after it has been polled twice."""
+            task_id = request.match_info['task_id']
+            self.polls[task_id] += 1
+            state = 'running' if self.polls[task_id] < 2 else 'finished'
+            return web.json_response({
+                '_href': '/pulp/api/v2/tasks/{}/'.format(task_id),
+                'error': None,
+                'exception': None,
+                'spawned_tasks': [],
+                'state': state,
+                'traceback': None,
+            })
+
+        async def upload(request):
+            """Describe the fields of a multipart form."""
+            form = await request.post()
+            return web.json_response({
+                name: (
+                    [value.filename, value.content_type, value.file.read()
+                     .decode()]
+                    if isinstance(value, web.FileField) else value
+                )
+                for name, value in form.items()
+            })
+
+        async def missing(request):  # pylint:disable=unused-argument
+            """Return an HTTP 404."""
+            return web.json_response({}, status=404)
+
+        app = web.Application()
+        app.router.add_route('*', '/echo/', echo)
+        app.router.add_post('/sync/', sync)
+        app.router.add_get('/pulp/api/v2/tasks/{task_id}/', task)
+        app.router.add_post('/upload/', upload)
+        app.router.add_get('/missing/', missing)
+        runner = web.AppRunner(app)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.addCleanup(self.loop.run_until_complete, runner.cleanup())
+        self.addCleanup(
+            self.loop.run_until_complete, async_api.close_async_sessions())
+        port = runner.addresses[0][1]
+        self.cfg = config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            pulp_version=config.Version('2.15'),
+            systems=[
+                config.PulpSystem(
+                    hostname='127.0.0.1',
+                    roles={'api': {'port': port, 'scheme': 'http'}},
+                )
+            ]
+        )
+
+    def test_methods(self):
+        """Assert each method sends the corresponding HTTP method."""
+        client = async_api.AsyncClient(self.cfg, async_api.async_json_handler)
+        for method in ('delete', 'get', 'options', 'patch', 'post', 'put'):
+            with self.subTest(method=method):
+                body = self.loop.run_until_complete(
+                    getattr(client, method)('/echo/'))
+                self.assertEqual(body['method'], method.upper())
+
+    def test_request_kwargs(self):
+        """Assert auth, params and JSON are translated for aiohttp."""
+        client = async_api.AsyncClient(self.cfg, async_api.async_json_handler)
+        body = self.loop.run_until_complete(
+            client.post('/echo/', {'a': 1}, params={'flag': True}))
+        self.assertTrue(body['auth'].startswith('Basic '))
+        self.assertEqual(body['query'], {'flag': 'True'})
+        self.assertEqual(body['body'], '{"a": 1}')
+
+    def test_files(self):
+        """Assert files and form fields are sent as a multipart form."""
+        client = async_api.AsyncClient(self.cfg, async_api.async_json_handler)
+        body = self.loop.run_until_complete(client.post(
+            '/upload/',
+            data={'sha256': 'abc'},
+            files={
+                'file': ('a.txt', io.BytesIO(b'hello'), 'text/plain'),
+                'other': io.BytesIO(b'world'),
+            },
+        ))
+        self.assertEqual(body, {
+            'sha256': 'abc',
+            'file': ['a.txt', 'text/plain', 'hello'],
+            'other': ['other', 'application/octet-stream', 'world'],
+        })
+
+    def test_json_arg_omitted(self):
+        """Assert no body is sent if no ``json`` argument is passed."""
+        client = async_api.AsyncClient(self.cfg, async_api.async_json_handler)
+        body = self.loop.run_until_complete(client.post('/echo/'))
+        self.assertIsNone(body['body'])
+
+    def test_echo_handler(self):
+        """Assert ``async_echo_handler`` returns error responses."""
+        client = async_api.AsyncClient(self.cfg, async_api.async_echo_handler)
+        response = self.loop.run_until_complete(client.get('/missing/'))
+        self.assertEqual(response.status, 404)
+
+    def test_code_handler(self):
+        """Assert ``async_code_handler`` raises for error responses."""
+        client = async_api.AsyncClient(self.cfg, async_api.async_code_handler)
+        with self.assertRaises(async_api.aiohttp.ClientResponseError):
+            self.loop.run_until_complete(client.get('/missing/'))
+
+    def test_safe_handler(self):
+        """Assert the default handler waits for spawned tasks."""
+        client = async_api.AsyncClient(self.cfg)
+        response = self.loop.run_until_complete(client.post('/sync/'))
+        self.assertEqual(response.status, 202)
+        self.assertEqual(self.polls, {'1': 2, '2': 2})
+
+    def test_gather(self):
+        """Assert many requests may share a session concurrently."""
+        client = async_api.AsyncClient(self.cfg, async_api.async_json_handler)
+        bodies = self.loop.run_until_complete(asyncio.gather(*(
+            client.get('/echo/') for _ in range(5)
+        )))
+        self.assertEqual(len(bodies), 5)
+        self.assertEqual(len(self.requests), 5)
+
+    def test_poll_spawned_tasks(self):
+        """Assert spawned tasks are returned in order."""
+        tasks = self.loop.run_until_complete(async_api.async_poll_spawned_tasks(
+            self.cfg,
+            {'spawned_tasks': [
+                {'_href': '/pulp/api/v2/tasks/2/'},
+                {'_href': '/pulp/api/v2/tasks/1/'},
+            ]},
+        ))
+        self.assertEqual(
+            [task['_href'] for task in tasks],
+            ['/pulp/api/v2/tasks/2/', '/pulp/api/v2/tasks/1/'],
+        )
+
+    def test_poll_task_timeout(self):
+        """Assert ``async_poll_task`` gives up once its deadline passes."""
+        with self.assertRaises(exceptions.TaskTimedOutError):
+            self.loop.run_until_complete(async_api.async_poll_task(
+                self.cfg, '/pulp/api/v2/tasks/1/', timeout=0))
+
+
+@unittest.skipIf(async_api.aiohttp is None, 'aiohttp is not installed')
+class ToAiohttpKwargsTestCase(unittest.TestCase):
+    """Tests for ``pulp_smash.async_api._to_aiohttp_kwargs``."""
+
+    url = 'https://pulp.example.com/pulp/api/v2/'
+
+    def test_cert(self):
+        """Assert a client certificate is loaded into an SSL context."""
+        for verify, cert, cafile, args in (
+                (True, '/client.pem', None, ('/client.pem',)),
+                ('/ca.pem', ('/client.crt', '/client.key'), '/ca.pem',
+                 ('/client.crt', '/client.key'))):
+            with self.subTest(cert=cert), \
+                    mock.patch.object(ssl, 'create_default_context') as create:
+                kwargs = async_api._to_aiohttp_kwargs(
+                    {'url': self.url, 'verify': verify, 'cert': cert})
+            create.assert_called_once_with(cafile=cafile)
+            self.assertIs(kwargs['ssl'], create.return_value)
+            create.return_value.load_cert_chain.assert_called_once_with(*args)
+
+    def test_cert_unverified(self):
+        """Assert a client certificate may be sent without verifying hosts."""
+        with mock.patch.object(ssl, 'create_default_context'):
+            kwargs = async_api._to_aiohttp_kwargs(
+                {'url': self.url, 'verify': False, 'cert': '/client.pem'})
+        self.assertFalse(kwargs['ssl'].check_hostname)
+        self.assertEqual(kwargs['ssl'].verify_mode, ssl.CERT_NONE)
+        self.assertNotIn('cert', kwargs)
+
+    def test_proxies(self):
+        """Assert the proxy for the URL's scheme is chosen."""
+        kwargs = async_api._to_aiohttp_kwargs({
+            'url': self.url,
+            'proxies': {
+                'http': 'http://proxy:3128',
+                'https': 'http://proxy:3129',
+            },
+        })
+        self.assertEqual(kwargs['proxy'], 'http://proxy:3129')
+        self.assertNotIn('proxies', kwargs)
+        kwargs = async_api._to_aiohttp_kwargs({'url': self.url, 'proxies': {}})
+        self.assertNotIn('proxy', kwargs)
+
+    def test_stream(self):
+        """Assert streaming is rejected, but ``stream=False`` is accepted."""
+        with self.assertRaises(ValueError):
+            async_api._to_aiohttp_kwargs({'url': self.url, 'stream': True})
+        self.assertEqual(
+            async_api._to_aiohttp_kwargs({'url': self.url, 'stream': False}),
+            {'url': self.url},
+        )
+
+    def test_invalid_files(self):
+        """Assert files that can't be sent by aiohttp are rejected."""
+        for data, files in (
+                ('a=1', {'file': b'x'}),
+                (None, {'file': ('a.txt', b'x', 'text/plain', {'X-A': '1'})})):
+            with self.subTest(data=data, files=files):
+                with self.assertRaises(ValueError):
+                    async_api._to_aiohttp_kwargs(
+                        {'url': self.url, 'data': data, 'files': files})
@@ -0,0 +1,192 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.balancing`."""
+import json
+import unittest
+from unittest import mock
+
+import requests
+
+from pulp_smash import api, balancing, config, polling
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+def _get_balanced_cfg(count=3, **settings):
+    """Return a config with ``count`` API hosts, balanced with ``settings``."""
+    return config.PulpSmashConfig(
+        pulp_auth=['admin', 'admin'],
+        pulp_version=config.Version('3'),
+        systems=[
+            config.PulpSystem(
+                hostname='pulp-{}.example.com'.format(index),
+                roles={'api': {'scheme': 'http', 'balance': settings}},
+            )
+            for index in range(count)
+        ]
+    )
+
+
+def _get_response(request, body):
+    """Return a response to ``request``, with a JSON ``body``."""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    response._content = json.dumps(body).encode()
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class BalancerTestCase(unittest.TestCase):
+    """Tests for :class:`pulp_smash.balancing.Balancer`."""
+
+    def setUp(self):
+        """Create the hosts to balance over."""
+        self.systems = _get_balanced_cfg().get_systems('api')
+
+    def _pick(self, balancer, count, **kwargs):
+        """Acquire and release ``count`` hosts. Return their hostnames."""
+        hostnames = []
+        for _ in range(count):
+            system = balancer.acquire(**kwargs)
+            balancer.release(system, 0.1)
+            hostnames.append(system.hostname)
+        return hostnames
+
+    def test_round_robin(self):
+        """Assert hosts take turns."""
+        hostnames = self._pick(balancing.Balancer(self.systems), 6)
+        self.assertEqual(hostnames[:3], hostnames[3:])
+        self.assertEqual(len(set(hostnames)), 3)
+
+    def test_least_outstanding(self):
+        """Assert the host with the fewest requests in flight is chosen."""
+        balancer = balancing.Balancer(self.systems, 'least-outstanding')
+        busy = {balancer.acquire(), balancer.acquire()}
+        self.assertNotIn(balancer.acquire(), busy)
+
+    def test_latency_weighted(self):
+        """Assert fast hosts, and hosts not yet heard from, weigh more."""
+        balancer = balancing.Balancer(self.systems, 'latency-weighted')
+        for system, seconds in zip(self.systems, (0.1, 1)):
+            balancer.release(system, seconds)
+        # The weights are 10, 1 and 10, so the hosts take up [0, 10), [10, 11)
+        # and [11, 21] of the range random numbers are drawn from.
+        with mock.patch.object(balancing.random, 'uniform') as uniform:
+            for point, index in ((0, 0), (9.9, 0), (10.5, 1), (11, 2),
+                                 (21, 2)):
+                uniform.return_value = point
+                with self.subTest(point=point):
+                    self.assertEqual(balancer._weigh([0, 1, 2]), index)
+            uniform.return_value = 10.5
+            self.assertIs(balancer.acquire(), self.systems[1])
+        uniform.assert_called_with(0, 21)
+
+    def test_eject(self):
+        """Assert failing hosts are ejected, then given another chance."""
+        balancer = balancing.Balancer(
+            self.systems, eject_after=2, eject_for=30)
+        for _ in range(2):
+            balancer.release(balancer.acquire(key='x'), 0, healthy=False)
+        ejected = set(self.systems) - set(balancer.get_healthy())
+        self.assertEqual(len(ejected), 1)
+        self.assertNotIn(ejected.pop().hostname, self._pick(balancer, 6))
+        with mock.patch.object(balancing, 'monotonic', return_value=2e9):
+            self.assertEqual(balancer.get_healthy(), self.systems)
+
+    def test_all_ejected(self):
+        """Assert a host is chosen even if every host is ejected."""
+        balancer = balancing.Balancer(self.systems, eject_after=1)
+        for system in self.systems:
+            balancer.acquire()
+            balancer.release(system, 0, healthy=False)
+        self.assertEqual(balancer.get_healthy(), ())
+        self.assertEqual(balancer.acquire(), self.systems[0])
+
+    def test_sticky(self):
+        """Assert requests with a key stick to a host while it's healthy."""
+        balancer = balancing.Balancer(self.systems, eject_after=1)
+        hostnames = {
+            key: set(self._pick(balancer, 3, key=key))
+            for key in ('/tasks/{}/'.format(index) for index in range(20))
+        }
+        self.assertTrue(all(len(names) == 1 for names in hostnames.values()))
+        self.assertGreater(len(set.union(*hostnames.values())), 1)
+        system = balancer.acquire(key='/tasks/0/')
+        balancer.release(system, 0, healthy=False)
+        self.assertNotEqual(balancer.acquire(key='/tasks/0/'), system)
+
+    def test_invalid_strategy(self):
+        """Assert an unknown strategy is rejected."""
+        with self.assertRaises(ValueError):
+            balancing.Balancer(self.systems, 'random')
+
+
+class GetBalancerTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.balancing.get_balancer` and its users.
+
+    Requests are answered by a mock transport adapter, so that the rest of
+    Requests, such as ``Session.request``, really runs.
+    """
+
+    def setUp(self):
+        """Give each test no balancers, and a mock transport adapter."""
+        self.bodies = []
+        self.send = mock.Mock(side_effect=self._send)
+        for target, attribute, value in (
+                (balancing, '_BALANCERS', {}),
+                (requests.adapters.HTTPAdapter, 'send', self.send)):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cfg = _get_balanced_cfg(strategy='round-robin')
+
+    def _send(self, request, **kwargs):  # pylint:disable=unused-argument
+        """Answer ``request`` with the next of ``bodies``, or ``{}``."""
+        body = self.bodies.pop(0) if self.bodies else {}
+        return _get_response(request, body)
+
+    def _get_urls(self):
+        """Return the URL of each request sent."""
+        return [call[0][0].url for call in self.send.call_args_list]
+
+    def test_opt_in(self):
+        """Assert there is no balancer unless the config asks for one."""
+        system = self.cfg.systems[0]
+        cfg = self.cfg.copy(systems=[config.PulpSystem(
+            system.hostname, {'api': {'scheme': 'http'}})] * 2)
+        self.assertIsNone(balancing.get_balancer(cfg))
+        self.assertIsNone(
+            balancing.get_balancer(self.cfg.copy(systems=[system])))
+        self.assertIs(
+            balancing.get_balancer(self.cfg),
+            balancing.get_balancer(self.cfg),
+        )
+
+    def test_client(self):
+        """Assert a client spreads its requests, but not other hosts'."""
+        client = api.Client(self.cfg, api.echo_handler)
+        for _ in range(3):
+            client.get('/pulp/api/v3/status/')
+        with self.assertWarns(RuntimeWarning):
+            client.get('http://example.com/')
+        urls = self._get_urls()
+        self.assertEqual(len(set(urls[:3])), 3)
+        self.assertEqual(urls[3], 'http://example.com/')
+        pinned = api.Client(
+            self.cfg, api.echo_handler, pulp_system=self.cfg.systems[1])
+        self.assertIsNone(pinned.balancer)
+
+    def test_poll_tasks(self):
+        """Assert the polls of a task stick to one host."""
+        href = '/pulp/api/v3/tasks/1/'
+        self.bodies.extend((
+            {'_href': href, 'state': 'running'},
+            {'_href': href, 'state': 'completed', 'spawned_tasks': []},
+        ))
+        with mock.patch.object(polling, 'sleep'):
+            tuple(polling.poll_tasks(self.cfg, (href,)))
+        urls = self._get_urls()
+        self.assertEqual(len(urls), 2)
+        self.assertEqual(len(set(urls)), 1)
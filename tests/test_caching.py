@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.caching`."""
+import unittest
+from unittest import mock
+
+from pulp_smash import api, caching, config
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """Tests for :class:`pulp_smash.caching.ResponseCache`."""
+
+    def setUp(self):
+        """Create a client with a cache and a mock session."""
+        self.cfg = config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            systems=[
+                config.PulpSystem(
+                    hostname='example.com',
+                    roles={'api': {'scheme': 'http'}},
+                )
+            ]
+        )
+        self.cache = caching.ResponseCache(
+            max_entries=2, ttls={'/static/*': 60})
+        self.client = api.Client(
+            self.cfg, api.echo_handler, response_cache=self.cache)
+        patcher = mock.patch.object(self.client, 'session')
+        self.session = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _get_response(status_code=200, headers=None):
+        """Return a mock response."""
+        return mock.Mock(
+            status_code=status_code,
+            headers=headers or {},
+            url='http://example.com/',
+            content=b'',
+        )
+
+    def test_ttl(self):
+        """Assert responses are served from the cache until they expire."""
+        response = self._get_response()
+        self.session.request.return_value = response
+        for _ in range(3):
+            self.assertIs(self.client.get('/static/a/'), response)
+        self.assertEqual(self.session.request.call_count, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+        with mock.patch.object(caching, 'monotonic', return_value=1e12):
+            self.client.get('/static/a/')
+        self.assertEqual(self.session.request.call_count, 2)
+
+    def test_conditional(self):
+        """Assert responses with validators are revalidated."""
+        response = self._get_response(headers={'ETag': '"a"'})
+        self.session.request.side_effect = (
+            response, self._get_response(304))
+        self.client.get('/a/')
+        self.assertIs(self.client.get('/a/'), response)
+        headers = self.session.request.call_args[1]['headers']
+        self.assertEqual(headers, {'If-None-Match': '"a"'})
+
+    def test_not_stored(self):
+        """Assert responses are stored only if they can be served again."""
+        for path, response in (
+                ('/a/', self._get_response()),
+                ('/static/a/', self._get_response(404)),
+                ('/static/a/', self._get_response(
+                    headers={'Cache-Control': 'no-store'}))):
+            with self.subTest(path=path, response=response):
+                self.session.request.return_value = response
+                self.client.get(path)
+                self.assertEqual(len(self.cache), 0)
+
+    def test_key(self):
+        """Assert parameters and credentials distinguish cached responses."""
+        self.session.request.return_value = self._get_response()
+        self.client.get('/static/a/')
+        self.client.get('/static/a/', params={'details': True})
+        self.client.get('/static/a/', auth=('alice', 'hunter2'))
+        self.assertEqual(self.session.request.call_count, 3)
+
+    def test_lru(self):
+        """Assert the least recently used response is evicted first."""
+        self.session.request.return_value = self._get_response()
+        for path in ('/static/a/', '/static/b/', '/static/a/', '/static/c/'):
+            self.client.get(path)
+        self.assertEqual(
+            [key[0] for key in self.cache._entries],
+            ['http://example.com/static/a/', 'http://example.com/static/c/'],
+        )
+
+    def test_invalidate(self):
+        """Assert mutating requests evict related resources."""
+        self.session.request.return_value = self._get_response()
+        self.client.get('/static/repo/')
+        self.client.get('/static/other/')
+        self.client.post('/static/repo/actions/sync/')
+        self.assertEqual(
+            [key[0] for key in self.cache._entries],
+            ['http://example.com/static/other/'],
+        )
+
+    def test_config(self):
+        """Assert clients share a cache if the configuration asks for one."""
+        self.assertIsNone(api.Client(self.cfg).response_cache)
+        system = self.cfg.get_systems('api')[0]
+        api_role = dict(system.roles['api'], cache={'ttl': 5})
+        self.cfg = self.cfg.copy(systems=[config.PulpSystem(
+            system.hostname, dict(system.roles, api=api_role))])
+        with mock.patch.dict(caching._RESPONSE_CACHES, clear=True):
+            caches = [api.Client(self.cfg).response_cache for _ in range(2)]
+        self.assertIs(caches[0], caches[1])
+        self.assertEqual(caches[0].ttl, 5)
@@ -0,0 +1,154 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.cassette`."""
+import hashlib
+import http.server
+import json
+import os
+import tempfile
+import threading
+import unittest
+import uuid
+from unittest import mock
+
+from pulp_smash import api, cassette, cli, config, exceptions, ssh, utils
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+# The body of each response to a GET request. See _Handler.
+_STREAMED_BODY = b'0123456789abcdef' * 1024
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Answer each POST with the request body and a new UUID."""
+
+    def do_POST(self):  # pylint:disable=invalid-name
+        """Answer a POST request."""
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        task_id = str(uuid.uuid4())
+        content = json.dumps({
+            'request': json.loads(body.decode('utf-8')),
+            'path': self.path,
+            '_href': '/tasks/{}/'.format(task_id),
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):  # pylint:disable=invalid-name
+        """Answer a GET request with a body of a few kilobytes."""
+        content = _STREAMED_BODY
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):  # pylint:disable=arguments-differ
+        """Don't log requests."""
+
+
+def _get_config(port):
+    """Return a config for a Pulp host listening on ``port``."""
+    return config.PulpSmashConfig(
+        pulp_auth=['admin', 'admin'],
+        systems=[
+            config.PulpSystem(
+                hostname='localhost',
+                roles={
+                    'api': {'port': port, 'scheme': 'http'},
+                    'pulp cli': {},
+                    'shell': {'transport': 'ssh'},
+                },
+            )
+        ]
+    )
+
+
+class CassetteTestCase(unittest.TestCase):
+    """Record exchanges with a local server, and replay them without it."""
+
+    def setUp(self):
+        """Start a server, and create a directory for a cassette."""
+        self.server = http.server.HTTPServer(('localhost', 0), _Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.cfg = _get_config(self.server.server_port)
+
+    def _create_repo(self):
+        """Create a repository with a random name, and return the response."""
+        repo_id = utils.uuid4()
+        client = api.Client(self.cfg, api.json_handler)
+        return repo_id, client.post('/repositories/', {'id': repo_id})
+
+    def test_http(self):
+        """Assert HTTP exchanges are replayed, with UUIDs substituted."""
+        with cassette.use(cassette.Cassette(self.path)) as recording:
+            self.assertEqual(recording.mode, 'record')
+            recorded = self._create_repo()[1]
+        with open(os.path.join(self.path, 'cassette.json')) as handle:
+            self.assertEqual(len(json.load(handle)['interactions']), 1)
+        self.server.shutdown()
+        with cassette.use(cassette.Cassette(self.path)) as recording:
+            self.assertEqual(recording.mode, 'replay')
+            repo_id, replayed = self._create_repo()
+        self.assertEqual(replayed['request'], {'id': repo_id})
+        self.assertEqual(replayed['_href'], recorded['_href'])
+
+    def test_stream(self):
+        """Assert streamed bodies are recorded once the caller has read them."""
+        with cassette.use(cassette.Cassette(self.path, 'record')) as recording:
+            client = api.Client(self.cfg, api.echo_handler)
+            response = client.get('/large.iso', stream=True)
+            self.assertFalse(response._content_consumed)
+            self.assertEqual(recording._interactions, [])
+            body = b''.join(response.iter_content(1000))
+            self.assertEqual(len(recording._interactions), 1)
+        self.assertEqual(body, _STREAMED_BODY)
+        self.server.shutdown()
+        with cassette.use(cassette.Cassette(self.path, 'replay')):
+            client = api.Client(self.cfg, api.stream_handler)
+            replayed = client.get('/large.iso')
+        self.assertEqual(
+            replayed.digests['sha256'],
+            hashlib.sha256(_STREAMED_BODY).hexdigest(),
+        )
+
+    def test_miss(self):
+        """Assert unrecorded requests raise an exception when replaying."""
+        with cassette.use(cassette.Cassette(self.path, 'record')):
+            self._create_repo()
+        with cassette.use(cassette.Cassette(self.path, 'replay')):
+            client = api.Client(self.cfg)
+            with self.assertRaises(exceptions.CassetteMissError):
+                client.post('/other/', {})
+
+    def test_cli(self):
+        """Assert commands are replayed, without connecting to the host."""
+        with mock.patch.object(ssh.plumbum.machines, 'SshMachine') as machine, \
+                mock.patch.dict(ssh._SSH_MACHINES, clear=True):
+            machine.return_value.__getitem__.return_value.run.return_value = (
+                0, 'hello\n', '')
+            with cassette.use(cassette.Cassette(self.path, 'record')):
+                cli.Client(self.cfg).run(('echo', 'hello'))
+            machine.reset_mock()
+            with cassette.use(cassette.Cassette(self.path, 'replay')):
+                client = cli.Client(self.cfg)
+                result = client.run(('echo', 'hello'))
+        self.assertIsNone(client.machine)
+        self.assertEqual(machine.call_count, 0)
+        self.assertEqual(result.stdout, 'hello\n')
+
+    def test_invalid_mode(self):
+        """Assert an invalid mode is rejected."""
+        with self.assertRaises(ValueError):
+            cassette.Cassette(self.path, 'rewind')
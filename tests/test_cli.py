@@ -1,12 +1,17 @@
 # coding=utf-8
 """Unit tests for :mod:`pulp_smash.cli`."""
 import socket
+import threading
 import unittest
+from time import monotonic
 from unittest import mock
 
 from plumbum.machines.local import LocalMachine
 
-from pulp_smash import cli, config, exceptions, utils
+from pulp_smash import cli, config, exceptions, readiness, ssh, utils
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
 
 
 class EchoHandlerTestCase(unittest.TestCase):
@@ -155,12 +160,12 @@ class ClientTestCase(unittest.TestCase):
                 }
             )
         ])
-        with mock.patch('pulp_smash.cli.plumbum') as plumbum:
+        with mock.patch('pulp_smash.ssh.plumbum') as plumbum:
             machine = mock.Mock()
             plumbum.machines.SshMachine.return_value = machine
             self.assertEqual(cli.Client(cfg).machine, machine)
             plumbum.machines.SshMachine.assert_called_once_with(
-                cfg.systems[0].hostname)
+                cfg.systems[0].hostname, ssh_opts=ssh._SSH_OPTS)
 
     def test_explicit_pulp_system(self):
         """Assert it is possible to explicitly target a pulp cli PulpSystem."""
@@ -178,10 +183,196 @@ class ClientTestCase(unittest.TestCase):
                 }
             )
         ])
-        with mock.patch('pulp_smash.cli.plumbum') as plumbum:
+        with mock.patch('pulp_smash.ssh.plumbum') as plumbum:
             machine = mock.Mock()
             plumbum.machines.SshMachine.return_value = machine
             self.assertEqual(
                 cli.Client(cfg, pulp_system=cfg.systems[1]).machine, machine)
             plumbum.machines.SshMachine.assert_called_once_with(
-                cfg.systems[1].hostname)
+                cfg.systems[1].hostname, ssh_opts=ssh._SSH_OPTS)
+
+
+class RunBatchTestCase(unittest.TestCase):
+    """Tests for :meth:`pulp_smash.cli.Client.run_batch`."""
+
+    def setUp(self):
+        """Create a client that runs commands locally."""
+        self.cfg = config.PulpSmashConfig(systems=[
+            config.PulpSystem(
+                hostname=utils.uuid4(),
+                roles={'pulp cli': {}, 'shell': {'transport': 'local'}},
+            )
+        ])
+
+    def test_results(self):
+        """Assert one result is returned per command, with its own output."""
+        client = cli.Client(self.cfg)
+        with mock.patch.object(client, '_run', wraps=client._run) as run:
+            results = client.run_batch((
+                ('echo', 'hello world'),
+                ('printf', 'no newline'),
+                ('sh', '-c', 'echo oops >&2'),
+            ))
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(
+            [(result.returncode, result.stdout, result.stderr)
+             for result in results],
+            [(0, 'hello world\n', ''), (0, 'no newline', ''),
+             (0, '', 'oops\n')],
+        )
+        self.assertEqual(results[0].args, ('echo', 'hello world'))
+
+    def test_stop_on_error(self):
+        """Assert commands after a failed command are skipped."""
+        client = cli.Client(self.cfg, cli.echo_handler)
+        results = client.run_batch((('true',), ('false',), ('echo', 'x')))
+        self.assertEqual([result.returncode for result in results], [0, 1])
+        with self.assertRaises(exceptions.CalledProcessError):
+            cli.Client(self.cfg).run_batch((('false',), ('true',)))
+
+    def test_continue_on_error(self):
+        """Assert every command is run if ``stop_on_error`` is false."""
+        client = cli.Client(self.cfg, cli.echo_handler)
+        results = client.run_batch(
+            (('false',), ('echo', 'x')), stop_on_error=False)
+        self.assertEqual(
+            [(result.returncode, result.stdout) for result in results],
+            [(1, ''), (0, 'x\n')],
+        )
+
+    def test_shell_failure(self):
+        """Assert a shell that reports nothing is blamed on the command."""
+        client = cli.Client(self.cfg, cli.echo_handler)
+        with mock.patch.object(client, '_run', return_value=(255, '', 'no')):
+            results = client.run_batch((('true',), ('true',)))
+        self.assertEqual(len(results), 1)
+        self.assertEqual((results[0].returncode, results[0].stderr), (255, 'no'))
+
+
+class StreamTestCase(unittest.TestCase):
+    """Tests for :meth:`pulp_smash.cli.Client.stream`."""
+
+    def setUp(self):
+        """Create a client that runs commands locally."""
+        system = config.PulpSystem(
+            hostname='localhost', roles={'shell': {'transport': 'local'}})
+        cfg = config.PulpSmashConfig(systems=[system])
+        self.client = cli.Client(cfg, pulp_system=system)
+
+    def test_lines(self):
+        """Assert each output is yielded line by line, then handled."""
+        lines = self.client.stream(
+            ('sh', '-c', 'echo a; echo b >&2; printf c'))
+        self.assertEqual(
+            [line for name, line in lines if name == 'stdout'], ['a\n', 'c'])
+        self.assertEqual(lines.result.stdout, 'a\nc')
+        self.assertEqual(lines.result.stderr, 'b\n')
+
+    def test_early(self):
+        """Assert lines arrive before the command exits, and it is killed."""
+        start = monotonic()
+        with self.client.stream(
+                ('sh', '-c', 'echo first; sleep 30; echo last')) as lines:
+            self.assertEqual(next(lines), ('stdout', 'first\n'))
+        self.assertLess(monotonic() - start, 10)
+        self.assertIsNone(lines.result)
+
+    def test_keep_lines(self):
+        """Assert only the last lines of output are kept."""
+        result = self.client.run(('seq', '1', '100'), keep_lines=3)
+        self.assertEqual(result.stdout, '98\n99\n100\n')
+
+    def test_callbacks(self):
+        """Assert lines are passed to callbacks, before failures are raised."""
+        stdout, stderr = [], []
+        with self.assertRaises(exceptions.CalledProcessError):
+            self.client.run(
+                ('sh', '-c', 'cat; echo oops >&2; exit 3'),
+                on_stdout=stdout.append,
+                on_stderr=stderr.append,
+                stdin='hello\n',
+            )
+        self.assertEqual(stdout, ['hello\n'])
+        self.assertEqual(stderr, ['oops\n'])
+
+
+class GlobalServiceManagerTestCase(unittest.TestCase):
+    """Tests for :class:`pulp_smash.cli.GlobalServiceManager`."""
+
+    def setUp(self):
+        """Create a config for a cluster, and mock its hosts."""
+        self.cfg = config.PulpSmashConfig(systems=[
+            config.PulpSystem(hostname='web1', roles={'api': {}}),
+            config.PulpSystem(hostname='web2', roles={'api': {}}),
+            config.PulpSystem(hostname='workers', roles={'pulp workers': {}}),
+            config.PulpSystem(hostname='db', roles={'mongod': {}}),
+        ])
+        self.svc_mgr = cli.GlobalServiceManager(self.cfg)
+        self.calls = []
+        for name, value in (
+                ('_get_service_manager', 'systemd'),
+                ('_check_root', True)):
+            patcher = mock.patch.object(
+                self.svc_mgr, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(cli, 'Client', side_effect=self._client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self, cfg, pulp_system):  # pylint:disable=unused-argument
+        """Return a mock client that records the commands it runs."""
+        client = mock.Mock()
+
+        def run(args):
+            """Record a command."""
+            self.calls.append((pulp_system.hostname, args))
+            return cli.CompletedProcess(args, 0, '', '')
+
+        client.run.side_effect = run
+        return client
+
+    def test_stop(self):
+        """Assert services are stopped in phases, on every host."""
+        result = self.svc_mgr.stop(('httpd', 'mongod', 'pulp_workers'))
+        self.assertEqual(
+            set(result), {'web1', 'web2', 'workers', 'db'})
+        hostnames = [hostname for hostname, _ in self.calls]
+        self.assertEqual(set(hostnames[:2]), {'web1', 'web2'})
+        self.assertEqual(hostnames[2:], ['workers', 'db'])
+        self.assertEqual(
+            result['db'][0].args, ('systemctl', 'stop', 'mongod'))
+
+    def test_start(self):
+        """Assert services are started in the reverse order."""
+        self.svc_mgr.start(('httpd', 'mongod', 'pulp_workers'))
+        hostnames = [hostname for hostname, _ in self.calls]
+        self.assertEqual(hostnames[:2], ['db', 'workers'])
+
+    def test_concurrent(self):
+        """Assert the hosts in one phase are acted upon at the same time."""
+        barrier = threading.Barrier(2, timeout=5)
+        client = self._client
+
+        def wait_for_other_host(cfg, pulp_system):
+            """Return a client once both web hosts asked for one."""
+            barrier.wait()
+            return client(cfg, pulp_system)
+
+        with mock.patch.object(
+                cli, 'Client', side_effect=wait_for_other_host):
+            result = self.svc_mgr.restart(('httpd',))
+        self.assertEqual(set(result), {'web1', 'web2'})
+
+    def test_wait(self):
+        """Assert started services are waited for once every phase is over."""
+        with mock.patch.object(readiness, 'get_heartbeats') as get_heartbeats, \
+                mock.patch.object(cli, 'wait_until_ready') as wait:
+            self.svc_mgr.start(('httpd', 'mongod'), wait=True)
+            self.svc_mgr.stop(('httpd', 'mongod'))
+        self.assertEqual(len(self.calls), 6)
+        wait.assert_called_once_with(
+            self.cfg,
+            {'httpd', 'mongod'},
+            stale=get_heartbeats.return_value,
+        )
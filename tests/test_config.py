@@ -8,9 +8,10 @@ import random
 import unittest
 from unittest import mock
 
+import requests
 import xdg
 
-from pulp_smash import config, exceptions, utils
+from pulp_smash import api, config, exceptions, stand_in, utils
 
 PULP_SMASH_CONFIG = """
 {
@@ -197,6 +198,8 @@ class InitTestCase(unittest.TestCase):
         """Assert that public attributes have correct values."""
         attrs = config._public_attrs(self.cfg)  # pylint:disable=W0212
         attrs['pulp_version'] = type('')(attrs['pulp_version'])
+        attrs['pulp_auth'] = list(attrs['pulp_auth'])
+        attrs['systems'] = list(attrs['systems'])
         self.assertEqual(self.kwargs, attrs)
 
     def test_private_attrs(self):
@@ -238,7 +241,7 @@ class ReadTestCase(unittest.TestCase):
             with mock.patch.object(cfg, 'get_config_file_path'):
                 cfg = cfg.read()
         with self.subTest('check pulp_auth'):
-            self.assertEqual(cfg.pulp_auth, ['username', 'password'])
+            self.assertEqual(cfg.pulp_auth, ('username', 'password'))
         with self.subTest('check pulp_version'):
             self.assertEqual(cfg.pulp_version, config.Version('2.12.1'))
         with self.subTest('check systems'):
@@ -290,12 +293,12 @@ class ReadTestCase(unittest.TestCase):
                 with self.assertWarns(DeprecationWarning):
                     cfg = cfg.read()
         with self.subTest('check pulp_auth'):
-            self.assertEqual(cfg.pulp_auth, ['username', 'password'])
+            self.assertEqual(cfg.pulp_auth, ('username', 'password'))
         with self.subTest('check pulp_version'):
             self.assertEqual(cfg.pulp_version, config.Version('2.12'))
         with self.subTest('check systems'):
             self.assertEqual(
-                cfg.systems,
+                list(cfg.systems),
                 [
                     config.PulpSystem(
                         hostname='pulp.example.com',
@@ -377,6 +380,61 @@ class HelperMethodsTestCase(unittest.TestCase):
             )
 
 
+class FrozenTestCase(unittest.TestCase):
+    """Test that :class:`pulp_smash.config.PulpSmashConfig` is frozen."""
+
+    def setUp(self):
+        """Generate attributes and use them to instantiate a config."""
+        self.attrs = _gen_attrs()
+        self.cfg = config.PulpSmashConfig(**self.attrs)
+
+    def test_attributes(self):
+        """Assert attributes can't be set."""
+        with self.assertRaises(AttributeError):
+            self.cfg.pulp_version = '3'
+        with self.assertRaises(AttributeError):
+            del self.cfg.systems
+
+    def test_roles(self):
+        """Assert roles, and the kwargs computed from them, can't be set."""
+        system = self.cfg.get_systems('api')[0]
+        with self.assertRaises(TypeError):
+            system.roles['api']['port'] = 1
+        with self.assertRaises(TypeError):
+            system.roles.update({'api': {}})
+        kwargs = self.cfg.get_requests_kwargs()
+        kwargs['auth'] = None
+        self.assertIsNotNone(self.cfg.get_requests_kwargs()['auth'])
+
+    def test_hash(self):
+        """Assert configs describing the same application are equal."""
+        other = config.PulpSmashConfig(**self.attrs)
+        self.assertEqual(self.cfg, other)
+        self.assertEqual(hash(self.cfg), hash(other))
+        self.assertNotEqual(self.cfg, self.cfg.copy(pulp_auth=['a', 'b']))
+
+    def test_copy(self):
+        """Assert ``copy`` changes attributes of a new config only."""
+        cfg = self.cfg.copy(pulp_version='3')
+        self.assertEqual(str(cfg.pulp_version), '3')
+        self.assertEqual(cfg.systems, self.cfg.systems)
+        self.assertEqual(self.cfg.pulp_version, self.attrs['pulp_version'])
+
+    def test_index(self):
+        """Assert hosts are found by role, and unfulfilled roles are empty."""
+        self.assertEqual(self.cfg.get_systems('api'), self.cfg.systems)
+        other = config.PulpSystem('other.example.com', {'squid': {}})
+        cfg = self.cfg.copy(systems=self.cfg.systems + (other,))
+        self.assertEqual(cfg.get_systems('squid'), cfg.systems)
+        self.assertEqual(cfg.get_systems('api'), self.cfg.systems)
+        self.assertEqual(config.PulpSmashConfig().get_systems('api'), ())
+
+    def test_get_config(self):
+        """Assert ``get_config`` shares the global config."""
+        with mock.patch.object(config, '_CONFIG', self.cfg):
+            self.assertIs(config.get_config(), config.get_config())
+
+
 class GetRequestsKwargsTestCase(unittest.TestCase):
     """Test :meth:`pulp_smash.config.PulpSmashConfig.get_requests_kwargs`."""
 
@@ -399,13 +457,74 @@ class GetRequestsKwargsTestCase(unittest.TestCase):
 
     def test_cfg_auth(self):
         """Assert that the method does not alter the config's ``auth``."""
-        # _gen_attrs() returns ``auth`` as a list.
-        self.assertIsInstance(self.cfg.pulp_auth, list)
+        self.assertEqual(self.cfg.pulp_auth, tuple(self.attrs['pulp_auth']))
 
     def test_kwargs_auth(self):
         """Assert that the method converts ``auth`` to a tuple."""
         self.assertIsInstance(self.kwargs['auth'], tuple)
 
+    def test_pool_size(self):
+        """Assert that ``pool_size`` is not passed on to Requests."""
+        system = self.attrs['systems'][0]
+        roles = dict(system.roles, api=dict(system.roles['api'], pool_size=2))
+        cfg = config.PulpSmashConfig(
+            pulp_auth=self.attrs['pulp_auth'],
+            systems=[config.PulpSystem(system.hostname, roles)],
+        )
+        self.assertNotIn('pool_size', cfg.get_requests_kwargs())
+
+    def test_retry(self):
+        """Assert that ``retry`` is not passed on to Requests."""
+        system = self.attrs['systems'][0]
+        roles = dict(system.roles, api=dict(
+            system.roles['api'], retry={'retries': 5}))
+        cfg = config.PulpSmashConfig(
+            pulp_auth=self.attrs['pulp_auth'],
+            systems=[config.PulpSystem(system.hostname, roles)],
+        )
+        self.assertNotIn('retry', cfg.get_requests_kwargs())
+
+    def test_cache(self):
+        """Assert that ``cache`` is not passed on to Requests."""
+        system = self.attrs['systems'][0]
+        roles = dict(system.roles, api=dict(
+            system.roles['api'], cache={'ttl': 5}))
+        cfg = config.PulpSmashConfig(
+            pulp_auth=self.attrs['pulp_auth'],
+            systems=[config.PulpSystem(system.hostname, roles)],
+        )
+        self.assertNotIn('cache', cfg.get_requests_kwargs())
+
+    def test_other_system(self):
+        """Assert the kwargs of a host not in the config may be changed."""
+        system = config.PulpSystem('h2', {'api': {'scheme': 'https'}})
+        kwargs = self.cfg.get_requests_kwargs(system)
+        kwargs['url'] = 'https://h2'
+        self.assertEqual(kwargs['auth'], tuple(self.attrs['pulp_auth']))
+        client = api.Client(self.cfg, pulp_system=system)
+        self.assertEqual(client.request_kwargs['url'], 'https://h2')
+
+    def test_balance(self):
+        """Assert the kwargs of a balanced host are accepted by Requests.
+
+        No part of Requests is mocked, so that an unexpected keyword argument
+        raises an exception.
+        """
+        with stand_in.StandIn() as server:
+            system = server.get_config().systems[0]
+            roles = dict(system.roles, api=dict(
+                system.roles['api'], balance={'strategy': 'round-robin'}))
+            cfg = config.PulpSmashConfig(
+                pulp_auth=self.attrs['pulp_auth'],
+                systems=[config.PulpSystem(system.hostname, roles)],
+            )
+            kwargs = cfg.get_requests_kwargs()
+            self.assertNotIn('balance', kwargs)
+            with requests.Session() as session:
+                response = session.get(
+                    cfg.get_base_url() + '/pulp/api/v2/status/', **kwargs)
+            response.raise_for_status()
+
 
 class ReprTestCase(unittest.TestCase):
     """Test calling ``repr`` on a `pulp_smash.config.PulpSmashConfig`."""
@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.facts`."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pulp_smash import cassette, cli, config, facts
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+_BOOT_ID = '0f9b6b39-54b1-4a4c-9dbd-1e0b7b3d6a52'
+
+_OUTPUT = (
+    'boot_id=' + _BOOT_ID + '\n'
+    'uid=0\n'
+    'service_manager=systemd\n'
+    'broker=qpidd\n'
+    'squid_version=Squid Cache: Version 3.5.20\n'
+    'redhat_release=Fedora release 27 (Twenty Seven)\n'
+)
+
+
+class GetFactsTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.facts.get_facts`."""
+
+    def setUp(self):
+        """Cache facts in a temporary directory, and forget facts in memory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'pulp_smash', 'facts.json')
+        for target, attribute, value in (
+                (facts, '_get_path', mock.Mock(return_value=self.path)),
+                (facts, '_FACTS', {}),
+                (os, 'environ', {})):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.boot_id = _BOOT_ID
+        self.run = mock.Mock(side_effect=self._run)
+
+    def _run(self, args):
+        """Return what a host would print for a command."""
+        if args == ('sh', '-c', facts._BOOT_ID_SCRIPT):
+            return self.boot_id + '\n'
+        return _OUTPUT
+
+    def _count_gathered(self):
+        """Return how many times the script that prints facts was run."""
+        return self.run.call_args_list.count(
+            mock.call(('sh', '-c', facts._SCRIPT)))
+
+    def test_parse(self):
+        """Assert facts are parsed, and missing facts are empty strings."""
+        result = facts.get_facts('example.com', self.run)
+        self.assertEqual(set(result), set(facts.FACTS))
+        self.assertEqual(result['service_manager'], 'systemd')
+        self.assertEqual(result['package_manager'], '')
+        self.run.assert_called_once_with(('sh', '-c', facts._SCRIPT))
+
+    def test_memory(self):
+        """Assert facts are gathered once per host and process."""
+        facts.get_facts('example.com', self.run)
+        facts.get_facts('example.com', self.run)
+        self.assertEqual(self.run.call_count, 1)
+        facts.get_facts('example.org', self.run)
+        self.assertEqual(self.run.call_count, 2)
+
+    def test_disk(self):
+        """Assert facts are read from disk until they expire."""
+        expected = facts.get_facts('example.com', self.run)
+        facts._FACTS.clear()
+        self.assertEqual(facts.get_facts('example.com', self.run), expected)
+        self.assertEqual(self._count_gathered(), 1)
+        facts._FACTS.clear()
+        with mock.patch.object(facts, 'time', return_value=2e9):
+            facts.get_facts('example.com', self.run)
+        self.assertEqual(self._count_gathered(), 2)
+
+    def test_reboot(self):
+        """Assert facts on disk are gathered again if the host rebooted."""
+        facts.get_facts('example.com', self.run)
+        facts._FACTS.clear()
+        self.boot_id = 'f0e1d2c3-b4a5-9687-7869-5a4b3c2d1e0f'
+        facts.get_facts('example.com', self.run)
+        self.assertEqual(self._count_gathered(), 2)
+        facts.get_facts('example.com', self.run)
+        self.assertEqual(self.run.call_count, 3)
+
+    def test_disabled(self):
+        """Assert facts aren't cached on disk if the TTL is zero."""
+        os.environ['PULP_SMASH_FACTS_TTL'] = '0'
+        facts.get_facts('example.com', self.run)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_cassette(self):
+        """Assert facts aren't cached on disk if a cassette is in use."""
+        with mock.patch.object(cassette, 'get_cassette'):
+            facts.get_facts('example.com', self.run)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_forget(self):
+        """Assert forgotten facts are gathered again."""
+        facts.get_facts('example.com', self.run)
+        facts.forget('example.com')
+        facts.get_facts('example.com', self.run)
+        self.assertEqual(self.run.call_count, 2)
+
+    def test_local(self):
+        """Assert the script runs, and tells who runs it."""
+        system = config.PulpSystem(
+            hostname='localhost', roles={'shell': {'transport': 'local'}})
+        cfg = config.PulpSmashConfig(systems=[system])
+        result = cli.get_facts(cfg, system)
+        self.assertEqual(result['uid'], str(os.getuid()))
+        self.assertTrue(result['boot_id'])
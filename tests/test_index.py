@@ -0,0 +1,200 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.index`."""
+import importlib
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from pulp_smash import index
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+# The modules of a package to be indexed, keyed by their paths.
+_PACKAGE = {
+    '__init__.py': '',
+    'base.py': """\
+        import unittest
+
+        from pulp_smash import utils
+
+
+        class BaseTestCase(unittest.TestCase):
+            def test_base(self):
+                pass
+
+
+        class SmokeTestCase(unittest.TestCase, utils.SmokeTest):
+            def test_smoke(self):
+                pass
+    """,
+    'tests/__init__.py': '',
+    'tests/test_things.py': """\
+        import unittest
+        from unittest import TestCase as Case
+
+        from .. import base
+        from ..base import SmokeTestCase as Smoke
+
+
+        class InheritedTestCase(base.BaseTestCase):
+            pass
+
+
+        class SmokeTestCase(Smoke):
+            def test_more(self):
+                selectors.bug_is_untestable(1234, cfg.pulp_version)
+
+
+        class AliasedTestCase(Case):
+            def test_aliased(self):
+                pass
+
+
+        class EmptyTestCase(unittest.TestCase):
+            def helper(self):
+                pass
+
+
+        class NotATestCase(object):
+            def test_nothing(self):
+                pass
+    """,
+    'tests/utils.py': """\
+        import unittest
+
+
+        class UtilsTestCase(unittest.TestCase):
+            def test_utils(self):
+                pass
+    """,
+}
+
+
+class GetIndexTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.index.get_index`."""
+
+    def setUp(self):
+        """Write a package, and cache the index in a temporary directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, 'indexed')
+        for path, source in _PACKAGE.items():
+            path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as handle:
+                handle.write(textwrap.dedent(source))
+        self.path = os.path.join(directory.name, 'index.json')
+        for target, attribute, value in (
+                (index, '_get_path', mock.Mock(return_value=self.path)),
+                (sys, 'path', [directory.name] + sys.path)):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        importlib.invalidate_caches()
+
+    def test_index(self):
+        """Assert test modules, classes and methods are found."""
+        modules = index.get_index('indexed.tests')
+        self.assertEqual(len(modules), 1)
+        module = modules[0]
+        self.assertEqual(module.name, 'indexed.tests.test_things')
+        self.assertEqual(module.bug_ids, (1234,))
+        self.assertEqual(module.classes, (
+            index.TestClass(
+                module.name, 'AliasedTestCase', ('test_aliased',), False),
+            index.TestClass(
+                module.name, 'InheritedTestCase', ('test_base',), False),
+            index.TestClass(
+                module.name,
+                'SmokeTestCase',
+                ('test_more', 'test_smoke'),
+                True,
+            ),
+        ))
+
+    def test_smoke_tests(self):
+        """Assert smoke tests are found."""
+        self.assertEqual(
+            index.get_smoke_tests('indexed.tests'),
+            ['indexed.tests.test_things.SmokeTestCase'],
+        )
+
+    def test_cache(self):
+        """Assert files are parsed again only if their contents change."""
+        expected = index.get_index('indexed.tests')
+        self.assertTrue(os.path.exists(self.path))
+        path = os.path.join(self.root, 'tests', 'test_things.py')
+        with mock.patch.object(index, '_parse', wraps=index._parse) as parse:
+            self.assertEqual(index.get_index('indexed.tests'), expected)
+            self.assertEqual(parse.call_count, 0)
+
+            os.utime(path, ns=(0, 0))  # Touch the file.
+            self.assertEqual(index.get_index('indexed.tests'), expected)
+            self.assertEqual(parse.call_count, 0)
+
+            with open(path, 'a') as handle:
+                handle.write('\n\nclass NewTestCase(Case):\n'
+                             '    def test_new(self):\n'
+                             '        pass\n')
+            classes = index.get_index('indexed.tests')[0].classes
+        self.assertEqual(parse.call_count, 1)
+        self.assertIn('NewTestCase', {test_class.name for test_class in classes})
+
+    def test_real(self):
+        """Assert the smoke tests in :mod:`pulp_smash.tests` are found."""
+        self.assertTrue(all(
+            name.startswith('pulp_smash.tests.')
+            for name in index.get_smoke_tests()
+        ))
+
+
+class FindBugIdsTestCase(unittest.TestCase):
+    """Test :func:`pulp_smash.index.find_bug_ids`."""
+
+    def test_find(self):
+        """Assert bug IDs are found in calls, loops and function names."""
+        source = textwrap.dedent("""\
+            from pulp_smash import selectors
+            from pulp_smash.tests.pulp2.rpm.utils import check_issue_2277
+
+            def test(cfg, bug_id):
+                check_issue_2277(cfg)
+                selectors.bug_is_untestable(1, cfg.pulp_version)
+                if bug_is_testable(2, cfg.pulp_version):
+                    pass
+                for issue_id in (3, 4):
+                    selectors.bug_is_untestable(issue_id, cfg.pulp_version)
+                selectors.bug_is_untestable(bug_id, cfg.pulp_version)
+                print(5)
+        """)
+        with tempfile.NamedTemporaryFile('w', suffix='.py') as handle:
+            handle.write(source)
+            handle.flush()
+            self.assertEqual(
+                index.find_bug_ids(handle.name), {1, 2, 3, 4, 2277})
+
+    def test_unreadable(self):
+        """Assert nothing is found in files that can't be read or parsed."""
+        with tempfile.NamedTemporaryFile('w', suffix='.py') as handle:
+            handle.write('def (')
+            handle.flush()
+            self.assertEqual(index.find_bug_ids(handle.name), set())
+        self.assertEqual(index.find_bug_ids(handle.name), set())
+
+    def test_get_bug_ids(self):
+        """Assert :func:`pulp_smash.index.get_bug_ids` combines modules."""
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for i, source in enumerate((
+                    'bug_is_testable(1, version)\n',
+                    'bug_is_untestable(2, version)\n')):
+                paths.append(os.path.join(directory, 'test_{}.py'.format(i)))
+                with open(paths[-1], 'w') as handle:
+                    handle.write(source)
+            path = os.path.join(directory, 'index.json')
+            with mock.patch.object(index, '_get_path', return_value=path):
+                self.assertEqual(index.get_bug_ids(paths), {1, 2})
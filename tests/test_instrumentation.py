@@ -0,0 +1,178 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.instrumentation`."""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pulp_smash import api, cli, config, instrumentation
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+def _get_call(
+        target='/pulp/api/v2/{id}/',
+        status=200,
+        seconds=0.1,
+        attempt=0):
+    """Return a :data:`pulp_smash.instrumentation.Call`."""
+    return instrumentation.Call(
+        kind='http',
+        method='GET',
+        target=target,
+        status=status,
+        bytes_out=1,
+        bytes_in=10,
+        seconds=seconds,
+        attempt=attempt,
+    )
+
+
+class UrlTemplateTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.instrumentation.url_template`."""
+
+    def test_ids(self):
+        """Assert resource IDs are replaced, and other segments kept."""
+        for url, template in (
+                ('http://example.com/pulp/api/v2/repositories/'
+                 '3d4c1e8b-31bf-4c2b-a6a3-7f3f8a2b1c0d/', '/pulp/api/v2/'
+                 'repositories/{id}/'),
+                ('http://example.com/pulp/api/v2/tasks/'
+                 '5a3b4b6c2f8e1a0001d7c1a2/', '/pulp/api/v2/tasks/{id}/'),
+                ('http://example.com/pulp/api/v3/repositories/12/versions/'
+                 '3/?page=2', '/pulp/api/v3/repositories/{id}/versions/'
+                 '{id}/'),
+                ('http://example.com/pulp/api/v2/status/',
+                 '/pulp/api/v2/status/')):
+            with self.subTest(url=url):
+                self.assertEqual(instrumentation.url_template(url), template)
+
+
+class HistogramTestCase(unittest.TestCase):
+    """Tests for :class:`pulp_smash.instrumentation.Histogram`."""
+
+    def test_quantiles(self):
+        """Assert quantiles are estimated to within a bucket's width."""
+        histogram = instrumentation.Histogram()
+        for i in range(1, 1001):
+            histogram.add(i / 1000)
+        for quantile in (0.5, 0.9, 0.99):
+            with self.subTest(quantile=quantile):
+                self.assertAlmostEqual(
+                    histogram.quantile(quantile), quantile, delta=0.05)
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.max, 1)
+
+    def test_empty(self):
+        """Assert an empty histogram's quantiles are zero."""
+        self.assertEqual(instrumentation.Histogram().quantile(0.5), 0)
+
+
+class RecorderTestCase(unittest.TestCase):
+    """Tests for :class:`pulp_smash.instrumentation.Recorder`."""
+
+    def setUp(self):
+        """Record a few calls."""
+        self.recorder = instrumentation.Recorder()
+        self.recorder(_get_call(seconds=0.1))
+        self.recorder(_get_call(seconds=0.3, status=404, attempt=1))
+        self.recorder(_get_call(target='/slow/', seconds=10))
+        self.recorder.add_upload_bytes_saved(100)
+
+    def test_summary(self):
+        """Assert calls are aggregated per endpoint, slowest first."""
+        summary = self.recorder.summary()
+        self.assertEqual(
+            [endpoint['target'] for endpoint in summary],
+            ['/slow/', '/pulp/api/v2/{id}/'],
+        )
+        self.assertEqual(summary[1]['count'], 2)
+        self.assertEqual(summary[1]['statuses'], {'200': 1, '404': 1})
+        self.assertEqual(summary[1]['bytes_in'], 20)
+        self.assertEqual(summary[1]['retries'], 1)
+        self.assertLessEqual(summary[1]['p99'], 0.3)
+        self.assertEqual(json.loads(self.recorder.to_json()), {
+            'endpoints': summary,
+            'upload_bytes_saved': 100,
+        })
+
+    def test_prometheus(self):
+        """Assert a Prometheus histogram is returned."""
+        lines = self.recorder.to_prometheus().splitlines()
+        labels = 'kind="http",method="GET",target="/slow/"'
+        self.assertIn('# TYPE pulp_smash_call_seconds histogram', lines)
+        self.assertIn(
+            'pulp_smash_call_seconds_bucket{{{},le="+Inf"}} 1'.format(labels),
+            lines,
+        )
+        self.assertIn(
+            'pulp_smash_call_seconds_count{{{}}} 1'.format(labels), lines)
+        self.assertIn(
+            'pulp_smash_calls_total{{{},status="200"}} 1'.format(labels),
+            lines,
+        )
+        self.assertIn('pulp_smash_upload_bytes_saved_total 100', lines)
+
+    def test_export(self):
+        """Assert results are written to the paths named in the environment."""
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {
+                'PULP_SMASH_METRICS_JSON': os.path.join(directory, 'a.json'),
+                'PULP_SMASH_METRICS_PROM': os.path.join(directory, 'a.prom'),
+            }
+            with mock.patch.object(instrumentation, '_RECORDER',
+                                   self.recorder):
+                with mock.patch.dict(os.environ, paths):
+                    instrumentation._export()
+            with open(paths['PULP_SMASH_METRICS_JSON']) as handle:
+                self.assertEqual(handle.read(), self.recorder.to_json())
+            with open(paths['PULP_SMASH_METRICS_PROM']) as handle:
+                self.assertEqual(handle.read(), self.recorder.to_prometheus())
+
+
+class HooksTestCase(unittest.TestCase):
+    """Assert the API and CLI clients pass calls to hooks."""
+
+    def setUp(self):
+        """Register a hook, and create a config."""
+        self.hook = mock.Mock()
+        instrumentation.add_hook(self.hook)
+        self.addCleanup(instrumentation.remove_hook, self.hook)
+        self.cfg = config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            systems=[
+                config.PulpSystem(
+                    hostname='example.com',
+                    roles={
+                        'api': {'scheme': 'http'},
+                        'pulp cli': {},
+                        'shell': {'transport': 'local'},
+                    },
+                )
+            ]
+        )
+
+    def test_api_client(self):
+        """Assert :meth:`pulp_smash.api.Client.request` records calls."""
+        client = api.Client(self.cfg, api.echo_handler)
+        with mock.patch.object(client, 'session') as session:
+            response = session.request.return_value
+            response.url = 'http://example.com/pulp/api/v2/tasks/1/'
+            response.status_code = 200
+            response.request.body = b'abc'
+            response.content = b'defg'
+            client.post('/pulp/api/v2/tasks/1/')
+        call = self.hook.call_args[0][0]
+        self.assertEqual(call[:6], (
+            'http', 'POST', '/pulp/api/v2/tasks/{id}/', 200, 3, 4))
+
+    def test_cli_client(self):
+        """Assert :meth:`pulp_smash.cli.Client.run` records calls."""
+        client = cli.Client(self.cfg)
+        with mock.patch.object(client, 'machine') as machine:
+            machine.__getitem__.return_value.run.return_value = (0, 'hi\n', '')
+            client.run(('sudo', '/bin/echo', 'hi'))
+        call = self.hook.call_args[0][0]
+        self.assertEqual(call[:6], ('cli', 'run', 'echo', 0, 0, 3))
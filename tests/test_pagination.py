@@ -0,0 +1,61 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.pagination`."""
+import time
+import unittest
+from unittest import mock
+
+from pulp_smash import api, pagination
+
+
+class PageResultsTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.pagination.page_results`."""
+
+    def setUp(self):
+        """Create a mock client and a Pulp 3 config."""
+        patcher = mock.patch.object(api, 'Client')
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.cfg = mock.Mock()
+        self.pages = {
+            'first': {'next': 'second', 'results': [{'a': 1, 'b': 2}]},
+            'second': {'next': None, 'results': [{'a': 3, 'b': 4}]},
+        }
+        self.client.get.side_effect = lambda url, **_: self.pages[url]
+
+    def test_all_pages(self):
+        """Assert every page is read, by following ``next`` links."""
+        for prefetch in (True, False):
+            with self.subTest(prefetch=prefetch):
+                results = list(pagination.page_results(
+                    self.cfg, 'first', prefetch=prefetch))
+                self.assertEqual(results, [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}])
+
+    def test_lazy(self):
+        """Assert no request is made until a result is consumed."""
+        results = pagination.page_results(self.cfg, 'first', prefetch=False)
+        self.assertEqual(self.client.get.call_count, 0)
+        next(results)
+        self.assertEqual(self.client.get.call_count, 1)
+
+    def test_prefetch(self):
+        """Assert the next page is requested before a page is consumed."""
+        results = pagination.page_results(self.cfg, 'first')
+        next(results)
+        for _ in range(100):
+            if self.client.get.call_count == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(
+            [call[0][0] for call in self.client.get.call_args_list],
+            ['first', 'second'],
+        )
+
+    def test_fields(self):
+        """Assert results are trimmed, and fields requested from Pulp."""
+        results = list(pagination.page_results(
+            self.cfg, 'first', params={'x': 'y'}, fields=('a',)))
+        self.assertEqual(results, [{'a': 1}, {'a': 3}])
+        self.assertEqual(
+            self.client.get.call_args_list[0][1]['params'],
+            {'x': 'y', 'fields': 'a'},
+        )
@@ -0,0 +1,205 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.polling`."""
+import unittest
+from unittest import mock
+
+from pulp_smash import config, exceptions, polling, sessions
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+class PollTaskTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.polling.poll_task`."""
+
+    def setUp(self):
+        """Create a Pulp 2 config and a mock session."""
+        self.cfg = config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            pulp_version=config.Version('2.15'),
+            systems=[
+                config.PulpSystem(
+                    hostname='example.com',
+                    roles={'api': {'scheme': 'http'}},
+                )
+            ]
+        )
+        patcher = mock.patch.object(sessions, 'get_system_session')
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_finished(self):
+        """Assert the final state of a task and its children is yielded."""
+        bodies = (
+            {'state': 'running', 'spawned_tasks': []},
+            {'state': 'finished', 'spawned_tasks': [{'_href': 'child/'}]},
+            {'state': 'finished', 'spawned_tasks': []},
+        )
+        self.session.get.return_value.json.side_effect = bodies
+        with mock.patch.object(polling, 'sleep') as sleep:
+            tasks = tuple(polling.poll_task(self.cfg, 'parent/'))
+        self.assertEqual(tasks, bodies[1:])
+        self.assertEqual(sleep.call_count, 1)
+        self.assertLessEqual(sleep.call_args[0][0], polling._POLL_DELAY_MIN)
+
+    def test_timeout(self):
+        """Assert an exception is raised when the deadline passes."""
+        self.session.get.return_value.json.return_value = {'state': 'running'}
+        with mock.patch.object(polling, 'monotonic') as monotonic:
+            monotonic.side_effect = (0, 5, 10, 15)
+            with mock.patch.object(polling, 'sleep') as sleep:
+                with self.assertRaises(exceptions.TaskTimedOutError):
+                    tuple(polling.poll_task(self.cfg, 'task/', timeout=12))
+        self.assertEqual(self.session.get.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+
+class PollTasksTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.polling.poll_tasks`."""
+
+    def setUp(self):
+        """Create a mock session."""
+        patcher = mock.patch.object(sessions, 'get_system_session')
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _get_cfg(pulp_version):
+        """Return a config targeting the given version of Pulp."""
+        return config.PulpSmashConfig(
+            pulp_auth=['admin', 'admin'],
+            pulp_version=config.Version(pulp_version),
+            systems=[
+                config.PulpSystem(
+                    hostname='example.com',
+                    roles={'api': {'scheme': 'http'}},
+                )
+            ]
+        )
+
+    def test_pulp_2(self):
+        """Assert Pulp 2 tasks are searched for, one request per round."""
+        hrefs = ('/pulp/api/v2/tasks/1/', '/pulp/api/v2/tasks/2/')
+        bodies = (
+            {'_href': hrefs[0], 'state': 'running'},
+            {'_href': hrefs[1], 'state': 'finished', 'spawned_tasks': []},
+            {'_href': hrefs[0], 'state': 'finished', 'spawned_tasks': []},
+        )
+        self.session.post.return_value.json.return_value = list(bodies[:2])
+        self.session.get.return_value.json.return_value = bodies[2]
+        with mock.patch.object(polling, 'sleep'):
+            tasks = tuple(polling.poll_tasks(self._get_cfg('2.15'), hrefs))
+        # Tasks are yielded in the order they were given, not as completed.
+        self.assertEqual(tasks, (bodies[2], bodies[1]))
+        self.assertEqual(self.session.post.call_count, 1)
+        self.assertEqual(
+            self.session.post.call_args[1]['json'],
+            {'criteria': {'filters': {'task_id': {'$in': ['1', '2']}}}},
+        )
+        # The last round tracks just one task, which is read directly.
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_pulp_3(self):
+        """Assert Pulp 3 tasks are read from a filtered task list."""
+        hrefs = ('/pulp/api/v3/tasks/a/', '/pulp/api/v3/tasks/b/')
+        self.session.get.return_value.json.return_value = {
+            'next': None,
+            'results': [
+                {'_href': href, 'state': 'completed', 'spawned_tasks': []}
+                for href in hrefs
+            ],
+        }
+        tasks = tuple(polling.poll_tasks(self._get_cfg('3.0'), hrefs))
+        self.assertEqual([task['_href'] for task in tasks], list(hrefs))
+        self.assertEqual(self.session.get.call_count, 1)
+        self.assertEqual(
+            self.session.get.call_args[1]['params'],
+            {'id__in': 'a,b'},
+        )
+
+    def test_missing_task(self):
+        """Assert a task absent from the search results is read directly."""
+        hrefs = ('/pulp/api/v2/tasks/1/', '/pulp/api/v2/tasks/2/')
+        self.session.post.return_value.json.return_value = [
+            {'_href': hrefs[0], 'state': 'finished', 'spawned_tasks': []},
+        ]
+        self.session.get.return_value.json.return_value = {
+            '_href': hrefs[1], 'state': 'finished', 'spawned_tasks': []
+        }
+        tasks = tuple(polling.poll_tasks(self._get_cfg('2.15'), hrefs))
+        self.assertEqual([task['_href'] for task in tasks], list(hrefs))
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_pulp_3_pages(self):
+        """Assert each page of a filtered Pulp 3 task list is read."""
+        hrefs = ('/pulp/api/v3/tasks/a/', '/pulp/api/v3/tasks/b/')
+        pages = [
+            {
+                'next': 'http://example.com/pulp/api/v3/tasks/?page=' + str(i),
+                'results': [
+                    {'_href': href, 'state': 'completed', 'spawned_tasks': []}
+                ],
+            }
+            for i, href in enumerate(hrefs, 2)
+        ]
+        pages[-1]['next'] = None
+        self.session.get.return_value.json.side_effect = pages
+        tasks = tuple(polling.poll_tasks(self._get_cfg('3.0'), hrefs))
+        self.assertEqual([task['_href'] for task in tasks], list(hrefs))
+        self.assertEqual(self.session.get.call_count, 2)
+        self.assertEqual(
+            self.session.get.call_args[0][0],
+            'http://example.com/pulp/api/v3/tasks/?page=2',
+        )
+
+    def test_pulp_3_unfiltered(self):
+        """Assert a warning is issued if Pulp 3 ignores the task filter.
+
+        Also assert that the host is remembered, and that its task list is
+        not read again.
+        """
+        hrefs = ('/pulp/api/v3/tasks/a/', '/pulp/api/v3/tasks/b/')
+        other = {'_href': '/pulp/api/v3/tasks/c/', 'state': 'completed'}
+        bodies = [
+            {'next': None, 'results': [other]},
+            {'_href': hrefs[0], 'state': 'completed', 'spawned_tasks': []},
+            {'_href': hrefs[1], 'state': 'completed', 'spawned_tasks': []},
+        ]
+        self.session.get.return_value.json.side_effect = bodies
+        with mock.patch.object(polling, '_P3_UNFILTERED_HOSTS', set()) as hosts:
+            with self.assertWarns(RuntimeWarning):
+                tasks = tuple(polling.poll_tasks(self._get_cfg('3.0'), hrefs))
+            self.assertEqual(hosts, {'http://example.com'})
+            self.assertEqual(tasks, tuple(bodies[1:]))
+            self.session.get.reset_mock()
+            self.session.get.return_value.json.side_effect = bodies[1:]
+            tuple(polling.poll_tasks(self._get_cfg('3.0'), hrefs))
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_depth_first(self):
+        """Assert children are yielded right after their parent."""
+        parent, child, sibling = (
+            '/pulp/api/v2/tasks/{}/'.format(i) for i in range(3)
+        )
+        bodies = {
+            parent: {
+                '_href': parent,
+                'state': 'finished',
+                'spawned_tasks': [{'_href': child}],
+            },
+            child: {'_href': child, 'state': 'finished', 'spawned_tasks': []},
+            sibling: {
+                '_href': sibling,
+                'state': 'finished',
+                'spawned_tasks': [],
+            },
+        }
+        self.session.post.return_value.json.return_value = [
+            bodies[parent], bodies[sibling]
+        ]
+        self.session.get.return_value.json.return_value = bodies[child]
+        tasks = tuple(polling.poll_tasks(self._get_cfg('2.15'), (parent, sibling)))
+        self.assertEqual(
+            [task['_href'] for task in tasks],
+            [parent, child, sibling],
+        )
@@ -0,0 +1,104 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.readiness`."""
+import socket
+import unittest
+from unittest import mock
+
+from pulp_smash import cli, config, exceptions, readiness, stand_in
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+class WaitForTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.readiness.wait_for`."""
+
+    def test_backoff(self):
+        """Assert checks are repeated with growing delays until true."""
+        results = iter((False, False, True))
+        with mock.patch.object(readiness, 'sleep') as sleep:
+            readiness.wait_for({'check': lambda: next(results)})
+        delays = [call[0][0] for call in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertLess(delays[0], delays[1])
+
+    def test_timeout(self):
+        """Assert checks that never pass are reported once time runs out."""
+        checks = {'ready': lambda: True, 'never ready': lambda: False}
+        with self.assertRaises(exceptions.ServiceNotReadyError) as context:
+            readiness.wait_for(checks, timeout=0)
+        self.assertTrue(str(context.exception).endswith(': never ready'))
+
+
+class WaitUntilReadyTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.readiness.get_ready_checks`.
+
+    The checks are run by :func:`pulp_smash.cli.wait_until_ready`.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Start a stand-in for Pulp, and give its host more roles."""
+        cls.server = stand_in.StandIn()
+        cls.server.start()
+        cfg = cls.server.get_config()
+        system = cfg.systems[0]
+        cls.cfg = cfg.copy(systems=[config.PulpSystem(
+            system.hostname,
+            dict(system.roles, **{
+                'pulp resource manager': {},
+                'pulp workers': {},
+                'squid': {},
+            }),
+        )])
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the stand-in."""
+        cls.server.stop()
+
+    def test_ready(self):
+        """Assert httpd and workers are ready once the status API says so."""
+        cli.wait_until_ready(
+            self.cfg, ('httpd', 'pulp_resource_manager', 'pulp_workers'))
+
+    def test_stale(self):
+        """Assert workers aren't ready until they send a new heartbeat."""
+        heartbeats = readiness.get_heartbeats(self.cfg)
+        self.assertEqual(len(heartbeats), 3)
+        status = {'known_workers': [
+            {'_id': name, 'last_heartbeat': heartbeat}
+            for name, heartbeat in heartbeats
+        ]}
+        with mock.patch.object(readiness, 'get_status', return_value=status):
+            with self.assertRaises(exceptions.ServiceNotReadyError):
+                cli.wait_until_ready(
+                    self.cfg, ('pulp_workers',), timeout=0, stale=heartbeats)
+
+    def test_other_host(self):
+        """Assert workers on other hosts don't make a host's workers ready."""
+        status = {'known_workers': [{
+            '_id': 'reserved_resource_worker-0@example.com',
+            'last_heartbeat': '2018-01-01T00:00:00Z',
+        }]}
+        with mock.patch.object(readiness, 'get_status', return_value=status):
+            with self.assertRaises(exceptions.ServiceNotReadyError) as ctx:
+                cli.wait_until_ready(self.cfg, ('pulp_workers',), timeout=0)
+        self.assertIn('pulp_workers on localhost', str(ctx.exception))
+
+    def test_port(self):
+        """Assert services are checked by connecting to their ports."""
+        with mock.patch.object(readiness, '_SERVICE_PORTS', {'squid': 0}):
+            with self.assertRaises(exceptions.ServiceNotReadyError) as ctx:
+                cli.wait_until_ready(self.cfg, ('squid',), timeout=0)
+        self.assertIn('squid on localhost', str(ctx.exception))
+        with socket.socket() as listener:
+            listener.bind(('localhost', 0))
+            listener.listen(1)
+            port = listener.getsockname()[1]
+            with mock.patch.object(readiness, '_SERVICE_PORTS', {'squid': port}):
+                cli.wait_until_ready(self.cfg, ('squid',), timeout=0)
+
+    def test_unchecked(self):
+        """Assert services no host runs, or that are unknown, are skipped."""
+        cli.wait_until_ready(self.cfg, ('mongod', 'foo'), timeout=0)
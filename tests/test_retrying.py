@@ -0,0 +1,60 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.retrying`."""
+import email
+import time
+import unittest
+from unittest import mock
+
+from pulp_smash import retrying
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+class GetDelaysTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.retrying.get_delays`."""
+
+    def test_bounds(self):
+        """Assert delays grow, but never exceed the given maximum."""
+        delays = retrying.get_delays(0.01, 1)
+        values = [next(delays) for _ in range(20)]
+        self.assertLessEqual(values[0], 0.01)
+        self.assertGreaterEqual(values[0], 0.005)
+        for value in values:
+            with self.subTest(value=value):
+                self.assertGreaterEqual(value, 0.005)
+                self.assertLessEqual(value, 1)
+        self.assertGreaterEqual(min(values[-5:]), 0.5)
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    """Tests for :class:`pulp_smash.retrying.RetryPolicy`."""
+
+    def setUp(self):
+        """Create a policy, and the delays it hands out."""
+        self.policy = retrying.RetryPolicy(retries=2, backoff=1, budget=10)
+        self.delays = self.policy.get_delays()
+
+    def test_get_delay(self):
+        """Assert retries are only made while the policy allows them."""
+        response = mock.Mock(status_code=503, headers={})
+        self.assertIsNotNone(
+            self.policy.get_delay('get', 0, self.delays, 10, response))
+        self.assertIsNone(
+            self.policy.get_delay('GET', 2, self.delays, 10, response))
+        self.assertIsNone(
+            self.policy.get_delay('POST', 0, self.delays, 10, response))
+        self.assertIsNone(
+            self.policy.get_delay('GET', 0, self.delays, 0, response))
+        response.status_code = 500
+        self.assertIsNone(
+            self.policy.get_delay('GET', 0, self.delays, 10, response))
+
+    def test_parse_retry_after(self):
+        """Assert both forms of Retry-After header are understood."""
+        self.assertEqual(retrying._parse_retry_after({}), 0)
+        self.assertEqual(retrying._parse_retry_after({'Retry-After': '2'}), 2)
+        self.assertEqual(retrying._parse_retry_after({'Retry-After': 'x'}), 0)
+        date = email.utils.formatdate(time.time() + 100, usegmt=True)
+        self.assertAlmostEqual(
+            retrying._parse_retry_after({'Retry-After': date}), 100, delta=2)
@@ -1,13 +1,16 @@
 # coding=utf-8
 """Unit tests for :mod:`pulp_smash.selectors`."""
+import os
 import random
+import tempfile
+import threading
 import unittest
 from unittest import mock
 
 import requests
 from packaging.version import InvalidVersion, Version
 
-from pulp_smash import exceptions, selectors, utils
+from pulp_smash import cassette, exceptions, index, selectors, sessions, utils
 
 # It makes sense for unit tests to access otherwise private data.
 # pylint:disable=protected-access
@@ -70,6 +73,152 @@ class GetBugTestCase(unittest.TestCase):
             selectors._get_bug('1')
 
 
+def _set_up_bug_cache(test_case):
+    """Cache bugs in a temporary directory, and mock the bug tracker.
+
+    Bugs are not prefetched.
+
+    :returns: A ``(path, get)`` tuple: the path to the cache, and the mock
+        called to fetch bugs.
+    """
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    path = os.path.join(directory.name, 'pulp_smash', 'bugs.json')
+    prefetched = threading.Event()
+    prefetched.set()
+    for target, attribute, value in (
+            (selectors, '_get_bugs_path', mock.Mock(return_value=path)),
+            (selectors, '_BUG_STATUS_CACHE', {}),
+            (selectors, '_PREFETCHED', prefetched),
+            (os, 'environ', {})):
+        patcher = mock.patch.object(target, attribute, value)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    patcher = mock.patch.object(sessions, 'get_session')
+    get_session = patcher.start()
+    test_case.addCleanup(patcher.stop)
+    return path, get_session.return_value.get
+
+
+class BugCacheTestCase(unittest.TestCase):
+    """Test the caching of bugs by ``_get_bug``."""
+
+    def setUp(self):
+        """Cache bugs in a temporary directory, and mock the bug tracker."""
+        self.path, self.get = _set_up_bug_cache(self)
+        self.get.return_value.json.return_value = {'issue': {
+            'custom_fields': [{'id': 4, 'value': '2.8'}],
+            'id': 1356,
+            'status': {'name': 'MODIFIED'},
+        }}
+
+    def test_memory(self):
+        """Assert a bug is fetched once per process."""
+        for _ in range(2):
+            bug = selectors._get_bug(1356)
+        self.assertEqual(bug, selectors._Bug('MODIFIED', Version('2.8')))
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_disk(self):
+        """Assert a bug is read from disk while it's fresh."""
+        bug = selectors._get_bug(1356)
+        selectors._BUG_STATUS_CACHE.clear()
+        self.assertEqual(selectors._get_bug(1356), bug)
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_stale(self):
+        """Assert a stale bug is served, and refreshed in the background."""
+        with mock.patch.object(selectors, 'time', return_value=2e9 - 60):
+            selectors._write_bug(1356, selectors._Bug('NEW', Version('0')))
+        os.environ['PULP_SMASH_BUG_TTL'] = '1'
+        with mock.patch.object(selectors, 'time', return_value=2e9), \
+                mock.patch.object(selectors.threading, 'Thread') as thread:
+            self.assertEqual(selectors._get_bug(1356).status, 'NEW')
+            thread.call_args[1]['target']()
+        self.assertEqual(selectors._get_bug(1356).status, 'MODIFIED')
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_expired(self):
+        """Assert a bug too old to be served is fetched again."""
+        selectors._get_bug(1356)
+        selectors._BUG_STATUS_CACHE.clear()
+        with mock.patch.object(selectors, 'time', return_value=2e9):
+            selectors._get_bug(1356)
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_offline(self):
+        """Assert the bug tracker isn't contacted when offline."""
+        selectors._get_bug(1356)
+        selectors._BUG_STATUS_CACHE.clear()
+        os.environ['PULP_SMASH_OFFLINE'] = '1'
+        with mock.patch.object(selectors, 'time', return_value=2e9):
+            selectors._get_bug(1356)
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                selectors._get_bug(1357)
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_disabled(self):
+        """Assert bugs aren't cached on disk if the TTL is zero."""
+        os.environ['PULP_SMASH_BUG_TTL'] = '0'
+        selectors._get_bug(1356)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_cassette(self):
+        """Assert bugs aren't cached on disk if a cassette is in use."""
+        with mock.patch.object(cassette, 'get_cassette'):
+            selectors._get_bug(1356)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class PrefetchBugsTestCase(unittest.TestCase):
+    """Test :func:`pulp_smash.selectors.prefetch_bugs`."""
+
+    def setUp(self):
+        """Cache bugs in a temporary directory, and mock the bug tracker."""
+        self.path, self.get = _set_up_bug_cache(self)
+        self.get.return_value.json.return_value = {'issues': [
+            {
+                'custom_fields': [{'id': 4, 'value': ''}],
+                'id': bug_id,
+                'status': {'name': 'NEW'},
+            }
+            for bug_id in (1356, 1357)
+        ]}
+
+    def test_batch(self):
+        """Assert bugs are fetched together, and cached."""
+        selectors.prefetch_bugs((1357, 1356))
+        self.assertEqual(self.get.call_count, 1)
+        self.assertEqual(
+            self.get.call_args[1]['params']['issue_id'], '1356,1357')
+        selectors._BUG_STATUS_CACHE.clear()
+        selectors.prefetch_bugs((1356, 1357))
+        self.assertEqual(self.get.call_count, 1)
+        self.assertEqual(len(selectors._BUG_STATUS_CACHE), 2)
+
+    def test_batches(self):
+        """Assert many bugs are fetched in several concurrent requests."""
+        with mock.patch.object(selectors, '_PREFETCH_BATCH_SIZE', 2):
+            selectors.prefetch_bugs(range(1, 6))
+        self.assertEqual(self.get.call_count, 3)
+
+    def test_error(self):
+        """Assert bugs are left to be fetched one by one if a batch fails."""
+        self.get.side_effect = requests.exceptions.ConnectionError
+        selectors.prefetch_bugs((1356,))
+        self.assertEqual(selectors._BUG_STATUS_CACHE, {})
+
+    def test_get_bug(self):
+        """Assert the first bug not cached triggers a prefetch, only once."""
+        selectors._PREFETCHED.clear()
+        with mock.patch.object(index, 'get_bug_ids') as get_bug_ids:
+            get_bug_ids.return_value = {1356, 1357}
+            self.assertEqual(selectors._get_bug(1357).status, 'NEW')
+            selectors._get_bug(1356)
+        self.assertEqual(self.get.call_count, 1)
+        self.assertTrue(selectors._PREFETCHED.is_set())
+
+
 class BugIsTestableTestCase(unittest.TestCase):
     """Test :meth:`pulp_smash.selectors.bug_is_testable` and its partner."""
 
@@ -0,0 +1,119 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.sessions`."""
+import email
+import unittest
+from unittest import mock
+
+import requests
+from requests import cookies
+
+from pulp_smash import api, config, sessions
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+class GetSessionTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.sessions.get_session`."""
+
+    def setUp(self):
+        """Give each test an empty session cache."""
+        for name in ('_SESSIONS', '_POOL_SIZES'):
+            patcher = mock.patch.object(sessions, name, {})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_same_host(self):
+        """Assert URLs naming the same host share a session."""
+        self.assertIs(
+            sessions.get_session('https://example.com/foo/'),
+            sessions.get_session('HTTPS://example.com/bar/'),
+        )
+
+    def test_different_hosts(self):
+        """Assert URLs naming different hosts do not share a session."""
+        self.assertIsNot(
+            sessions.get_session('https://example.com'),
+            sessions.get_session('https://example.org'),
+        )
+
+    def test_pool_size(self):
+        """Assert the ``pool_size`` argument sizes the connection pool."""
+        session = sessions.get_session('https://example.com', 3)
+        adapter = session.get_adapter('https://example.com')
+        self.assertEqual(adapter._pool_maxsize, 3)
+
+    def test_pool_size_late(self):
+        """Assert a ``pool_size`` is honored after a session is created.
+
+        :func:`pulp_smash.utils.http_get` may reach a host before a client
+        configured with a ``pool_size`` does.
+        """
+        session = sessions.get_session('https://example.com')
+        self.assertIs(session, sessions.get_session('https://example.com', 20))
+        self.assertIs(session, sessions.get_session('https://example.com'))
+        adapter = session.get_adapter('https://example.com')
+        self.assertEqual(adapter._pool_maxsize, 20)
+
+    def test_pool_size_largest(self):
+        """Assert the largest ``pool_size`` asked for wins."""
+        sessions.get_session('https://example.com', 20)
+        session = sessions.get_session('https://example.com', 5)
+        adapter = session.get_adapter('https://example.com')
+        self.assertEqual(adapter._pool_maxsize, 20)
+
+    def test_many_hosts(self):
+        """Assert a session keeps connection pools for several hosts.
+
+        A client may be asked to fetch absolute URLs on other hosts. Doing so
+        must not evict the pool of connections to the client's own host.
+        """
+        session = sessions.get_session('https://example.com')
+        adapter = session.get_adapter('https://example.com')
+        pools = [
+            adapter.poolmanager.connection_from_url(url)
+            for url in ('https://example.com', 'https://example.org')
+        ]
+        self.assertIs(
+            adapter.poolmanager.connection_from_url('https://example.com'),
+            pools[0],
+        )
+
+    def test_no_cookies(self):
+        """Assert sessions do not carry cookies between requests."""
+        session = sessions.get_session('https://example.com')
+        headers = email.message_from_string('Set-Cookie: sessionid=foo\n\n')
+        session.cookies.extract_cookies(
+            cookies.MockResponse(headers),
+            cookies.MockRequest(requests.Request('GET', 'https://example.com')),
+        )
+        self.assertEqual(len(session.cookies), 0)
+
+    def test_client_uses_session(self):
+        """Assert :class:`pulp_smash.api.Client` sends requests via a session.
+
+        Also assert that ``request_kwargs`` are passed through untouched.
+        """
+        client = api.Client(
+            config.PulpSmashConfig(
+                pulp_auth=['admin', 'admin'],
+                systems=[
+                    config.PulpSystem(
+                        hostname='example.com',
+                        roles={'api': {'scheme': 'http', 'pool_size': 2}},
+                    )
+                ]
+            ),
+            api.echo_handler,
+        )
+        self.assertIs(client.session, sessions.get_session('http://example.com'))
+        with mock.patch.object(client.session, 'request') as request:
+            request.return_value.url = 'http://example.com/foo/'
+            response = client.get('/foo/', verify=False)
+        self.assertIs(response, request.return_value)
+        self.assertEqual(request.call_args[0], ('GET',))
+        self.assertEqual(request.call_args[1], {
+            'auth': ('admin', 'admin'),
+            'url': 'http://example.com/foo/',
+            'verify': False,
+        })
@@ -0,0 +1,52 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.ssh`."""
+import unittest
+from unittest import mock
+
+from pulp_smash import cli, config, ssh, utils
+
+# It makes sense for unit tests to access otherwise private data.
+# pylint:disable=protected-access
+
+
+class GetSshMachineTestCase(unittest.TestCase):
+    """Tests for :func:`pulp_smash.ssh.get_ssh_machine`."""
+
+    def setUp(self):
+        """Mock Plumbum, and forget pooled machines afterwards."""
+        patcher = mock.patch('pulp_smash.ssh.plumbum')
+        self.plumbum = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(ssh._SSH_MACHINES, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pooled(self):
+        """Assert one machine is created per host."""
+        hostnames = (utils.uuid4(), utils.uuid4())
+        machines = [
+            ssh.get_ssh_machine(hostname)
+            for hostname in hostnames + hostnames
+        ]
+        self.assertIs(machines[0], machines[2])
+        self.assertIs(machines[1], machines[3])
+        self.assertEqual(self.plumbum.machines.SshMachine.call_count, 2)
+
+    def test_dead(self):
+        """Assert a machine whose shell has exited is replaced."""
+        hostname = utils.uuid4()
+        machine = ssh.get_ssh_machine(hostname)
+        machine._session.alive.return_value = False
+        self.plumbum.machines.SshMachine.return_value = mock.Mock()
+        self.assertIsNot(ssh.get_ssh_machine(hostname), machine)
+        self.assertEqual(machine.close.call_count, 1)
+
+    def test_shared(self):
+        """Assert clients targeting one host share a machine."""
+        cfg = config.PulpSmashConfig(systems=[
+            config.PulpSystem(
+                hostname=utils.uuid4(),
+                roles={'pulp cli': {}, 'shell': {'transport': 'ssh'}},
+            )
+        ])
+        self.assertIs(cli.Client(cfg).machine, cli.Client(cfg).machine)
@@ -0,0 +1,111 @@
+# coding=utf-8
+"""Unit tests for :mod:`pulp_smash.stand_in`."""
+import hashlib
+import unittest
+
+from pulp_smash import api, pagination, stand_in, utils
+from pulp_smash.tests.pulp2.constants import REPOSITORY_PATH
+
+
+class StandInTestCase(unittest.TestCase):
+    """Drive Pulp Smash's Pulp 2 code paths against a stand-in."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start a stand-in whose tasks take a little time."""
+        cls.server = stand_in.StandIn(task_seconds=0.05, units=25)
+        cls.server.start()
+        cls.cfg = cls.server.get_config()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the stand-in."""
+        cls.server.stop()
+
+    def setUp(self):
+        """Create a repository."""
+        self.client = api.Client(self.cfg, api.json_handler)
+        self.repo = self.client.post(REPOSITORY_PATH, {'id': utils.uuid4()})
+
+    def test_repository(self):
+        """Assert repositories are created, read and deleted."""
+        self.assertEqual(self.client.get(self.repo['_href']), self.repo)
+        self.assertIn(self.repo, self.client.get(REPOSITORY_PATH))
+        self.client.delete(self.repo['_href'])
+        response = api.Client(self.cfg, api.echo_handler).get(
+            self.repo['_href'])
+        self.assertEqual(response.status_code, 404)
+
+    def test_tasks(self):
+        """Assert tasks are polled until they finish."""
+        call_reports = [
+            api.Client(self.cfg).post(
+                self.repo['_href'] + 'actions/sync/', {}).json()
+            for _ in range(3)
+        ]
+        for call_report in call_reports:
+            tasks = tuple(api.poll_spawned_tasks(self.cfg, call_report))
+            self.assertEqual([task['state'] for task in tasks], ['finished'])
+
+    def test_search(self):
+        """Assert unit searches are paged and projected."""
+        units = list(utils.iter_search_units(
+            self.cfg, self.repo, fields=('name',), page_size=10))
+        self.assertEqual(len(units), 25)
+        self.assertEqual(set(units[0]['metadata']), {'_id', 'name'})
+
+    def test_upload(self):
+        """Assert units are uploaded and imported."""
+        call_report = utils.upload_import_unit(
+            self.cfg, b'x' * 1000, {'unit_type_id': 'iso'}, self.repo)
+        self.assertEqual(len(call_report['spawned_tasks']), 1)
+
+    def test_upload_dedup(self):
+        """Assert units Pulp already has are copied, or skipped."""
+        other = self.client.post(REPOSITORY_PATH, {'id': utils.uuid4()})
+        import_params = {'unit_type_id': 'rpm'}
+        call_report = utils.upload_import_unit(
+            self.cfg, '{}-0'.format(other['id']).encode(), import_params,
+            self.repo)
+        self.assertEqual(len(call_report['spawned_tasks']), 1)
+        self.assertIsNone(utils.upload_import_unit(
+            self.cfg, '{}-0'.format(self.repo['id']).encode(), import_params,
+            self.repo))
+
+
+class StandInV3TestCase(unittest.TestCase):
+    """Drive Pulp Smash's Pulp 3 code paths against a stand-in."""
+
+    def test_repositories(self):
+        """Assert Pulp 3 repositories are paged, and deleted with tasks."""
+        with stand_in.StandIn(pulp_version='3.0') as server:
+            cfg = server.get_config()
+            client = api.Client(cfg, api.json_handler)
+            repos = [
+                client.post('/pulp/api/v3/repositories/', {'name': str(i)})
+                for i in range(150)
+            ]
+            listed = list(
+                pagination.page_results(cfg, '/pulp/api/v3/repositories/'))
+            self.assertEqual(listed, repos)
+            for repo in repos[:3]:
+                client.delete(repo['_href'])
+            self.assertEqual(
+                len(list(pagination.page_results(cfg, '/pulp/api/v3/tasks/'))),
+                3,
+            )
+
+    def test_artifacts(self):
+        """Assert artifacts are uploaded, and found by checksum."""
+        with stand_in.StandIn(pulp_version='3.0') as server:
+            cfg = server.get_config()
+            client = api.Client(cfg, api.json_handler)
+            artifact = client.post(
+                '/pulp/api/v3/artifacts/', files={'file': b'abc'})
+            self.assertEqual(
+                artifact['sha256'], hashlib.sha256(b'abc').hexdigest())
+            found = client.get(
+                '/pulp/api/v3/artifacts/',
+                params={'sha256': artifact['sha256']},
+            )
+            self.assertEqual(found['results'], [artifact])
@@ -1,11 +1,25 @@
 # coding=utf-8
 """Unit tests for :mod:`pulp_smash.utils`."""
+import hashlib
+import io
+import json
+import os
+import pathlib
 import random
+import tempfile
 import unittest
 from unittest import mock
 
 
-from pulp_smash import api, cli, config, exceptions, utils
+from pulp_smash import (
+    api,
+    cli,
+    config,
+    exceptions,
+    instrumentation,
+    sessions,
+    utils,
+)
 
 
 class UUID4TestCase(unittest.TestCase):
@@ -25,13 +39,14 @@ class GetBrokerTestCase(unittest.TestCase):
         Assert that:
 
         * ``get_broker(…)`` returns a string.
-        * The ``server_config`` argument is passed to the service object.
-        * The "qpidd" broker is the preferred broker.
+        * The ``server_config`` argument is passed to the facts lookup.
         """
-        with mock.patch.object(cli, 'Client') as client:
-            client.return_value.run.return_value.returncode = 0
-            broker = utils.get_broker(server_config=mock.Mock())
+        cfg = mock.Mock()
+        with mock.patch.object(cli, 'get_facts') as get_facts:
+            get_facts.return_value = {'broker': 'qpidd'}
+            broker = utils.get_broker(server_config=cfg)
         self.assertEqual(broker, 'qpidd')
+        get_facts.assert_called_once_with(cfg)
 
     def test_failure(self):
         """Fail to generate a broker service management object.
@@ -41,8 +56,8 @@ class GetBrokerTestCase(unittest.TestCase):
         """
         cfg = mock.Mock()
         cfg.get_base_url.return_value = 'http://example.com'
-        with mock.patch.object(cli, 'Client') as client:
-            client.return_value.run.return_value.returncode = 1
+        with mock.patch.object(cli, 'get_facts') as get_facts:
+            get_facts.return_value = {'broker': ''}
             with self.assertRaises(exceptions.NoKnownBrokerError):
                 utils.get_broker(cfg)
 
@@ -101,14 +116,12 @@ class IsRootTestCase(unittest.TestCase):
 
     def test_true(self):
         """Assert the method returns ``True`` when root."""
-        with mock.patch.object(cli, 'Client') as clien:
-            clien.return_value.run.return_value.stdout.strip.return_value = '0'
+        with mock.patch.object(cli, 'get_facts', return_value={'uid': '0'}):
             self.assertTrue(utils.is_root(None))
 
     def test_false(self):
         """Assert the method returns ``False`` when non-root."""
-        with mock.patch.object(cli, 'Client') as clien:
-            clien.return_value.run.return_value.stdout.strip.return_value = '1'
+        with mock.patch.object(cli, 'get_facts', return_value={'uid': '1'}):
             self.assertFalse(utils.is_root(None))
 
 
@@ -147,6 +160,133 @@ class UploadImportUnitTestCase(unittest.TestCase):
             )
         self.assertIs(response, client.return_value.post.return_value)
 
+    def test_sources(self):
+        """Assert blobs, paths and file objects are uploaded in chunks."""
+        unit = bytes(range(256)) * 1000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'unit')
+            with open(path, 'wb') as handle:
+                handle.write(unit)
+            with open(path, 'rb') as handle:
+                sources = [unit, path, handle, io.BytesIO(unit)]
+                if hasattr(pathlib.Path, '__fspath__'):  # Python 3.6+
+                    sources.append(pathlib.Path(path))
+                for source in sources:
+                    with self.subTest(source=source):
+                        self.assertEqual(self._upload(source), unit)
+
+    def test_chunk_size(self):
+        """Assert chunk sizes grow with the unit, within bounds."""
+        # pylint:disable=protected-access
+        self.assertEqual(
+            utils._get_upload_chunk_size(1), utils._UPLOAD_CHUNK_MIN)
+        self.assertEqual(
+            utils._get_upload_chunk_size(2 ** 40), utils._UPLOAD_CHUNK_MAX)
+        size = utils._UPLOAD_CHUNK_MIN * utils._UPLOAD_WORKERS * 8
+        self.assertEqual(
+            utils._get_upload_chunk_size(size), utils._UPLOAD_CHUNK_MIN * 2)
+
+    @staticmethod
+    def _upload(unit):
+        """Upload ``unit``, and reassemble it from the chunks PUT."""
+        with mock.patch.object(api, 'Client') as client:
+            client.return_value.post.return_value = {
+                '_href': 'http://example.com/uploads/1/',
+                'upload_id': 'bar',
+            }
+            utils.upload_import_unit(
+                mock.Mock(), unit, {}, {'_href': 'http://example.com'})
+        chunks = {}
+        for call in client.return_value.put.call_args_list:
+            offset = int(call[0][0].rstrip('/').split('/')[-1])
+            chunks[offset] = call[1]['data']
+        return b''.join(chunks[offset] for offset in sorted(chunks))
+
+
+class UploadDedupTestCase(unittest.TestCase):
+    """Test how :func:`pulp_smash.utils.upload_import_unit` skips uploads."""
+
+    def setUp(self):
+        """Mock the client, and reset the counter."""
+        patcher = mock.patch.object(api, 'Client')
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.units = []
+        self.client.post.side_effect = self._post
+        patcher = mock.patch.object(
+            instrumentation, '_RECORDER', instrumentation.Recorder())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, url, *args, **kwargs):  # pylint:disable=unused-argument
+        """Answer unit searches with ``units``, and other requests alike."""
+        if url.endswith('/search/'):
+            return self.units
+        return {'_href': 'foo', 'upload_id': 'bar'}
+
+    def _upload(self, **kwargs):
+        """Upload an RPM."""
+        return utils.upload_import_unit(
+            mock.Mock(),
+            b'my unit',
+            {'unit_type_id': 'rpm'},
+            {'_href': 'http://example.com/repo/', 'id': 'repo'},
+            **kwargs
+        )
+
+    def _get_urls(self):
+        """Return the URL of each POST request made."""
+        return [call[0][0] for call in self.client.post.call_args_list]
+
+    def test_in_repo(self):
+        """Assert nothing is done if the unit is in the repository."""
+        self.units.append({'repository_memberships': ['other', 'repo']})
+        self.assertIsNone(self._upload())
+        self.assertEqual(len(self._get_urls()), 1)
+        self.assertEqual(self.client.put.call_count, 0)
+        self.assertEqual(utils.get_upload_bytes_saved(), len(b'my unit'))
+        body = self.client.post.call_args[0][1]
+        self.assertEqual(
+            body['criteria']['filters'],
+            {'checksum': hashlib.sha256(b'my unit').hexdigest()},
+        )
+        self.assertTrue(body['include_repos'])
+
+    def test_in_other_repo(self):
+        """Assert a unit in another repository is copied, not uploaded."""
+        self.units.append({'repository_memberships': ['other']})
+        self._upload()
+        self.assertEqual(self.client.put.call_count, 0)
+        self.assertEqual(utils.get_upload_bytes_saved(), len(b'my unit'))
+        self.assertEqual(
+            self._get_urls()[-1],
+            'http://example.com/repo/actions/associate/',
+        )
+        body = self.client.post.call_args[0][1]
+        self.assertEqual(body['source_repo_id'], 'other')
+        self.assertEqual(body['criteria']['type_ids'], ['rpm'])
+
+    def test_orphan(self):
+        """Assert an upload is made if the unit is in no repository."""
+        self.units.append({'repository_memberships': []})
+        self._upload()
+        self.assertEqual(self.client.put.call_count, 1)
+        self.assertEqual(utils.get_upload_bytes_saved(), 0)
+
+    def test_missing(self):
+        """Assert an upload is made if Pulp doesn't have the unit."""
+        self._upload()
+        self.assertEqual(self.client.put.call_count, 1)
+        self.assertEqual(utils.get_upload_bytes_saved(), 0)
+
+    def test_fresh(self):
+        """Assert an upload is always made if ``fresh`` is true."""
+        self.units.append({'repository_memberships': ['repo']})
+        self._upload(fresh=True)
+        self.assertNotIn(True, [
+            url.endswith('/search/') for url in self._get_urls()])
+        self.assertEqual(self.client.put.call_count, 1)
+
 
 class UploadImportErratumTestCase(unittest.TestCase):
     """Test :func:`pulp_smash.utils.upload_import_unit`."""
@@ -208,11 +348,13 @@ class GetSha256ChecksumTestCase(unittest.TestCase):
             ('HTTP://example.com', b'abc'),
         )
         checksums = []
-        with mock.patch.object(utils, 'http_get') as http_get:
+        with mock.patch.object(sessions, 'get_session') as get_session:
+            get = get_session.return_value.get
             for url, blob in urls_blobs:
-                http_get.return_value = blob
+                get.return_value.iter_content.return_value = (blob,)
                 checksums.append(utils.get_sha256_checksum(url))
-        self.assertEqual(http_get.call_count, 2)
+        self.assertEqual(get.call_count, 2)
+        self.assertTrue(get.call_args[1]['stream'])
         self.assertNotEqual(checksums[0], checksums[1])
         self.assertEqual(checksums[0], checksums[2])
 
@@ -231,19 +373,111 @@ class SearchUnitsTestCase(unittest.TestCase):
         )
 
 
+class IterSearchUnitsTestCase(unittest.TestCase):
+    """Test :func:`pulp_smash.utils.iter_search_units`."""
+
+    def setUp(self):
+        """Mock the client, and serve units in chunks of a few bytes."""
+        patcher = mock.patch.object(api, 'Client')
+        self.post = patcher.start().return_value.post
+        self.addCleanup(patcher.stop)
+        self.units = [{'id': i, 'name': 'ü{}'.format(i)} for i in range(5)]
+
+        def post(path, body, **kwargs):  # pylint:disable=unused-argument
+            """Return a response holding the requested units."""
+            criteria = body['criteria']
+            units = self.units[criteria['skip']:]
+            body = json.dumps(units[:criteria['limit']]).encode('utf-8')
+            response = mock.MagicMock(encoding=None)
+            response.iter_content.return_value = (
+                body[i:i + 3] for i in range(0, len(body), 3)
+            )
+            return response
+
+        self.post.side_effect = post
+
+    def test_pages(self):
+        """Assert units are paged through with ``limit`` and ``skip``."""
+        units = list(utils.iter_search_units(mock.Mock(), {'_href': 'r/'},
+                                             page_size=2))
+        self.assertEqual(units, self.units)
+        self.assertEqual(
+            [call[0][1]['criteria']['skip']
+             for call in self.post.call_args_list],
+            [0, 2, 4],
+        )
+        self.assertTrue(self.post.call_args[1]['stream'])
+        self.assertEqual(
+            self.post.call_args[0][1]['criteria']['sort'],
+            {'unit': [['_id', 'ascending']]},
+        )
+
+    def test_limit_skip_fields(self):
+        """Assert ``limit``, ``skip`` and ``fields`` are honored."""
+        units = list(utils.iter_search_units(
+            mock.Mock(),
+            {'_href': 'r/'},
+            {'limit': 3, 'skip': 1},
+            fields=('name',),
+            page_size=2,
+        ))
+        self.assertEqual(units, self.units[1:4])
+        criteria = self.post.call_args[0][1]['criteria']
+        self.assertEqual(criteria['fields'], {'unit': ['name']})
+        self.assertEqual((criteria['limit'], criteria['skip']), (1, 3))
+
+    def test_sort(self):
+        """Assert a given ``sort`` is used instead of the default."""
+        sort = {'unit': [['name', 'descending']]}
+        list(utils.iter_search_units(
+            mock.Mock(), {'_href': 'r/'}, {'sort': sort}))
+        self.assertEqual(self.post.call_args[0][1]['criteria']['sort'], sort)
+
+
+class IterJsonArrayTestCase(unittest.TestCase):
+    """Test ``pulp_smash.utils._iter_json_array``."""
+
+    @staticmethod
+    def _decode(body, size):
+        """Decode ``body`` after splitting it into ``size``-byte chunks."""
+        response = mock.Mock(encoding=None)
+        response.iter_content.return_value = (
+            body[i:i + size] for i in range(0, len(body), size)
+        )
+        # pylint:disable=protected-access
+        return list(utils._iter_json_array(response))
+
+    def test_arrays(self):
+        """Assert arrays are decoded, whatever the chunk size."""
+        for array in ([], [{}], [1, 'a]', {'b': [2, ',']}, 345, None]):
+            body = json.dumps(array, indent=1).encode('utf-8')
+            for size in (1, 2, 7, len(body) or 1):
+                with self.subTest(array=array, size=size):
+                    self.assertEqual(self._decode(body, size), array)
+
+    def test_invalid(self):
+        """Assert truncated or non-array bodies raise an exception."""
+        for body in (b'', b'{}', b'[1, 2', b'[1 2]', b'[1,]', b'[,]'):
+            with self.subTest(body=body):
+                with self.assertRaises(ValueError):
+                    self._decode(body, 2)
+
+
 class OsIsF26TestCase(unittest.TestCase):
     """Test :func:`pulp_smash.utils.os_is_f26`."""
 
-    def test_returncode_zero(self):
-        """Assert true is returned if the CLI command returns zero."""
-        with mock.patch.object(cli, 'Client') as client:
-            client.return_value.run.return_value.returncode = 0
+    def test_fedora_26(self):
+        """Assert true is returned if the host runs Fedora 26."""
+        with mock.patch.object(cli, 'get_facts') as get_facts:
+            get_facts.return_value = {
+                'redhat_release': 'Fedora release 26 (Twenty Six)'}
             response = utils.os_is_f26(mock.Mock())
         self.assertTrue(response)
 
-    def test_returncode_nonzero(self):
-        """Assert false is returned if the CLI command returns non-zero."""
-        with mock.patch.object(cli, 'Client') as client:
-            client.return_value.run.return_value.returncode = 1
+    def test_fedora_27(self):
+        """Assert false is returned if the host runs another release."""
+        with mock.patch.object(cli, 'get_facts') as get_facts:
+            get_facts.return_value = {
+                'redhat_release': 'Fedora release 27 (Twenty Seven)'}
             response = utils.os_is_f26(mock.Mock())
         self.assertFalse(response)